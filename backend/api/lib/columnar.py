@@ -0,0 +1,152 @@
+import uuid
+from decimal import Decimal, DecimalException
+from functools import reduce
+from rest_framework import serializers
+
+try:
+    import pyarrow
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pyarrow = None
+
+from api.lib.constants import TRANSACTION_CSV_COLUMNS, IMPORT_MODE_INSERT
+from api.lib.uploads import get_upload_storage, InvalidUpload
+
+
+def missing_columns(schema):
+    """Return the transaction columns absent from the arrow schema of a Parquet file."""
+
+    return [name for name in TRANSACTION_CSV_COLUMNS if name not in schema.names]
+
+
+class ParquetBatches:
+    """Iterable over the record batches of a stored Parquet upload, holding only the transaction columns.
+
+    `rows_read` counts the rows yielded so far. Parquet files are not read front to back, so `bytes_read`
+    estimates the bytes read from the share of the rows of the file they hold.
+    """
+
+    def __init__(self, file_name, batch_size: int):
+        self.file_name = file_name
+        self.batch_size = batch_size
+        self.bytes_total = get_upload_storage().size(file_name)
+        self.rows_total = None
+        self.rows_read = 0
+
+    @property
+    def bytes_read(self):
+        if not self.rows_total:
+            return 0
+        return self.bytes_total * self.rows_read // self.rows_total
+
+    def __iter__(self):
+        with get_upload_storage().open(self.file_name, 'rb') as file:
+            try:
+                parquet_file = pq.ParquetFile(file)
+                missing = missing_columns(parquet_file.schema_arrow)
+                if missing:
+                    raise InvalidUpload(f"Parquet file is missing columns: {', '.join(missing)}.")
+
+                self.rows_total = parquet_file.metadata.num_rows
+                for batch in parquet_file.iter_batches(batch_size=self.batch_size, columns=list(TRANSACTION_CSV_COLUMNS)):
+                    self.rows_read += batch.num_rows
+                    yield batch
+            except pyarrow.ArrowException as e:
+                raise InvalidUpload(f"Invalid Parquet file: {e}") from e
+
+
+class RecordBatchValidator:
+    """Validates Parquet record batches with the rules of TransactionSerializer, column by column.
+
+    The business rules (amount > 0, quantity >= 0, three letter currency, no missing value) are checked
+    with vectorized compute functions over whole columns. Rows passing them are converted without parsing,
+    as Parquet columns are already typed. The other rows, and every row of a column whose type the checks
+    do not cover, go through the row validator, so they get exactly the serializer's error messages.
+    """
+
+    def __init__(self, validator):
+        self.validator = validator
+
+    def validate_batch(self, batch, rows, mode=IMPORT_MODE_INSERT):
+        """Split the rows of `batch`, given as dicts in `rows`, like the row validator's validate_batch()."""
+
+        if not hasattr(self.validator, 'resolve_batch'):
+            # Validators without a separate uniqueness step, like SerializerRowValidator, get the rows as they are
+            return self.validator.validate_batch(rows, mode)
+
+        checked = self._check_columns(batch)
+        exact_amounts = self._exact_amounts(batch.column('amount').type)
+        parsed_rows = []
+        for index, row in enumerate(rows):
+            values = self._convert(row, exact_amounts) if checked[index] else None
+            parsed_rows.append((values, {}) if values is not None else self.validator.validate_row(row))
+        return self.validator.resolve_batch(parsed_rows, mode)
+
+    def _check_columns(self, batch):
+        amount = batch.column('amount')
+        quantity = batch.column('quantity')
+        currency = batch.column('currency')
+        types = pyarrow.types
+        if not (types.is_timestamp(batch.column('timestamp').type)
+                and (types.is_decimal(amount.type) or types.is_floating(amount.type) or types.is_integer(amount.type))
+                and types.is_integer(quantity.type)
+                and (types.is_string(currency.type) or types.is_large_string(currency.type))):
+            return [False] * batch.num_rows
+
+        checks = [pc.is_valid(column) for column in batch.columns]
+        checks.append(pc.greater(amount, 0))
+        if types.is_floating(amount.type):
+            checks.append(pc.is_finite(amount))
+        checks.append(pc.greater_equal(quantity, 0))
+        max_quantity = self.validator.fields['quantity'].max_value
+        if max_quantity is not None:
+            checks.append(pc.less_equal(quantity, max_quantity))
+        checks.append(pc.equal(pc.utf8_length(pc.utf8_trim_whitespace(currency)), 3))
+        checks.append(pc.utf8_is_printable(currency))
+        return reduce(pc.and_, checks).fill_null(False).to_pylist()
+
+    def _exact_amounts(self, amount_type):
+        """Tell whether every value of a column of `amount_type` already has the precision of the amount field."""
+
+        field = self.validator.fields['amount']
+        return (pyarrow.types.is_decimal(amount_type) and amount_type.scale == field.decimal_places
+                and amount_type.precision <= field.max_digits)
+
+    def _convert(self, row, exact_amounts=False):
+        """Return the values of a row that passed the column checks, or None if one still needs validating."""
+
+        fields = self.validator.fields
+        try:
+            currency = row['currency'].strip()
+            if len(currency) != 3:
+                return None
+            amount = row['amount']
+            if not exact_amounts:
+                amount = fields['amount'].quantize(fields['amount'].validate_precision(Decimal(str(amount))))
+            return {
+                'transaction_id': _as_uuid(row['transaction_id']),
+                'timestamp': fields['timestamp'].enforce_timezone(row['timestamp']),
+                'amount': amount,
+                'currency': currency.upper(),
+                'customer_id': _as_uuid(row['customer_id']),
+                'product_id': _as_uuid(row['product_id']),
+                'quantity': row['quantity'],
+            }
+        except (ValueError, TypeError, AttributeError, DecimalException, serializers.ValidationError):
+            return None
+
+
+def _as_uuid(value):
+    # Parquet stores UUIDs as strings, or as the arrow.uuid extension type read back as uuid.UUID
+    return value if isinstance(value, uuid.UUID) else uuid.UUID(value)
+
+
+class TextRows:
+    """Rows of a record batch as the import reports them, with their values as text like rows of a CSV file."""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def __getitem__(self, index):
+        return {name: None if value is None else str(value) for name, value in self.rows[index].items()}
@@ -0,0 +1,11 @@
+# How an import treats rows whose transaction_id is already stored
+IMPORT_MODE_INSERT = 'insert'                   # reject them as duplicates
+IMPORT_MODE_SKIP_EXISTING = 'skip_existing'     # keep the stored transaction, ignore the row
+IMPORT_MODE_UPSERT = 'upsert'                   # overwrite the stored transaction with the row
+
+IMPORT_MODES = (IMPORT_MODE_INSERT, IMPORT_MODE_SKIP_EXISTING, IMPORT_MODE_UPSERT)
+
+# Header an uploaded CSV file must start with, in this order
+TRANSACTION_CSV_COLUMNS = ('transaction_id', 'timestamp', 'amount', 'currency', 'customer_id', 'product_id', 'quantity')
+# Bytes read from an upload to check its header, the rest is decoded incrementally by the import task
+CSV_SAMPLE_SIZE = 64 * 1024
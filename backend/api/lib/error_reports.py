@@ -0,0 +1,171 @@
+import json
+import struct
+import tempfile
+from datetime import timedelta
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.utils import timezone
+
+from .uploads import get_upload_storage
+
+
+ERROR_REPORTS_DIRECTORY = 'errors'
+
+
+def error_report_name(report_id) -> str:
+    return f"{ERROR_REPORTS_DIRECTORY}/{report_id}.ndjson"
+
+
+def error_index_name(name) -> str:
+    # The number of errors of a report and the offsets of some of its lines, stored next to it so pages neither
+    # count the lines of the whole report nor read it from the start
+    return f"{name}.index"
+
+
+# Every INDEX_INTERVAL-th line of a report has its byte offset in the index, a page skips at most as many lines
+INDEX_INTERVAL = 100
+# Entries of an index, the error count then the offsets of lines 0, INDEX_INTERVAL, 2 * INDEX_INTERVAL...
+INDEX_ENTRY = struct.Struct('>Q')
+
+
+class _ReportFile:
+    """Temporary file of report lines, indexed as they are written."""
+
+    def __init__(self):
+        self.file = tempfile.TemporaryFile()
+        self.count = 0
+        self.size = 0
+        self.offsets = []
+
+    def write(self, line: bytes):
+        if self.count % INDEX_INTERVAL == 0:
+            self.offsets.append(self.size)
+        self.file.write(line)
+        self.count += 1
+        self.size += len(line)
+
+    def save(self, storage, name):
+        """Store the lines under `name`, with their index, and return the name they were stored under."""
+
+        storage.delete(name)
+        storage.delete(error_index_name(name))
+        self.file.seek(0)
+        name = storage.save(name, File(self.file))
+        index = b''.join(INDEX_ENTRY.pack(value) for value in [self.count, *self.offsets])
+        storage.save(error_index_name(name), ContentFile(index))
+        self.file.close()
+        return name
+
+
+def delete_expired_error_reports(max_age: timedelta) -> int:
+    """Delete the stored error reports, and their indexes, last written more than `max_age` ago and return how many
+    files were deleted."""
+
+    storage = get_upload_storage()
+    if not storage.exists(ERROR_REPORTS_DIRECTORY):
+        return 0
+    expired_before = timezone.now() - max_age
+    deleted = 0
+    for file_name in storage.listdir(ERROR_REPORTS_DIRECTORY)[1]:
+        name = f"{ERROR_REPORTS_DIRECTORY}/{file_name}"
+        if storage.get_modified_time(name) < expired_before:
+            storage.delete(name)
+            deleted += 1
+    return deleted
+
+
+class ErrorReport:
+    """Collects the rows rejected by an import without holding all of them in memory.
+
+    The first `sample_size` errors are kept whole, with their row, for the task result. Every error is
+    also spilled to a temporary file as one compact JSON line: the file line number and the error codes
+    per field. `save()` moves that file to the upload storage, where the error endpoint pages through it.
+    """
+
+    def __init__(self, sample_size: int):
+        self.sample_size = sample_size
+        self.sample = []
+        self.count = 0
+        self.file = None
+
+    def add(self, line, row, errors):
+        self.count += 1
+        if len(self.sample) < self.sample_size:
+            self.sample.append({"line": line, "row": row, "errors": errors})
+
+        if self.file is None:
+            self.file = _ReportFile()
+        codes = {field: [getattr(error, 'code', None) for error in field_errors]
+                 for field, field_errors in errors.items()}
+        self.file.write(json.dumps({"line": line, "errors": codes}, separators=(',', ':')).encode('utf-8') + b'\n')
+
+    def save(self, name):
+        """Store the spilled errors under `name` and return it, or return None when nothing was rejected."""
+
+        if self.file is None:
+            return None
+
+        name = self.file.save(get_upload_storage(), name)
+        self.file = None
+        return name
+
+
+def merge_error_reports(names, name):
+    """Concatenate stored error report parts into one report `name`, deleting the parts."""
+
+    names = [part for part in names if part]
+    if not names:
+        return None
+
+    storage = get_upload_storage()
+    # Copied line by line, to index the merged report
+    merged = _ReportFile()
+    for part in names:
+        with storage.open(part, 'rb') as file:
+            for line in iter(file.readline, b''):
+                merged.write(line)
+    name = merged.save(storage, name)
+
+    for part in names:
+        storage.delete(part)
+        storage.delete(error_index_name(part))
+    return name
+
+
+class StoredErrorReport:
+    """Read-only sequence over a stored error report, sliced by the paginator without loading the whole file."""
+
+    def __init__(self, name):
+        self.name = name
+        self.storage = get_upload_storage()
+        self._count = None
+
+    def exists(self):
+        return self.storage.exists(self.name)
+
+    def _index_entry(self, position):
+        with self.storage.open(error_index_name(self.name), 'rb') as file:
+            file.seek(position * INDEX_ENTRY.size)
+            return INDEX_ENTRY.unpack(file.read(INDEX_ENTRY.size))[0]
+
+    def count(self):
+        if self._count is None:
+            self._count = self._index_entry(0)
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index: slice):
+        start, stop, _ = index.indices(self.count())
+        if start >= stop:
+            return []
+        entries = []
+        with self.storage.open(self.name, 'rb') as file:
+            # Seeks to the indexed line before `start`, then reads at most INDEX_INTERVAL - 1 lines to reach it
+            file.seek(self._index_entry(1 + start // INDEX_INTERVAL))
+            for _ in range(start % INDEX_INTERVAL):
+                file.readline()
+            for _ in range(stop - start):
+                entries.append(json.loads(file.readline()))
+        return entries
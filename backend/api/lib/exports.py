@@ -0,0 +1,64 @@
+import csv
+import io
+import json
+import zlib
+
+from api.lib.constants import TRANSACTION_CSV_COLUMNS
+from api.lib.uploads import FORMAT_CSV, FORMAT_NDJSON, COMPRESSION_GZIP
+
+
+EXPORT_FORMATS = (FORMAT_CSV, FORMAT_NDJSON)
+EXPORT_COMPRESSIONS = (COMPRESSION_GZIP,)
+# Content type and file name suffix of each export format, compressed exports are served as .gz files
+EXPORT_CONTENT_TYPES = {FORMAT_CSV: 'text/csv', FORMAT_NDJSON: 'application/x-ndjson'}
+EXPORT_SUFFIXES = {FORMAT_CSV: '.csv', FORMAT_NDJSON: '.ndjson'}
+
+
+def export_chunks(queryset, file_format, chunk_size: int):
+    """Yield the transactions of `queryset` as CSV or NDJSON text, in pieces of `chunk_size` rows.
+
+    Rows are read as tuples through a server-side cursor, `chunk_size` at a time, so memory use does not depend on
+    how many rows are exported. Columns are those of an upload, so an export can be imported again.
+    """
+
+    rows = queryset.values_list(*TRANSACTION_CSV_COLUMNS).iterator(chunk_size=chunk_size)
+    if file_format == FORMAT_CSV:
+        yield _csv_text([TRANSACTION_CSV_COLUMNS])
+        write = _csv_text
+    else:
+        write = _ndjson_text
+
+    chunk = []
+    for row in rows:
+        chunk.append(_text_values(row))
+        if len(chunk) >= chunk_size:
+            yield write(chunk)
+            chunk = []
+    if chunk:
+        yield write(chunk)
+
+
+def gzip_chunks(chunks):
+    """Compress text pieces into a gzip stream as they are produced."""
+
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk.encode('utf-8'))
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def _text_values(row):
+    transaction_id, timestamp, amount, currency, customer_id, product_id, quantity = row
+    return str(transaction_id), timestamp.isoformat(), str(amount), currency, str(customer_id), str(product_id), quantity
+
+
+def _csv_text(rows):
+    output = io.StringIO()
+    csv.writer(output, lineterminator='\n').writerows(rows)
+    return output.getvalue()
+
+
+def _ndjson_text(rows):
+    return ''.join(json.dumps(dict(zip(TRANSACTION_CSV_COLUMNS, row)), separators=(',', ':')) + '\n' for row in rows)
@@ -0,0 +1,96 @@
+import hashlib
+import math
+import re
+import struct
+
+
+# Registers of a sketch, 2^PRECISION of them. The relative standard error of an estimate is 1.04 / sqrt(REGISTERS),
+# about 1.6%, so 95% of estimates are within 3.3% of the exact count. Up to _LINEAR_COUNTING_MAX values (the
+# HyperLogLog++ threshold for this precision), estimates come from linear counting instead, which avoids the bias
+# of the raw estimate there: its error is about 1% for 1000 values, nearly 0 for tens, and 2% near the threshold.
+PRECISION = 12
+REGISTERS = 1 << PRECISION
+_LINEAR_COUNTING_MAX = 11500
+_RANK_BITS = 64 - PRECISION
+_ALPHA = 0.7213 / (1 + 1.079 / REGISTERS)
+_INVERSE_POWERS = [2.0 ** -rank for rank in range(_RANK_BITS + 2)]
+
+# Sketches are stored sparse, as (index, rank) pairs, until holding the registers whole takes less room
+_SPARSE = b'\x00'
+_DENSE = b'\x01'
+_PAIR = struct.Struct('>HB')
+_NONZERO = re.compile(rb'[^\x00]')
+
+
+def hash_value(value) -> int:
+    """64 bit hash of a UUID, or of the text of any other value, the same in every process."""
+
+    data = value.bytes if hasattr(value, 'bytes') else str(value).encode('utf-8')
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'big')
+
+
+class Sketch:
+    """HyperLogLog sketch estimating the number of distinct values added to it, in REGISTERS bytes.
+
+    Sketches of several sets merge into the sketch of their union, which is how daily sketches give the distinct
+    count of any range of days. Adding a value twice, or merging a sketch twice, changes nothing.
+    """
+
+    def __init__(self, registers=None):
+        self.registers = bytearray(registers) if registers is not None else bytearray(REGISTERS)
+
+    @classmethod
+    def from_bytes(cls, data: bytes):
+        data = bytes(data)
+        if data[:1] == _DENSE:
+            return cls(data[1:])
+        sketch = cls()
+        for index, rank in _PAIR.iter_unpack(data[1:]):
+            sketch.registers[index] = rank
+        return sketch
+
+    def to_bytes(self) -> bytes:
+        registers = self.registers
+        if (REGISTERS - registers.count(0)) * _PAIR.size >= REGISTERS:
+            return _DENSE + bytes(registers)
+        # The set registers are found by the regex engine, rather than by a loop over all of them
+        return _SPARSE + b''.join(_PAIR.pack(match.start(), registers[match.start()])
+                                  for match in _NONZERO.finditer(registers))
+
+    def add(self, value):
+        hashed = hash_value(value)
+        index = hashed >> _RANK_BITS
+        rank = _RANK_BITS - (hashed & ((1 << _RANK_BITS) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, values):
+        for value in values:
+            self.add(value)
+
+    def merge(self, *stored: bytes):
+        """Merge in sketches stored with to_bytes()."""
+
+        dense = [self.registers]
+        registers = self.registers
+        for data in stored:
+            data = bytes(data)
+            if data[:1] == _DENSE:
+                dense.append(data[1:])
+                continue
+            for index, rank in _PAIR.iter_unpack(data[1:]):
+                if rank > registers[index]:
+                    registers[index] = rank
+        if len(dense) > 1:
+            # One max() per register over every dense sketch at once
+            self.registers = bytearray(map(max, *dense))
+
+    def estimate(self) -> int:
+        zeros = self.registers.count(0)
+        if zeros == REGISTERS:
+            return 0
+        if zeros:
+            linear = REGISTERS * math.log(REGISTERS / zeros)
+            if linear <= _LINEAR_COUNTING_MAX:
+                return round(linear)
+        return round(_ALPHA * REGISTERS * REGISTERS / sum(map(_INVERSE_POWERS.__getitem__, self.registers)))
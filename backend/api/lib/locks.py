@@ -0,0 +1,28 @@
+from django.db import connection
+
+
+def advisory_lock_keys(transaction_ids) -> list:
+    """The 64 bit advisory lock keys of transaction ids, sorted so every import takes its locks in the same order.
+
+    Two ids may share a key, which only makes their imports wait for each other.
+    """
+
+    return sorted({int.from_bytes(transaction_id.bytes[:8], 'big', signed=True) for transaction_id in transaction_ids})
+
+
+def lock_transaction_ids(transaction_ids):
+    """Lock `transaction_ids` until the end of the current transaction, whether they are stored yet or not.
+
+    Imports read which of their rows are already stored before writing them, to count in the rollups only what
+    changes. Row locks cannot cover ids that do not exist yet: two imports writing the same new id would both
+    count it. On PostgreSQL, transaction level advisory locks on the ids make the second import wait for the
+    first to commit, and then read its row. SQLite transactions take the database write lock when they begin
+    (the IMMEDIATE transaction mode of core.database), which already serializes them.
+    """
+
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        # Volatile functions of the select list are evaluated after the sort, so locks are taken in key order
+        cursor.execute("SELECT pg_advisory_xact_lock(key) FROM unnest(%s::bigint[]) AS key ORDER BY key",
+                       [advisory_lock_keys(transaction_ids)])
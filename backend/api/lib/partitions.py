@@ -0,0 +1,159 @@
+import time
+from datetime import date, datetime
+
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+
+from api.models import Transaction, TransactionKey
+from lib.logging_config import logger
+
+
+# On PostgreSQL the transaction table is range partitioned by month of timestamp (migration 0008). Rows of months
+# without a partition are kept in the default one until their partition is created.
+DEFAULT_PARTITION = 'api_transaction_default'
+PARTITION_PREFIX = 'api_transaction_p'
+
+# Unpartitioned table of every stored transaction_id with its timestamp, kept by triggers. A unique index of a
+# partitioned table must hold its partition key, so this one keeps transaction ids unique across months.
+KEY_TABLE = TransactionKey._meta.db_table
+
+# Advisory lock serializing the processes creating partitions
+_PARTITIONS_LOCK = 'api_transaction_partitions'
+
+# Seconds a process trusts that the partition of a month exists before reading the catalog again, so partitions
+# dropped meanwhile are created again
+KNOWN_PARTITIONS_TTL = 300
+
+# Months the process knows a partition exists for, with the time.monotonic() they were last checked at
+_known_months = {}
+
+
+def transactions_partitioned() -> bool:
+    return connection.vendor == 'postgresql'
+
+
+def month_start(value) -> date:
+    """First day of the month of a date, or of a datetime in the TIME_ZONE setting."""
+
+    if isinstance(value, datetime):
+        value = timezone.localtime(value)
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def months_between(first: date, last: date):
+    """First days of the months from the month of `first` to the month of `last`, both included."""
+
+    month, last = month_start(first), month_start(last)
+    while month <= last:
+        yield month
+        month = add_months(month, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARTITION_PREFIX}{month.year:04d}_{month.month:02d}"
+
+
+def _bound(month: date) -> str:
+    # Partitions begin at midnight in TIME_ZONE, like rollup days. Generated from a date, safe to inline in DDL.
+    return f"'{timezone.make_aware(datetime(month.year, month.month, 1)).isoformat()}'"
+
+
+def partition_months() -> set:
+    """Months with a partition of the transaction table, read from the catalog."""
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT child.relname FROM pg_inherits JOIN pg_class parent ON parent.oid = inhparent "
+                       "JOIN pg_class child ON child.oid = inhrelid WHERE parent.relname = %s",
+                       [Transaction._meta.db_table])
+        names = [name for name, in cursor.fetchall() if name.startswith(PARTITION_PREFIX)]
+    return {date(*map(int, name[len(PARTITION_PREFIX):].split('_')), 1) for name in names}
+
+
+def create_partitions(months) -> list:
+    """Create the partitions of `months` that do not exist yet and return their names.
+
+    Rows of those months already stored in the default partition are moved to their partition: a partition cannot
+    be created while the default one holds rows in its range. Runs in its own transaction, serialized with the other
+    processes creating partitions.
+    """
+
+    if not transactions_partitioned():
+        return []
+    months, checked = set(months), time.monotonic()
+    quote = connection.ops.quote_name
+    table, default = quote(Transaction._meta.db_table), quote(DEFAULT_PARTITION)
+    created = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", [_PARTITIONS_LOCK])
+        for month in sorted(months - partition_months()):
+            name, start, end = partition_name(month), _bound(month), _bound(add_months(month, 1))
+            in_range = f'"timestamp" >= {start} AND "timestamp" < {end}'
+            # Moved out and back through the partitioned table, for the triggers to keep their ids in the key table
+            cursor.execute(f"CREATE TEMPORARY TABLE moved_transactions ON COMMIT DROP AS "
+                           f"SELECT * FROM {default} WHERE {in_range}")
+            cursor.execute(f"DELETE FROM {default} WHERE {in_range}")
+            cursor.execute(f"CREATE TABLE {quote(name)} PARTITION OF {table} FOR VALUES FROM ({start}) TO ({end})")
+            cursor.execute(f"INSERT INTO {table} SELECT * FROM moved_transactions")
+            cursor.execute("DROP TABLE moved_transactions")
+            created.append(name)
+        # Only once committed, partitions created in a transaction rolled back later do not exist
+        transaction.on_commit(lambda: _known_months.update(dict.fromkeys(months, checked)))
+    return created
+
+
+def ensure_partitions(timestamps):
+    """Create the missing partitions of the months of `timestamps`, checking the catalog only for months this
+    process has not checked in the last KNOWN_PARTITIONS_TTL seconds. Called before import batches are written,
+    outside of their transaction.
+
+    A partition that cannot be created is logged and tried again by the next call: rows of its month are kept in
+    the default partition meanwhile.
+    """
+
+    if not transactions_partitioned():
+        return
+    now = time.monotonic()
+    months = {month for month in map(month_start, timestamps)
+              if now - _known_months.get(month, -KNOWN_PARTITIONS_TTL) >= KNOWN_PARTITIONS_TTL}
+    if not months:
+        return
+    try:
+        create_partitions(months)
+    except DatabaseError as e:
+        logger.warning(f"Creating the transaction partitions of {sorted(months)} failed ({e}).")
+
+
+def forget_partitions():
+    """Drop the months this process knows partitions for, as after partitions were dropped."""
+
+    _known_months.clear()
+
+
+def stored_transaction_ids(transaction_ids) -> set:
+    """The transaction ids of `transaction_ids` already stored. Read from the key table on PostgreSQL, one index
+    lookup per id instead of one per partition."""
+
+    model = TransactionKey if transactions_partitioned() else Transaction
+    return set(model.objects.filter(transaction_id__in=transaction_ids).values_list('transaction_id', flat=True))
+
+
+def filter_transaction_ids(queryset, transaction_ids):
+    """Filter a Transaction queryset on `transaction_ids`.
+
+    On PostgreSQL the timestamps of the ids are read from the key table first, and the queryset filtered on them
+    too, so that only the partitions holding the ids are searched. A timestamp updated between the two reads makes
+    its row missed, as if the lookup came first.
+    """
+
+    transaction_ids = list(transaction_ids)
+    queryset = queryset.filter(transaction_id__in=transaction_ids)
+    if not transactions_partitioned():
+        return queryset
+    timestamps = set(TransactionKey.objects.filter(transaction_id__in=transaction_ids)
+                     .values_list('timestamp', flat=True))
+    return queryset.filter(timestamp__in=timestamps)
@@ -0,0 +1,67 @@
+import time
+from celery.result import AsyncResult
+
+
+PROGRESS_STATE = 'PROGRESS'
+
+
+def progress_meta(rows_read, rows_inserted, rows_rejected, bytes_read, bytes_total, started_at):
+    """Build the PROGRESS metadata of an import, with throughput and ETA measured since `started_at`."""
+
+    elapsed = max(time.time() - started_at, 0)
+    bytes_per_second = bytes_read / elapsed if elapsed else 0
+    return {
+        "rows_read": rows_read,
+        "rows_inserted": rows_inserted,
+        "rows_rejected": rows_rejected,
+        "bytes_read": bytes_read,
+        "bytes_total": bytes_total,
+        "rows_per_second": round(rows_read / elapsed, 1) if elapsed else None,
+        "eta_seconds": round((bytes_total - bytes_read) / bytes_per_second, 1) if bytes_per_second else None,
+    }
+
+
+class ImportProgress:
+    """Publishes the progress of an import as the PROGRESS state of its task, at most every `interval` seconds."""
+
+    def __init__(self, task, bytes_total, interval):
+        # Tasks called directly or eagerly have no result backend to publish to
+        self.enabled = task is not None and bool(task.request.id) and not task.request.is_eager
+        self.task = task
+        self.bytes_total = bytes_total
+        self.interval = interval
+        self.started_at = time.time()
+        self.published_at = time.monotonic()
+
+    def update(self, rows_read, rows_inserted, rows_rejected, bytes_read):
+        if not self.enabled or time.monotonic() - self.published_at < self.interval:
+            return
+
+        self.published_at = time.monotonic()
+        self.task.update_state(state=PROGRESS_STATE, meta=progress_meta(
+            rows_read, rows_inserted, rows_rejected, bytes_read, self.bytes_total, self.started_at))
+
+
+def chunked_progress(meta):
+    """Sum the progress of the chunk tasks of a file imported in parallel.
+
+    `meta` is the PROGRESS metadata published by the task before it was replaced by its chunks:
+    the chunk task ids with the size of their byte ranges, and the import start time.
+    """
+
+    rows_read = rows_inserted = rows_rejected = bytes_read = 0
+    for chunk in meta["chunks"]:
+        result = AsyncResult(chunk["task_id"])
+        if result.state == PROGRESS_STATE:
+            rows_read += result.info["rows_read"]
+            rows_inserted += result.info["rows_inserted"]
+            rows_rejected += result.info["rows_rejected"]
+            bytes_read += result.info["bytes_read"]
+        elif result.state == 'SUCCESS':
+            rows_read += result.result["rows_read"]
+            rows_inserted += result.result["inserted"]
+            rows_rejected += result.result["rejected"]
+            bytes_read += chunk["bytes"]
+
+    bytes_total = sum(chunk["bytes"] for chunk in meta["chunks"])
+    return progress_meta(rows_read, rows_inserted, rows_rejected, bytes_read, bytes_total, meta["started_at"])
@@ -0,0 +1,102 @@
+from collections import defaultdict
+from decimal import Decimal
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.dispatch import Signal
+from django.utils import timezone
+
+from api.models import Transaction, TransactionDailyRollup
+from api.lib.sketches import update_sketches, rebuild_sketches
+
+
+# Fields identifying a rollup row, and the totals summed into it
+ROLLUP_KEY = ('day', 'customer_id', 'product_id', 'currency')
+ROLLUP_TOTALS = ('transaction_count', 'amount_total', 'quantity_total')
+
+# Sent once the rollups of the `customer_ids` and `product_ids` sets changed and the change is committed.
+# Both are None when every rollup may have changed.
+rollups_updated = Signal()
+
+
+def rollup_day(timestamp):
+    """Return the day a transaction timestamp is rolled up into, its date in the TIME_ZONE setting."""
+
+    return timezone.localdate(timestamp) if timezone.is_aware(timestamp) else timestamp.date()
+
+
+def rollup_deltas(added=(), removed=()):
+    """Sum transactions into {rollup key: [count, amount, quantity]} changes, `removed` ones counting negatively."""
+
+    fields = {name: Transaction._meta.get_field(name)
+              for name in ('timestamp', 'customer_id', 'product_id', 'currency', 'amount', 'quantity')}
+    deltas = defaultdict(lambda: [0, Decimal(0), 0])
+    for sign, transactions in ((1, added), (-1, removed)):
+        for instance in transactions:
+            # Instances may still hold the strings they were built from, as with Transaction.objects.create(**row)
+            values = {name: field.to_python(getattr(instance, field.attname)) for name, field in fields.items()}
+            totals = deltas[(rollup_day(values['timestamp']), values['customer_id'], values['product_id'],
+                             values['currency'])]
+            totals[0] += sign
+            totals[1] += sign * values['amount']
+            totals[2] += sign * values['quantity']
+    return {key: totals for key, totals in deltas.items() if any(totals)}
+
+
+def update_rollups(added=(), removed=()):
+    """Add transactions to the daily rollups and subtract the `removed` ones, in a single statement.
+
+    Rollup rows are incremented in place with INSERT ... ON CONFLICT DO UPDATE, so concurrent imports touching
+    the same rows add up instead of overwriting each other. Rows are written in key order, so they also lock
+    them in the same order. Rows left without transactions are deleted, and the daily distinct value sketches
+    follow the changes.
+    """
+
+    deltas = rollup_deltas(added, removed)
+    if not deltas:
+        return
+
+    quote = connection.ops.quote_name
+    table = quote(TransactionDailyRollup._meta.db_table)
+    fields = [TransactionDailyRollup._meta.get_field(name) for name in ROLLUP_KEY + ROLLUP_TOTALS]
+    columns = [quote(field.column) for field in fields]
+    increments = ', '.join(f"{column} = {table}.{column} + excluded.{column}" for column in columns[len(ROLLUP_KEY):])
+    sql = (f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))}) "
+           f"ON CONFLICT ({', '.join(columns[:len(ROLLUP_KEY)])}) DO UPDATE SET {increments}")
+    params = [[field.get_db_prep_save(value, connection) for field, value in zip(fields, key + tuple(totals))]
+              for key, totals in sorted(deltas.items())]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+    customer_ids = {customer_id for _, customer_id, _, _ in deltas}
+    product_ids = {product_id for _, _, product_id, _ in deltas}
+    if removed:
+        TransactionDailyRollup.objects.filter(transaction_count__lte=0, customer_id__in=customer_ids).delete()
+    update_sketches(deltas)
+    transaction.on_commit(lambda: rollups_updated.send(
+        sender=TransactionDailyRollup, customer_ids=customer_ids, product_ids=product_ids))
+
+
+def rebuild_rollups(batch_size: int = 10_000) -> int:
+    """Recompute every rollup row, and the daily sketches, from the stored transactions and return how many rollup
+    rows there are."""
+
+    groups = (Transaction.objects.annotate(day=TruncDate('timestamp'))
+              .values(*ROLLUP_KEY)
+              .annotate(transaction_count=Count('pk'), amount_total=Sum('amount'), quantity_total=Sum('quantity'))
+              .order_by())
+    created = 0
+    with transaction.atomic():
+        TransactionDailyRollup.objects.all().delete()
+        batch = []
+        for group in groups.iterator(chunk_size=batch_size):
+            batch.append(TransactionDailyRollup(**group))
+            if len(batch) >= batch_size:
+                created += len(TransactionDailyRollup.objects.bulk_create(batch))
+                batch = []
+        if batch:
+            created += len(TransactionDailyRollup.objects.bulk_create(batch))
+        rebuild_sketches(batch_size)
+        transaction.on_commit(lambda: rollups_updated.send(
+            sender=TransactionDailyRollup, customer_ids=None, product_ids=None))
+    return created
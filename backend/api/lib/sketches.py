@@ -0,0 +1,117 @@
+import operator
+from collections import defaultdict
+from functools import reduce
+from itertools import groupby
+from django.db import transaction
+from django.db.models import Q
+
+from api.models import TransactionDailyRollup, DistinctDailySketch
+from api.lib.hll import Sketch
+
+
+# Fields sketched per day, with the field whose distinct values their sketches hold
+SKETCHED_FIELDS = {'customer_id': 'product_id', 'product_id': 'customer_id'}
+
+
+def sketch_rows(pairs):
+    """Build daily sketches from (entity_id, day, value) tuples ordered by entity_id and day.
+
+    Yields (entity_id, day, stored sketch) tuples, one per entity and day.
+    """
+
+    for (entity_id, day), values in groupby(pairs, key=lambda pair: pair[:2]):
+        sketch = Sketch()
+        sketch.update(value for _, _, value in values)
+        yield entity_id, day, sketch.to_bytes()
+
+
+@transaction.atomic(savepoint=False)
+def update_sketches(deltas):
+    """Bring the daily sketches in line with rollup changes, given as returned by rollup_deltas().
+
+    Sketches cannot forget a value: the values of rollup keys gaining transactions are added to the stored
+    sketches, and the sketches of keys losing some are built again from the rollups, which must already be
+    updated. Rows are created before being locked and written in key order, like the rollups, in a transaction
+    of their own when called outside of one, as for single saves. Within one, no savepoint is added.
+    """
+
+    added = defaultdict(set)
+    stale = set()
+    for (day, customer_id, product_id, _), (count, _, _) in deltas.items():
+        values = {'customer_id': customer_id, 'product_id': product_id}
+        for field, value_field in SKETCHED_FIELDS.items():
+            key, value = (field, values[field], day), values[value_field]
+            if count > 0:
+                added[key].add(value)
+            elif count < 0:
+                stale.add(key)
+    keys = sorted(set(added) | stale)
+    if not keys:
+        return
+
+    empty = Sketch().to_bytes()
+    DistinctDailySketch.objects.bulk_create([
+        DistinctDailySketch(field=field, entity_id=entity_id, day=day, registers=empty)
+        for field, entity_id, day in keys
+    ], ignore_conflicts=True)
+    # Locked in one statement, in key order
+    rows = (DistinctDailySketch.objects.select_for_update()
+            .filter(reduce(operator.or_, [Q(field=field, entity_id__in=entity_ids, day__in=days)
+                                          for field, entity_ids, days in _by_field(keys)]))
+            .order_by('field', 'entity_id', 'day').values_list('field', 'entity_id', 'day', 'registers'))
+    stored = {(field, entity_id, day): registers for field, entity_id, day, registers in rows}
+
+    sketches = {key: Sketch.from_bytes(stored[key]) for key in keys if key not in stale}
+    for key, sketch in _rebuilt(stale).items():
+        sketches[key] = sketch
+    for key, values in added.items():
+        sketches[key].update(values)
+
+    DistinctDailySketch.objects.bulk_create([
+        DistinctDailySketch(field=field, entity_id=entity_id, day=day,
+                            registers=sketches[(field, entity_id, day)].to_bytes())
+        for field, entity_id, day in keys
+    ], update_conflicts=True, unique_fields=['field', 'entity_id', 'day'], update_fields=['registers'])
+    # Sketches built again from no rollup at all belong to days without transactions left
+    for field, entity_ids, days in _by_field(stale):
+        DistinctDailySketch.objects.filter(field=field, entity_id__in=entity_ids, day__in=days,
+                                           registers=empty).delete()
+
+
+def _rebuilt(keys) -> dict:
+    # Sketches of `keys` built from the distinct values their rollups hold, empty for keys without rollups
+    sketches = {key: Sketch() for key in keys}
+    for field, entity_ids, days in _by_field(keys):
+        pairs = (TransactionDailyRollup.objects.filter(**{f'{field}__in': entity_ids}, day__in=days)
+                 .values_list(field, 'day', SKETCHED_FIELDS[field]).distinct())
+        for entity_id, day, value in pairs:
+            if (field, entity_id, day) in sketches:
+                sketches[(field, entity_id, day)].add(value)
+    return sketches
+
+
+def _by_field(keys):
+    # (field, entity ids, days) of the (field, entity_id, day) keys of each field, the ids and days to filter on
+    for field in SKETCHED_FIELDS:
+        field_keys = [key for key in keys if key[0] == field]
+        if field_keys:
+            yield field, {key[1] for key in field_keys}, {key[2] for key in field_keys}
+
+
+def rebuild_sketches(batch_size: int = 10_000) -> int:
+    """Build every daily sketch again from the rollups and return how many there are."""
+
+    DistinctDailySketch.objects.all().delete()
+    created = 0
+    for field, value_field in SKETCHED_FIELDS.items():
+        pairs = (TransactionDailyRollup.objects.values_list(field, 'day', value_field).distinct()
+                 .order_by(field, 'day'))
+        batch = []
+        for entity_id, day, registers in sketch_rows(pairs.iterator(chunk_size=batch_size)):
+            batch.append(DistinctDailySketch(field=field, entity_id=entity_id, day=day, registers=registers))
+            if len(batch) >= batch_size:
+                created += len(DistinctDailySketch.objects.bulk_create(batch))
+                batch = []
+        if batch:
+            created += len(DistinctDailySketch.objects.bulk_create(batch))
+    return created
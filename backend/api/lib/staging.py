@@ -0,0 +1,74 @@
+from django.conf import settings
+from django.db import connection
+
+from api.models import Transaction
+from api.lib.constants import IMPORT_MODE_INSERT, IMPORT_MODE_UPSERT
+from api.lib.partitions import KEY_TABLE
+
+
+STAGING_TABLE = 'transaction_import_staging'
+
+COPY_FIELDS = Transaction._meta.concrete_fields
+
+
+def copy_supported(mode=IMPORT_MODE_INSERT) -> bool:
+    """Whether imports load their batches with COPY, only available on PostgreSQL.
+
+    The partitioned transaction table has no unique index on transaction_id alone for ON CONFLICT to use, so on
+    PostgreSQL batches skipping or overwriting stored rows are always merged from the staging table.
+    """
+
+    return connection.vendor == 'postgresql' and (settings.TRANSACTION_IMPORT_COPY or mode != IMPORT_MODE_INSERT)
+
+
+def merge_sql(mode) -> str:
+    """The statement moving the staged rows into the transaction table, returning the transaction_id of each row
+    written. Rows whose transaction_id is stored are skipped, or overwrite the stored ones in upsert mode.
+
+    Stored ids are looked up in the key table of api.lib.partitions, which holds them all whatever their month.
+    Callers lock the staged ids first, so no other import writes them between this lookup and the insert.
+    """
+
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(field.column) for field in COPY_FIELDS)
+    key = quote(Transaction._meta.pk.column)
+    insert = (f"INSERT INTO {quote(Transaction._meta.db_table)} ({columns}) "
+              f"SELECT {columns} FROM {quote(STAGING_TABLE)} AS staged WHERE NOT EXISTS "
+              f"(SELECT 1 FROM {quote(KEY_TABLE)} AS stored WHERE stored.{key} = staged.{key}) RETURNING {key}")
+    if mode != IMPORT_MODE_UPSERT:
+        return insert
+
+    # Stored rows are matched on their timestamp in the key table too, which finds them with their primary key.
+    # Rows moved to another month by their new timestamp are moved to its partition by the update.
+    updates = ', '.join(f"{quote(field.column)} = staged.{quote(field.column)}"
+                        for field in COPY_FIELDS if not field.primary_key)
+    timestamp = quote(Transaction._meta.get_field('timestamp').column)
+    return (f"WITH updated AS (UPDATE {quote(Transaction._meta.db_table)} AS stored SET {updates} "
+            f"FROM {quote(STAGING_TABLE)} AS staged JOIN {quote(KEY_TABLE)} AS keys ON keys.{key} = staged.{key} "
+            f"WHERE stored.{key} = staged.{key} AND stored.{timestamp} = keys.{timestamp} RETURNING stored.{key}), "
+            f"inserted AS ({insert}) "
+            f"SELECT {key} FROM updated UNION ALL SELECT {key} FROM inserted")
+
+
+def copy_transactions(instances, mode) -> set:
+    """Stream `instances` into a staging table with COPY FROM STDIN and merge them into the transaction table in
+    one statement. Returns the transaction_ids written.
+
+    The staging table is a temporary table dropped on commit, so this must run in a transaction. Instances must
+    have distinct transaction_ids, as returned by the row validators.
+    """
+
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(f"CREATE TEMPORARY TABLE {quote(STAGING_TABLE)} "
+                       f"(LIKE {quote(Transaction._meta.db_table)} INCLUDING DEFAULTS) ON COMMIT DROP")
+        columns = ', '.join(quote(field.column) for field in COPY_FIELDS)
+        with cursor.copy(f"COPY {quote(STAGING_TABLE)} ({columns}) FROM STDIN") as copy:
+            for instance in instances:
+                copy.write_row([field.get_db_prep_save(getattr(instance, field.attname), connection)
+                                for field in COPY_FIELDS])
+        cursor.execute(merge_sql(mode))
+        written = {transaction_id for transaction_id, in cursor.fetchall()}
+        # Dropped now for the next batch of a transaction holding several
+        cursor.execute(f"DROP TABLE {quote(STAGING_TABLE)}")
+    return written
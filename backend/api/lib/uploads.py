@@ -0,0 +1,287 @@
+import csv
+import gzip
+import io
+import json
+import uuid
+import zlib
+from django.conf import settings
+from django.core.files.storage import storages
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+UPLOAD_STORAGE_ALIAS = 'transaction_uploads'
+
+FORMAT_CSV = 'csv'
+FORMAT_NDJSON = 'ndjson'
+FORMAT_PARQUET = 'parquet'
+COMPRESSION_GZIP = 'gzip'
+COMPRESSION_ZSTD = 'zstd'
+# Accepted upload file name suffixes, with the format and compression they stand for
+UPLOAD_SUFFIXES = {
+    '.csv': (FORMAT_CSV, None),
+    '.csv.gz': (FORMAT_CSV, COMPRESSION_GZIP),
+    '.csv.zst': (FORMAT_CSV, COMPRESSION_ZSTD),
+    '.ndjson': (FORMAT_NDJSON, None),
+    '.ndjson.gz': (FORMAT_NDJSON, COMPRESSION_GZIP),
+    '.ndjson.zst': (FORMAT_NDJSON, COMPRESSION_ZSTD),
+    '.parquet': (FORMAT_PARQUET, None),
+}
+# Raised while reading a corrupted or truncated compressed upload
+DECOMPRESSION_ERRORS = (gzip.BadGzipFile, zlib.error, EOFError) + ((zstandard.ZstdError,) if zstandard else ())
+
+
+class InvalidUpload(ValueError):
+    """Raised when a stored upload cannot be imported at all, the message tells the user why."""
+
+
+class UndecodableRow(dict):
+    """A row read from lines that are not valid UTF-8, decoded with replacement characters.
+
+    Uploads are decoded as they are imported, after the batches before the line may have been committed, so the
+    import task rejects the row like an invalid one rather than failing the whole upload.
+    """
+
+
+class UploadTooLarge(InvalidUpload):
+    """Raised when a compressed upload decompresses to more than TRANSACTION_UPLOAD_MAX_DECOMPRESSED_SIZE bytes."""
+
+
+def get_upload_storage():
+    """Return the storage where uploaded files wait for the import task."""
+
+    return storages[UPLOAD_STORAGE_ALIAS]
+
+
+def upload_suffix(file_name):
+    """Return the accepted suffix `file_name` ends with, or None."""
+
+    for suffix in sorted(UPLOAD_SUFFIXES, key=len, reverse=True):
+        if file_name.endswith(suffix):
+            return suffix
+    return None
+
+
+def upload_format(file_name):
+    """Return the (format, compression) pair of an upload from its name, (None, None) for unaccepted names."""
+
+    return UPLOAD_SUFFIXES.get(upload_suffix(file_name), (None, None))
+
+
+def upload_compression(file_name):
+    return upload_format(file_name)[1]
+
+
+def open_decompressed(file, compression):
+    """Wrap a binary file in a stream decompressing it as it is read. The file is left open when the stream closes."""
+
+    if compression == COMPRESSION_GZIP:
+        return gzip.GzipFile(fileobj=file, mode='rb')
+    if compression == COMPRESSION_ZSTD:
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(file, closefd=False))
+    return file
+
+
+def save_upload(file) -> str:
+    """Store an uploaded file chunk by chunk and return the name the import task can open it with.
+
+    The stored name keeps the suffix of the uploaded one, which tells the import task its format and compression.
+    """
+
+    suffix = upload_suffix(file.name or '') or '.csv'
+    return get_upload_storage().save(f"{uuid.uuid4()}{suffix}", file)
+
+
+def delete_upload(file_name):
+    get_upload_storage().delete(file_name)
+
+
+def split_upload(file_name, chunk_rows: int, max_chunks: int):
+    """Read the header of a stored CSV upload and split its body into byte ranges of whole rows.
+
+    Ranges hold at least `chunk_rows` rows (the last one may hold fewer) and are merged when there
+    would be more than `max_chunks` of them. Returns the header field names and a list of
+    (start, end, line_offset) tuples: the byte offsets of the range and the number of file lines before it.
+
+    Compressed uploads cannot be read from an offset, they are returned as a single range from the end of the
+    header, in decompressed bytes, to an `end` of None.
+    """
+
+    compression = upload_compression(file_name)
+    if compression:
+        return _split_compressed_upload(file_name, compression)
+
+    with get_upload_storage().open(file_name, 'rb') as file:
+        header = file.readline()
+        if not header:
+            return None, []
+        # The serializer accepts files starting with a byte order mark
+        fieldnames = next(csv.reader([header.decode('utf-8-sig')]))
+
+        start = position = len(header)
+        boundaries = []
+        rows = lines = 0
+        quoted = False
+        for line in iter(file.readline, b''):
+            position += len(line)
+            lines += 1
+            # A quoted field may span several lines, a range can only end where no quote is open
+            quoted ^= line.count(b'"') % 2 == 1
+            if quoted:
+                continue
+            rows += 1
+            if rows % chunk_rows == 0:
+                boundaries.append((position, lines))
+
+    if position == start:
+        return fieldnames, []
+    if not boundaries or boundaries[-1][0] != position:
+        boundaries.append((position, lines))
+
+    step = -(-len(boundaries) // max_chunks)
+    ends = boundaries[step - 1::step]
+    if ends[-1][0] != position:
+        ends.append((position, lines))
+    starts = [(start, 0)] + ends[:-1]
+    return fieldnames, [(chunk_start, chunk_end, 1 + lines_before)
+                        for (chunk_start, lines_before), (chunk_end, _) in zip(starts, ends)]
+
+
+def _split_compressed_upload(file_name, compression):
+    max_size = settings.TRANSACTION_UPLOAD_MAX_DECOMPRESSED_SIZE
+    with get_upload_storage().open(file_name, 'rb') as file, open_decompressed(file, compression) as stream:
+        header = stream.readline(max_size + 1)
+        if len(header) > max_size:
+            raise UploadTooLarge(f"Decompressed upload exceeds {max_size} bytes.")
+        if not header:
+            return None, []
+        fieldnames = next(csv.reader([header.decode('utf-8-sig')]))
+        if not stream.read(1):
+            return fieldnames, []
+    return fieldnames, [(len(header), None, 1)]
+
+
+def ndjson_range(file_name):
+    """Return the single (start, end, line_offset) range an NDJSON upload is imported as.
+
+    NDJSON files have no header and are not split, `end` is None for compressed ones.
+    """
+
+    if upload_compression(file_name):
+        return 0, None, 0
+    return 0, get_upload_storage().size(file_name), 0
+
+
+class UploadRows:
+    """Iterable over the rows stored between the `start` and `end` byte offsets of an upload, as dicts.
+
+    Lines are decoded one at a time, so the file is never held in memory as a whole. Rows holding a line that
+    is not valid UTF-8 are yielded as UndecodableRow. `bytes_read` tells how far into the range the iteration got, and `line_number` on which
+    line of the file the last row read ends, given the `line_offset` lines before the range.
+
+    Compressed uploads are decompressed as they are read, from the decompressed `start` offset to the end of
+    the file. Their `bytes_read` and `bytes_total` count stored, compressed bytes, and reading past
+    TRANSACTION_UPLOAD_MAX_DECOMPRESSED_SIZE decompressed bytes raises UploadTooLarge.
+    """
+
+    def __init__(self, file_name, fieldnames, start: int, end: int, line_offset: int = 1):
+        self.file_name = file_name
+        self.fieldnames = fieldnames
+        self.start = start
+        self.end = end
+        self.line_offset = line_offset
+        self.compression = upload_compression(file_name)
+        self.bytes_read = 0
+        self.reader = None
+        # Whether a line decoded since the last row was yielded is not valid UTF-8
+        self.undecodable = False
+
+    @property
+    def line_number(self):
+        return self.line_offset + self.reader.line_num
+
+    @property
+    def bytes_total(self):
+        if self.compression:
+            return get_upload_storage().size(self.file_name)
+        return self.end - self.start
+
+    def __iter__(self):
+        with get_upload_storage().open(self.file_name, 'rb') as file:
+            if self.compression:
+                with open_decompressed(file, self.compression) as stream:
+                    stream.read(self.start)
+                    yield from self._read_rows(self._decompress_lines(file, stream))
+                return
+
+            file.seek(self.start)
+            yield from self._read_rows(self._decode_lines(file))
+
+    def _read_rows(self, lines):
+        self.reader = csv.DictReader(lines, fieldnames=self.fieldnames)
+        # The reader does not read ahead, the lines decoded for a row all belong to it
+        for row in self.reader:
+            yield self._checked(row)
+
+    def _checked(self, row):
+        if not self.undecodable:
+            return row
+        self.undecodable = False
+        return UndecodableRow(row or {})
+
+    def _decode(self, line):
+        try:
+            return line.decode('utf-8')
+        except UnicodeDecodeError:
+            self.undecodable = True
+            return line.decode('utf-8', errors='replace')
+
+    def _decode_lines(self, file):
+        size = self.end - self.start
+        # Storage files restart from the beginning when iterated directly, hence readline()
+        for line in iter(file.readline, b''):
+            if self.bytes_read >= size:
+                return
+            self.bytes_read += len(line)
+            yield self._decode(line)
+
+    def _decompress_lines(self, file, stream):
+        max_size = settings.TRANSACTION_UPLOAD_MAX_DECOMPRESSED_SIZE
+        decompressed = self.start
+        # Lines are read with a limit, so a line without an end cannot decompress the whole file into memory
+        for line in iter(lambda: stream.readline(max_size - decompressed + 1), b''):
+            decompressed += len(line)
+            if decompressed > max_size:
+                raise UploadTooLarge(f"Decompressed upload exceeds {max_size} bytes.")
+            self.bytes_read = file.tell()
+            yield self._decode(line)
+
+
+class NdjsonRows(UploadRows):
+    """Iterable over the objects of an NDJSON upload range, one per line.
+
+    Blank lines are skipped and a line that does not hold a JSON object is yielded as None, or as UndecodableRow
+    if it is not valid UTF-8, so the import task can reject it with its line number.
+    """
+
+    def __init__(self, file_name, start: int, end: int, line_offset: int = 0):
+        super().__init__(file_name, None, start, end, line_offset)
+        self.lines_read = 0
+
+    @property
+    def line_number(self):
+        return self.line_offset + self.lines_read
+
+    def _read_rows(self, lines):
+        for line in lines:
+            self.lines_read += 1
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield self._checked(row if isinstance(row, dict) else None)
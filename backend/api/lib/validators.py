@@ -0,0 +1,193 @@
+import uuid
+from decimal import Decimal, DecimalException
+from django.utils.dateparse import parse_datetime
+from rest_framework import serializers
+from rest_framework.exceptions import ErrorDetail
+from rest_framework.fields import empty
+from rest_framework.utils.field_mapping import get_unique_error_message
+
+from api.models import Transaction
+from api.serializers import TransactionSerializer
+from api.lib.constants import IMPORT_MODE_INSERT, IMPORT_MODE_UPSERT
+from api.lib.partitions import stored_transaction_ids
+
+
+DUPLICATE_TRANSACTION_ERROR = ErrorDetail(
+    get_unique_error_message(Transaction._meta.get_field('transaction_id')), code='unique')
+
+
+def _accept(accepted, index, values, mode):
+    """Add a valid row to the batch, keyed by transaction_id. Returns False for a duplicate rejected in insert mode.
+
+    Repeated ids are collapsed, as one statement cannot write the same row twice: skip_existing keeps the first
+    row, upsert the last one.
+    """
+
+    transaction_id = values['transaction_id']
+    if transaction_id in accepted:
+        if mode == IMPORT_MODE_INSERT:
+            return False
+        if mode == IMPORT_MODE_UPSERT:
+            accepted[transaction_id] = (index, Transaction(**values))
+        return True
+
+    accepted[transaction_id] = (index, Transaction(**values))
+    return True
+
+
+class SerializerRowValidator:
+    """Validates a batch of CSV rows with one TransactionSerializer per row."""
+
+    def validate_batch(self, rows, mode=IMPORT_MODE_INSERT):
+        """Split rows into (index, Transaction) pairs ready to save and (index, errors) pairs, both in row order."""
+
+        accepted = {}
+        errors = []
+        for index, row in enumerate(rows):
+            transaction_serializer = TransactionSerializer(data=row)
+            if mode != IMPORT_MODE_INSERT:
+                # Stored ids are not errors in these modes, the database resolves the conflict
+                transaction_serializer.fields['transaction_id'].validators = []
+            if not transaction_serializer.is_valid():
+                errors.append((index, transaction_serializer.errors))
+                continue
+
+            # The uniqueness validator only sees committed rows, so duplicates inside the batch are caught here
+            if not _accept(accepted, index, transaction_serializer.validated_data, mode):
+                errors.append((index, {'transaction_id': [DUPLICATE_TRANSACTION_ERROR]}))
+        return list(accepted.values()), errors
+
+
+class TransactionRowValidator:
+    """Validates a batch of CSV rows with the rules of TransactionSerializer, without its per-row cost.
+
+    The serializer fields are built once. Values are parsed with plain Python, and only a value that fails to
+    parse is handed to its serializer field, so rejected rows get exactly the serializer's error messages.
+    In insert mode, transaction_id uniqueness is checked with one query per batch instead of one query per row.
+    """
+
+    def __init__(self):
+        self.serializer = TransactionSerializer()
+        self.fields = self.serializer.fields
+        self.parsers = {
+            'transaction_id': self._parse_uuid,
+            'timestamp': self._parse_timestamp,
+            'amount': self._parse_amount,
+            'currency': self._parse_currency,
+            'customer_id': self._parse_uuid,
+            'product_id': self._parse_uuid,
+            'quantity': self._parse_quantity,
+        }
+
+    def validate_batch(self, rows, mode=IMPORT_MODE_INSERT):
+        """Split rows into (index, Transaction) pairs ready to save and (index, errors) pairs, both in row order."""
+
+        return self.resolve_batch([self.validate_row(row) for row in rows], mode)
+
+    def resolve_batch(self, parsed_rows, mode=IMPORT_MODE_INSERT):
+        """Apply the transaction_id uniqueness rules to (values, errors) pairs returned by validate_row()."""
+
+        existing_ids = set()
+        if mode == IMPORT_MODE_INSERT:
+            transaction_ids = [values['transaction_id'] for values, _ in parsed_rows if 'transaction_id' in values]
+            existing_ids = stored_transaction_ids(transaction_ids)
+
+        accepted = {}
+        errors = []
+        for index, (values, row_errors) in enumerate(parsed_rows):
+            transaction_id = values.get('transaction_id')
+            # Like the serializer, a row duplicating an already accepted one is rejected along with its other errors
+            if transaction_id in existing_ids or (mode == IMPORT_MODE_INSERT and transaction_id in accepted):
+                row_errors = {'transaction_id': [DUPLICATE_TRANSACTION_ERROR], **row_errors}
+
+            if row_errors:
+                errors.append((index, row_errors))
+            else:
+                _accept(accepted, index, values, mode)
+        return list(accepted.values()), errors
+
+    def validate_row(self, row):
+        """Return the parsed values and the errors of a single row, uniqueness aside."""
+
+        values = {}
+        errors = {}
+        for field_name, parse in self.parsers.items():
+            data = row.get(field_name, empty)
+            try:
+                try:
+                    values[field_name] = parse(data)
+                except _Unparsed:
+                    values[field_name] = self._run_field(field_name, data)
+
+                validate_method = getattr(self.serializer, f'validate_{field_name}')
+                values[field_name] = validate_method(values[field_name])
+            except serializers.ValidationError as exc:
+                values.pop(field_name, None)
+                errors[field_name] = exc.detail
+        return values, errors
+
+    def _run_field(self, field_name, data):
+        field = self.fields[field_name]
+        if field_name == 'transaction_id':
+            # Skip the per-row uniqueness query, validate_batch() checks the whole batch at once
+            (is_empty_value, data) = field.validate_empty_values(data)
+            return data if is_empty_value else field.to_internal_value(data)
+        return field.run_validation(data)
+
+    def _parse_uuid(self, data):
+        if type(data) is str:
+            try:
+                return uuid.UUID(data)
+            except ValueError:
+                pass
+        raise _Unparsed
+
+    def _parse_timestamp(self, data):
+        if type(data) is str:
+            try:
+                parsed = parse_datetime(data)
+            except ValueError:
+                parsed = None
+            if parsed is not None:
+                return self.fields['timestamp'].enforce_timezone(parsed)
+        raise _Unparsed
+
+    def _parse_amount(self, data):
+        field = self.fields['amount']
+        if type(data) is str:
+            data = data.strip()
+            if len(data) <= field.MAX_STRING_LENGTH:
+                try:
+                    value = Decimal(data)
+                except DecimalException:
+                    value = None
+                if value is not None and value.is_finite():
+                    return field.quantize(field.validate_precision(value))
+        raise _Unparsed
+
+    def _parse_currency(self, data):
+        if type(data) is str:
+            value = data.strip()
+            if 0 < len(value) <= self.fields['currency'].max_length and value.isprintable():
+                return value
+        raise _Unparsed
+
+    def _parse_quantity(self, data):
+        field = self.fields['quantity']
+        value = None
+        if type(data) is int:
+            # Integers from NDJSON or Parquet files need no parsing
+            value = data
+        elif type(data) is str and len(data) <= field.MAX_STRING_LENGTH:
+            try:
+                value = int(data)
+            except ValueError:
+                pass
+        if value is not None and (field.min_value is None or value >= field.min_value) \
+                and (field.max_value is None or value <= field.max_value):
+            return value
+        raise _Unparsed
+
+
+class _Unparsed(Exception):
+    """Raised by the fast parsers for values that need the serializer field to be validated."""
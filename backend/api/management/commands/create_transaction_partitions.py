@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.lib.partitions import transactions_partitioned
+from api.tasks import create_transaction_partitions_task
+
+
+class Command(BaseCommand):
+    help = ("Create the monthly partitions of the transaction table for the current month and the next ones, on "
+            "PostgreSQL. Rows already stored for those months in the default partition are moved to them.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=settings.TRANSACTION_PARTITIONS_AHEAD,
+                            help="Number of months after the current one to create partitions for.")
+
+    def handle(self, *args, months, **options):
+        if not transactions_partitioned():
+            self.stdout.write("The transaction table is only partitioned on PostgreSQL.")
+            return
+        created = create_transaction_partitions_task(months)
+        self.stdout.write(f"Created {len(created)} partitions{': ' + ', '.join(created) if created else ''}.")
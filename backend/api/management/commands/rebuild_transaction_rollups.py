@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from api.lib.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = ("Recompute the daily transaction rollups and distinct value sketches read by the reports from the stored "
+            "transactions.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10_000,
+                            help="Number of rollup rows written per insert.")
+
+    def handle(self, *args, batch_size, **options):
+        created = rebuild_rollups(batch_size)
+        self.stdout.write(f"Rebuilt {created} daily rollup rows.")
@@ -4,6 +4,17 @@ import uuid
 from django.db import migrations, models
 
 
+def integer_ids_to_uuids(apps, schema_editor):
+    # PostgreSQL cannot cast integers to uuid, as the AlterField operations below would. The ids are converted first,
+    # padded with zeros, so those operations find uuid columns. Other databases rebuild the table instead.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('ALTER TABLE api_transaction ALTER COLUMN transaction_id DROP IDENTITY IF EXISTS')
+    for column in ('transaction_id', 'customer_id', 'product_id'):
+        schema_editor.execute(f'ALTER TABLE api_transaction ALTER COLUMN {column} TYPE uuid '
+                              f'USING lpad(to_hex({column}), 32, \'0\')::uuid')
+
+
 class Migration(migrations.Migration):
 
     dependencies = [
@@ -11,6 +22,7 @@ class Migration(migrations.Migration):
     ]
 
     operations = [
+        migrations.RunPython(integer_ids_to_uuids, migrations.RunPython.noop),
         migrations.AlterField(
             model_name='transaction',
             name='customer_id',
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.4 on 2026-10-18 13:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_alter_transaction_customer_id_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['customer_id', 'timestamp'], include=('amount', 'currency', 'product_id'), name='transaction_customer_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['product_id', 'timestamp'], include=('amount', 'currency', 'customer_id', 'quantity'), name='transaction_product_time_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.4 on 2026-10-18 13:26
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def roll_up_transactions(apps, schema_editor):
+    # Same grouping as api.lib.rollups.rebuild_rollups(), over the historical models
+    Transaction = apps.get_model('api', 'Transaction')
+    TransactionDailyRollup = apps.get_model('api', 'TransactionDailyRollup')
+    groups = (Transaction.objects.annotate(day=TruncDate('timestamp'))
+              .values('day', 'customer_id', 'product_id', 'currency')
+              .annotate(transaction_count=Count('pk'), amount_total=Sum('amount'), quantity_total=Sum('quantity'))
+              .order_by())
+    batch = []
+    for group in groups.iterator(chunk_size=10_000):
+        batch.append(TransactionDailyRollup(**group))
+        if len(batch) >= 10_000:
+            TransactionDailyRollup.objects.bulk_create(batch)
+            batch = []
+    TransactionDailyRollup.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_transaction_customer_product_time_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransactionDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('customer_id', models.UUIDField()),
+                ('product_id', models.UUIDField()),
+                ('currency', models.CharField(max_length=3)),
+                ('transaction_count', models.IntegerField()),
+                ('amount_total', models.DecimalField(decimal_places=2, max_digits=20)),
+                ('quantity_total', models.BigIntegerField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['customer_id', 'day'], name='rollup_customer_day_idx'), models.Index(fields=['product_id', 'day'], name='rollup_product_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('day', 'customer_id', 'product_id', 'currency'), name='transaction_rollup_key')],
+            },
+        ),
+        migrations.RunPython(roll_up_transactions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 13:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_transaction_daily_rollup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['timestamp', 'transaction_id'], name='transaction_time_idx'),
+        ),
+    ]
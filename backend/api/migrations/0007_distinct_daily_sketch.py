@@ -0,0 +1,73 @@
+# Generated by Django 5.2.4 on 2026-10-18 13:52
+
+import hashlib
+import struct
+from itertools import groupby
+
+from django.db import migrations, models
+
+
+# Copy of the sketch format of api.lib.hll at the time of this migration: HyperLogLog registers of 12 bit
+# precision, built from 64 bit blake2b hashes and stored sparse as (index, rank) pairs while that is smaller
+PRECISION = 12
+REGISTERS = 1 << PRECISION
+RANK_BITS = 64 - PRECISION
+SPARSE = b'\x00'
+DENSE = b'\x01'
+PAIR = struct.Struct('>HB')
+
+# Fields sketched per day, with the field whose distinct values their sketches hold
+SKETCHED_FIELDS = {'customer_id': 'product_id', 'product_id': 'customer_id'}
+
+
+def sketch(values) -> bytes:
+    registers = bytearray(REGISTERS)
+    for value in values:
+        hashed = int.from_bytes(hashlib.blake2b(value.bytes, digest_size=8).digest(), 'big')
+        index = hashed >> RANK_BITS
+        rank = RANK_BITS - (hashed & ((1 << RANK_BITS) - 1)).bit_length() + 1
+        registers[index] = max(registers[index], rank)
+    pairs = [(index, rank) for index, rank in enumerate(registers) if rank]
+    if len(pairs) * PAIR.size >= REGISTERS:
+        return DENSE + bytes(registers)
+    return SPARSE + b''.join(PAIR.pack(index, rank) for index, rank in pairs)
+
+
+def sketch_rollups(apps, schema_editor):
+    # Same sketches as api.lib.sketches.rebuild_sketches(), over the historical models
+    TransactionDailyRollup = apps.get_model('api', 'TransactionDailyRollup')
+    DistinctDailySketch = apps.get_model('api', 'DistinctDailySketch')
+    for field, value_field in SKETCHED_FIELDS.items():
+        pairs = TransactionDailyRollup.objects.values_list(field, 'day', value_field).distinct().order_by(field, 'day')
+        batch = []
+        for (entity_id, day), values in groupby(pairs.iterator(chunk_size=10_000), key=lambda pair: pair[:2]):
+            registers = sketch(value for _, _, value in values)
+            batch.append(DistinctDailySketch(field=field, entity_id=entity_id, day=day, registers=registers))
+            if len(batch) >= 10_000:
+                DistinctDailySketch.objects.bulk_create(batch)
+                batch = []
+        DistinctDailySketch.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_transaction_time_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DistinctDailySketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(max_length=16)),
+                ('entity_id', models.UUIDField()),
+                ('day', models.DateField()),
+                ('registers', models.BinaryField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('field', 'entity_id', 'day'), name='distinct_sketch_key')],
+            },
+        ),
+        migrations.RunPython(sketch_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,127 @@
+# Generated by Django 5.2.4 on 2026-10-18 16:05
+
+from datetime import date, datetime
+
+from django.db import migrations
+from django.utils import timezone
+
+
+# Copy of the partition layout of api.lib.partitions at the time of this migration: one partition per month of
+# timestamp, from midnight in TIME_ZONE, a default partition for the months without one, and an unpartitioned
+# table of transaction ids kept by triggers. A unique index of a partitioned table must hold the partition key,
+# so the primary key becomes (transaction_id, timestamp) and the key table keeps transaction ids unique.
+MONTHS_AHEAD = 3
+
+# One statement each, the function bodies hold semicolons
+KEY_TRIGGERS = [
+    "CREATE TABLE api_transaction_key (transaction_id uuid PRIMARY KEY)",
+    """CREATE FUNCTION api_transaction_key_insert() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        INSERT INTO api_transaction_key (transaction_id) VALUES (NEW.transaction_id);
+        RETURN NEW;
+    END $$""",
+    """CREATE FUNCTION api_transaction_key_delete() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        DELETE FROM api_transaction_key WHERE transaction_id = OLD.transaction_id;
+        RETURN OLD;
+    END $$""",
+    # A changed id moving its row to another partition could not be told from a new row, and Django never
+    # updates primary keys
+    """CREATE FUNCTION api_transaction_key_update() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        RAISE EXCEPTION 'transaction_id cannot be updated' USING ERRCODE = 'feature_not_supported';
+    END $$""",
+    """CREATE FUNCTION api_transaction_key_truncate() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        TRUNCATE api_transaction_key;
+        RETURN NULL;
+    END $$""",
+    # An UPDATE moving a row to another partition fires the DELETE triggers of the old one, then the INSERT
+    # triggers of the new one, which delete and add its id again
+    "CREATE TRIGGER api_transaction_key_insert BEFORE INSERT ON api_transaction "
+    "FOR EACH ROW EXECUTE FUNCTION api_transaction_key_insert()",
+    "CREATE TRIGGER api_transaction_key_delete BEFORE DELETE ON api_transaction "
+    "FOR EACH ROW EXECUTE FUNCTION api_transaction_key_delete()",
+    "CREATE TRIGGER api_transaction_key_update BEFORE UPDATE OF transaction_id ON api_transaction "
+    "FOR EACH ROW WHEN (OLD.transaction_id <> NEW.transaction_id) EXECUTE FUNCTION api_transaction_key_update()",
+    "CREATE TRIGGER api_transaction_key_truncate AFTER TRUNCATE ON api_transaction "
+    "FOR EACH STATEMENT EXECUTE FUNCTION api_transaction_key_truncate()",
+]
+
+DROP_KEY_TRIGGERS = [
+    "DROP TABLE api_transaction_key",
+    "DROP FUNCTION api_transaction_key_insert, api_transaction_key_delete, api_transaction_key_update, "
+    "api_transaction_key_truncate",
+]
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def bound(month):
+    return f"'{timezone.make_aware(datetime(month.year, month.month, 1)).isoformat()}'"
+
+
+def add_indexes(apps, schema_editor):
+    Transaction = apps.get_model('api', 'Transaction')
+    for index in Transaction._meta.indexes:
+        schema_editor.add_index(Transaction, index)
+
+
+def partition_transactions(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    execute = schema_editor.execute
+    execute("ALTER TABLE api_transaction RENAME TO api_transaction_unpartitioned")
+    execute("CREATE TABLE api_transaction (LIKE api_transaction_unpartitioned INCLUDING DEFAULTS) "
+            "PARTITION BY RANGE (\"timestamp\")")
+    execute("CREATE TABLE api_transaction_default PARTITION OF api_transaction DEFAULT")
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT min(\"timestamp\"), max(\"timestamp\") FROM api_transaction_unpartitioned")
+        first, last = cursor.fetchone()
+    today = timezone.localdate()
+    month = date(*timezone.localtime(first).timetuple()[:2], 1) if first else date(today.year, today.month, 1)
+    end = max(date(*timezone.localtime(last).timetuple()[:2], 1) if last else month,
+              add_months(date(today.year, today.month, 1), MONTHS_AHEAD))
+    while month <= end:
+        execute(f"CREATE TABLE api_transaction_p{month.year:04d}_{month.month:02d} PARTITION OF api_transaction "
+                f"FOR VALUES FROM ({bound(month)}) TO ({bound(add_months(month, 1))})")
+        month = add_months(month, 1)
+
+    for statement in KEY_TRIGGERS:
+        execute(statement)
+    execute("INSERT INTO api_transaction SELECT * FROM api_transaction_unpartitioned")
+    execute("DROP TABLE api_transaction_unpartitioned")
+    execute("ALTER TABLE api_transaction ADD PRIMARY KEY (transaction_id, \"timestamp\")")
+    add_indexes(apps, schema_editor)
+
+
+def unpartition_transactions(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    execute = schema_editor.execute
+    execute("CREATE TABLE api_transaction_unpartitioned (LIKE api_transaction INCLUDING DEFAULTS)")
+    execute("INSERT INTO api_transaction_unpartitioned SELECT * FROM api_transaction")
+    execute("DROP TABLE api_transaction")
+    for statement in DROP_KEY_TRIGGERS:
+        execute(statement)
+    execute("ALTER TABLE api_transaction_unpartitioned RENAME TO api_transaction")
+    execute("ALTER TABLE api_transaction ADD PRIMARY KEY (transaction_id)")
+    add_indexes(apps, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    # The table is copied whole, in one transaction
+    atomic = True
+
+    dependencies = [
+        ('api', '0007_distinct_daily_sketch'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_transactions, unpartition_transactions),
+    ]
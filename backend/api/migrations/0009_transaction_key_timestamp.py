@@ -0,0 +1,92 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:20
+
+from django.db import migrations, models
+
+
+# The key table of migration 0008 also holds the timestamp of each id, so a lookup by id reads the partition of
+# its month only. BEFORE UPDATE triggers of a row moved to another partition fire before its DELETE and INSERT
+# ones, so the timestamp is updated here and the row deleted and added again after.
+KEY_TIMESTAMPS = [
+    "ALTER TABLE api_transaction_key ADD COLUMN \"timestamp\" timestamp with time zone",
+    "UPDATE api_transaction_key AS key SET \"timestamp\" = stored.\"timestamp\" "
+    "FROM api_transaction AS stored WHERE stored.transaction_id = key.transaction_id",
+    "ALTER TABLE api_transaction_key ALTER COLUMN \"timestamp\" SET NOT NULL",
+    """CREATE OR REPLACE FUNCTION api_transaction_key_insert() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        INSERT INTO api_transaction_key (transaction_id, "timestamp") VALUES (NEW.transaction_id, NEW."timestamp");
+        RETURN NEW;
+    END $$""",
+    """CREATE OR REPLACE FUNCTION api_transaction_key_update() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        IF OLD.transaction_id <> NEW.transaction_id THEN
+            RAISE EXCEPTION 'transaction_id cannot be updated' USING ERRCODE = 'feature_not_supported';
+        END IF;
+        UPDATE api_transaction_key SET "timestamp" = NEW."timestamp" WHERE transaction_id = NEW.transaction_id;
+        RETURN NEW;
+    END $$""",
+    "DROP TRIGGER api_transaction_key_update ON api_transaction",
+    "CREATE TRIGGER api_transaction_key_update BEFORE UPDATE OF transaction_id, \"timestamp\" ON api_transaction "
+    "FOR EACH ROW WHEN (OLD.transaction_id <> NEW.transaction_id OR OLD.\"timestamp\" <> NEW.\"timestamp\") "
+    "EXECUTE FUNCTION api_transaction_key_update()",
+]
+
+# The functions and trigger of migration 0008
+DROP_KEY_TIMESTAMPS = [
+    """CREATE OR REPLACE FUNCTION api_transaction_key_insert() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        INSERT INTO api_transaction_key (transaction_id) VALUES (NEW.transaction_id);
+        RETURN NEW;
+    END $$""",
+    """CREATE OR REPLACE FUNCTION api_transaction_key_update() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        RAISE EXCEPTION 'transaction_id cannot be updated' USING ERRCODE = 'feature_not_supported';
+    END $$""",
+    "DROP TRIGGER api_transaction_key_update ON api_transaction",
+    "CREATE TRIGGER api_transaction_key_update BEFORE UPDATE OF transaction_id ON api_transaction "
+    "FOR EACH ROW WHEN (OLD.transaction_id <> NEW.transaction_id) EXECUTE FUNCTION api_transaction_key_update()",
+    "ALTER TABLE api_transaction_key DROP COLUMN \"timestamp\"",
+]
+
+
+def add_key_timestamps(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for statement in KEY_TIMESTAMPS:
+        schema_editor.execute(statement)
+
+
+def remove_key_timestamps(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for statement in DROP_KEY_TIMESTAMPS:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_transaction_partitions'),
+    ]
+
+    # The key table is written by triggers and exists on PostgreSQL only, Django only reads it. Transaction keeps
+    # transaction_id as its primary key in the state, see api.models.
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(add_key_timestamps, remove_key_timestamps),
+            ],
+            state_operations=[
+                migrations.CreateModel(
+                    name='TransactionKey',
+                    fields=[
+                        ('transaction_id', models.UUIDField(primary_key=True, serialize=False)),
+                        ('timestamp', models.DateTimeField()),
+                    ],
+                    options={
+                        'db_table': 'api_transaction_key',
+                        'managed': False,
+                    },
+                ),
+            ],
+        ),
+    ]
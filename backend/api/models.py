@@ -2,6 +2,10 @@ from django.db import models
 import uuid
 
 class Transaction(models.Model):
+    # On PostgreSQL the table is partitioned by month of timestamp, its primary key is (transaction_id, timestamp)
+    # and transaction ids are kept unique by TransactionKey (api.lib.partitions, migrations 0008 and 0009). Django
+    # keeps transaction_id as the primary key: it identifies a row on every database, and a composite one would make
+    # saving a transaction with a new timestamp insert a second row.
     transaction_id = models.UUIDField(primary_key=True)
     timestamp = models.DateTimeField()
     amount = models.DecimalField(max_digits=10, decimal_places=2)
@@ -10,10 +14,90 @@ class Transaction(models.Model):
     product_id = models.UUIDField()
     quantity = models.IntegerField()
 
+    class Meta:
+        indexes = [
+            # Customer and product filters of the list and summary views, with the time range and order after them.
+            # Where the database supports covering indexes (PostgreSQL), the summed columns are stored in the index
+            # too, so the summaries never read the table.
+            models.Index(fields=['customer_id', 'timestamp'], include=['amount', 'currency', 'product_id'],
+                         name='transaction_customer_time_idx'),
+            models.Index(fields=['product_id', 'timestamp'], include=['amount', 'currency', 'customer_id', 'quantity'],
+                         name='transaction_product_time_idx'),
+            # Order of the unfiltered transaction list, and key of its cursor pagination
+            models.Index(fields=['timestamp', 'transaction_id'], name='transaction_time_idx'),
+        ]
+
     def __str__(self):
         return f"Transaction {self.transaction_id} - {self.amount} {self.currency}"
 
 
+class TransactionKey(models.Model):
+    """The transaction_id and timestamp of every stored transaction, kept by triggers on PostgreSQL.
+
+    Keeps transaction ids unique across the partitions of the transaction table, and tells which partition holds
+    an id, so lookups by id read only that one (api.lib.partitions). The table is created by migrations 0008 and
+    0009 on PostgreSQL only, Django neither creates nor writes it.
+    """
+
+    transaction_id = models.UUIDField(primary_key=True)
+    timestamp = models.DateTimeField()
+
+    class Meta:
+        managed = False
+        db_table = 'api_transaction_key'
+
+
     
 
 
+
+
+class TransactionDailyRollup(models.Model):
+    """Transactions of one day, customer, product and currency, counted and summed.
+
+    Kept up to date by api.lib.rollups as transactions are imported or saved, so reports read one row per
+    day in place of every transaction. Days are dates in the TIME_ZONE setting, run the
+    rebuild_transaction_rollups command after changing it.
+    """
+
+    day = models.DateField()
+    customer_id = models.UUIDField()
+    product_id = models.UUIDField()
+    currency = models.CharField(max_length=3)
+    transaction_count = models.IntegerField()
+    amount_total = models.DecimalField(max_digits=20, decimal_places=2)
+    quantity_total = models.BigIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'customer_id', 'product_id', 'currency'],
+                                    name='transaction_rollup_key'),
+        ]
+        indexes = [
+            models.Index(fields=['customer_id', 'day'], name='rollup_customer_day_idx'),
+            models.Index(fields=['product_id', 'day'], name='rollup_product_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.customer_id} {self.product_id} - {self.amount_total} {self.currency}"
+
+
+class DistinctDailySketch(models.Model):
+    """HyperLogLog sketch of the distinct products of a customer, or customers of a product, on one day.
+
+    `field` names the field `entity_id` is a value of, customer_id or product_id. Kept up to date by api.lib.sketches
+    along with the daily rollups, and merged over a range of days for approximate distinct counts.
+    """
+
+    field = models.CharField(max_length=16)
+    entity_id = models.UUIDField()
+    day = models.DateField()
+    registers = models.BinaryField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['field', 'entity_id', 'day'], name='distinct_sketch_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.field} {self.entity_id}"
@@ -1,6 +1,121 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import json
+import uuid
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 class TransactionPaginator(PageNumberPagination):
     page_size = 10
     page_size_query_param = 'page_size'
-    max_page_size = 100
\ No newline at end of file
+    max_page_size = 100
+
+class TransactionCursorPaginator(BasePagination):
+    """Keyset pagination of transactions ordered by (timestamp, transaction_id), selected with `pagination=cursor`.
+
+    The cursor holds the key of the last row of a page, and the next page is read with a range condition on the
+    key rather than an OFFSET, so deep pages cost as much as the first one. No COUNT(*) is run: the response only
+    links the next and previous pages.
+    """
+
+    page_size = TransactionPaginator.page_size
+    page_size_query_param = 'page_size'
+    max_page_size = TransactionPaginator.max_page_size
+    cursor_query_param = 'cursor'
+    ordering = ('timestamp', 'transaction_id')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        key, reverse = self.decode_cursor(request)
+
+        if key is not None:
+            timestamp, transaction_id = key
+            after = 'gt' if not reverse else 'lt'
+            # The leading bound on timestamp alone lets the database range scan its index
+            queryset = queryset.filter(**{f'timestamp__{after}e': timestamp}).filter(
+                Q(**{f'timestamp__{after}': timestamp}) | Q(**{f'transaction_id__{after}': transaction_id}))
+        queryset = queryset.order_by(*(f'-{field}' if reverse else field for field in self.ordering))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+        self.has_next = has_more if not reverse else key is not None
+        self.has_previous = has_more if reverse else key is not None
+        # An empty page, past the rows remaining after the cursor, links back to the cursor's own key
+        self.first_key = (rows[0].timestamp, rows[0].transaction_id) if rows else key
+        self.last_key = (rows[-1].timestamp, rows[-1].transaction_id) if rows else key
+        return rows
+
+    def get_page_size(self, request):
+        # Like PageNumberPagination: sizes that are not positive integers fall back to the default, larger ones
+        # than max_page_size are cut to it
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size < 1:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.last_key, reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.encode_cursor(self.first_key, reverse=True)
+
+    def encode_cursor(self, key, reverse):
+        timestamp, transaction_id = key
+        cursor = {'t': timestamp.isoformat(), 'id': str(transaction_id), 'r': reverse}
+        encoded = base64.urlsafe_b64encode(json.dumps(cursor, separators=(',', ':')).encode('ascii')).decode('ascii')
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request):
+        """Return the (timestamp, transaction_id) key in the cursor of the request and its direction."""
+
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None, False
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            timestamp = parse_datetime(cursor['t'])
+            # A cursor without an offset would be read in TIME_ZONE, not where its key came from
+            if timestamp is None or timezone.is_naive(timestamp):
+                raise ValueError(cursor['t'])
+            return (timestamp, uuid.UUID(str(cursor['id']))), bool(cursor['r'])
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+class ErrorReportPaginator(PageNumberPagination):
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
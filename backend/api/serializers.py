@@ -1,6 +1,10 @@
 from rest_framework import serializers
 
 from .models import Transaction
+from .lib.constants import IMPORT_MODES, IMPORT_MODE_INSERT, TRANSACTION_CSV_COLUMNS, CSV_SAMPLE_SIZE
+from .lib import uploads, columnar, exports
+import codecs
+import json
 import uuid
 from datetime import datetime
 from decimal import Decimal
@@ -52,29 +56,104 @@ class TransactionSerializer(serializers.ModelSerializer):
 
 class CsvFileSerializer(serializers.Serializer):
     file = serializers.FileField()
+    mode = serializers.ChoiceField(choices=IMPORT_MODES, default=IMPORT_MODE_INSERT)
 
     def validate_file(self, file):
-        if not file.name.endswith('.csv'):
-            raise serializers.ValidationError("File must be a CSV.")
-        if file.size > 50 * 1024 * 1024:  # 50 MB limit
+        data_format, compression = uploads.upload_format(file.name)
+        if data_format is None:
+            raise serializers.ValidationError("File must be a CSV, NDJSON or Parquet file.")
+        if compression == uploads.COMPRESSION_ZSTD and uploads.zstandard is None:
+            raise serializers.ValidationError("Zstandard compressed files are not supported, install zstandard.")
+        if data_format == uploads.FORMAT_PARQUET and columnar.pyarrow is None:
+            raise serializers.ValidationError("Parquet files are not supported, install pyarrow.")
+        if file.size > 50 * 1024 * 1024:  # 50 MB limit, on the uploaded bytes, the import task limits decompressed ones
             raise serializers.ValidationError(f"File size must not exceed 5 MB, is {file.size} B.")
         if not file:
             raise serializers.ValidationError("File cannot be empty.")
-        
+
+        if data_format == uploads.FORMAT_PARQUET:
+            self._validate_parquet_schema(file)
+        elif data_format == uploads.FORMAT_NDJSON:
+            self._validate_ndjson_object(file, compression)
+        else:
+            self._validate_csv_header(file, compression)
+        return file
+
+    def _validate_csv_header(self, file, compression):
         try:
-            decoded_file = file.read().decode('utf-8')
-            file.seek(0) 
-            csv.Sniffer().sniff(decoded_file.splitlines()[0])
+            header_line = self._read_sample_lines(file, compression)[0]
+            csv.Sniffer().sniff(header_line)
+            header = next(csv.reader([header_line]))
         except Exception:
             raise serializers.ValidationError("Uploaded file is not a valid CSV.")
-        
-        return file
+
+        if header != list(TRANSACTION_CSV_COLUMNS):
+            raise serializers.ValidationError(
+                f"CSV header must be {','.join(TRANSACTION_CSV_COLUMNS)}, is {','.join(header)}.")
+
+    def _validate_ndjson_object(self, file, compression):
+        # Only the first object is checked, the import task rejects the lines of the rest that are not objects
+        try:
+            first_object = json.loads(next(line for line in self._read_sample_lines(file, compression) if line.strip()))
+        except Exception:
+            raise serializers.ValidationError("Uploaded file is not a valid NDJSON file.")
+
+        if not isinstance(first_object, dict) or not set(TRANSACTION_CSV_COLUMNS) <= first_object.keys():
+            raise serializers.ValidationError(
+                f"NDJSON objects must have the keys {','.join(TRANSACTION_CSV_COLUMNS)}.")
+
+    def _validate_parquet_schema(self, file):
+        # Only the footer of the file is read
+        try:
+            file.seek(0)
+            schema = columnar.pq.ParquetFile(file).schema_arrow
+            file.seek(0)
+        except Exception:
+            raise serializers.ValidationError("Uploaded file is not a valid Parquet file.")
+
+        missing = columnar.missing_columns(schema)
+        if missing:
+            raise serializers.ValidationError(f"Parquet file is missing columns: {', '.join(missing)}.")
+
+    def _read_sample_lines(self, file, compression=None):
+        # Only the beginning of the file is read, the import task validates the encoding of the rest line by line
+        file.seek(0)
+        sample = uploads.open_decompressed(file, compression).read(CSV_SAMPLE_SIZE)
+        file.seek(0)
+
+        # The sample may end inside a multi-byte character, which is not an error until the input is final
+        decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        text = decoder.decode(sample, final=len(sample) < CSV_SAMPLE_SIZE)
+        lines = text.splitlines(keepends=True)
+        if len(sample) == CSV_SAMPLE_SIZE and lines and not lines[-1].endswith(('\n', '\r')):
+            lines.pop()
+        if not lines:
+            raise ValueError("No complete line in the sample.")
+        return [line.rstrip('\r\n') for line in lines]
 
 
 class TransactionListSerializer(serializers.Serializer):
     customer_id = serializers.UUIDField(required=False, allow_null=True)
     product_id = serializers.UUIDField(required=False, allow_null=True)
+    pagination = serializers.ChoiceField(choices=['page', 'cursor'], required=False)
+
+class TransactionExportSerializer(serializers.Serializer):
+    customer_id = serializers.UUIDField(required=False, allow_null=True)
+    product_id = serializers.UUIDField(required=False, allow_null=True)
+    start_date = serializers.DateField(required=False)
+    end_date = serializers.DateField(required=False)
+    file_format = serializers.ChoiceField(choices=exports.EXPORT_FORMATS, default=uploads.FORMAT_CSV)
+    compression = serializers.ChoiceField(choices=exports.EXPORT_COMPRESSIONS, required=False)
+
+    def validate(self, data):
+        if 'start_date' in data and 'end_date' in data and data['start_date'] > data['end_date']:
+            raise serializers.ValidationError("Start date cannot be after end date.")
+        return data
 
 class TransactionDetailViewSerializer(serializers.Serializer):
     transaction_id = serializers.UUIDField(required=True)
+
+class ImportErrorSerializer(serializers.Serializer):
+    line = serializers.IntegerField()
+    errors = serializers.DictField(child=serializers.ListField(child=serializers.CharField()))
     
\ No newline at end of file
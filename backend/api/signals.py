@@ -0,0 +1,27 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Transaction
+from .lib.rollups import update_rollups
+from .lib.partitions import filter_transaction_ids
+
+
+# Imports write transactions in bulk and update the rollups themselves, these keep them right for single saves.
+# QuerySet.update() and raw SQL send no signal, run the rebuild_transaction_rollups command after them.
+
+@receiver(pre_save, sender=Transaction)
+def remember_stored_transaction(sender, instance, **kwargs):
+    # A save may overwrite a stored transaction, whatever the state of the instance says
+    instance._stored_transaction = filter_transaction_ids(Transaction.objects.all(), [instance.pk]).first()
+
+
+@receiver(post_save, sender=Transaction)
+def roll_up_saved_transaction(sender, instance, **kwargs):
+    stored = getattr(instance, '_stored_transaction', None)
+    update_rollups(added=[instance], removed=[stored] if stored else ())
+    instance._stored_transaction = None
+
+
+@receiver(post_delete, sender=Transaction)
+def roll_up_deleted_transaction(sender, instance, **kwargs):
+    update_rollups(removed=[instance])
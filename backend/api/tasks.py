@@ -1,34 +1,370 @@
-from celery import shared_task
-import csv
-import io
-from rest_framework.exceptions import ValidationError
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from celery import shared_task, chord, group, uuid
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError, ErrorDetail
+from rest_framework.settings import api_settings
+from django.utils.module_loading import import_string
 
 
-from .serializers import TransactionSerializer
+from .models import Transaction
+from .lib.uploads import (split_upload, ndjson_range, upload_format, UploadRows, NdjsonRows, delete_upload,
+                          InvalidUpload, UndecodableRow, DECOMPRESSION_ERRORS, FORMAT_NDJSON, FORMAT_PARQUET)
+from .lib.columnar import ParquetBatches, RecordBatchValidator, TextRows
+from .lib.progress import ImportProgress, PROGRESS_STATE
+from .lib.validators import DUPLICATE_TRANSACTION_ERROR
+from .lib.error_reports import ErrorReport, error_report_name, merge_error_reports, delete_expired_error_reports
+from .lib.rollups import update_rollups
+from .lib.locks import lock_transaction_ids
+from .lib.partitions import ensure_partitions, create_partitions, filter_transaction_ids, month_start, add_months
+from .lib.staging import copy_supported, copy_transactions
+from .lib.constants import IMPORT_MODE_INSERT, IMPORT_MODE_SKIP_EXISTING, IMPORT_MODE_UPSERT
 from lib.logging_config import logger
 
 
+UPSERT_FIELDS = [field.name for field in Transaction._meta.concrete_fields if not field.primary_key]
+
+# Reported for NDJSON lines that do not hold a JSON object
+INVALID_OBJECT_ERRORS = {api_settings.NON_FIELD_ERRORS_KEY: [ErrorDetail("Line is not a JSON object.", code='invalid')]}
+# Reported for rows holding a line that is not valid UTF-8
+INVALID_ENCODING_ERRORS = {api_settings.NON_FIELD_ERRORS_KEY: [ErrorDetail("Line is not valid UTF-8.", code='invalid')]}
+
+
+@shared_task(bind=True)
+def process_csv_file(self, file_name, batch_size=None, mode=IMPORT_MODE_INSERT):
+    """Import a stored CSV, NDJSON or Parquet upload, fanning large CSV files out to parallel chunk tasks.
+
+    Files with up to TRANSACTION_IMPORT_CHUNK_SIZE rows are imported by this task. Larger ones are split into
+    row ranges imported in parallel by a group of `process_csv_chunk` tasks, and this task is replaced by the
+    chord, so the merged result is reported under its id. Called directly or run eagerly, the chunk tasks are
+    applied one after the other in this process instead. The merged result equals the serial one, except that
+    for two rows sharing a transaction_id in different chunks, either of them may be the one rejected.
+    NDJSON, Parquet and compressed files are always imported by this task.
+
+    The result holds the counts and a sample of the rejected rows, the full list is stored as an error report
+    named after the task id, paged through by TaskErrorsView.
+    """
+
+    report_id = self.request.id or uuid()
+    report_name = error_report_name(report_id)
+    data_format, _ = upload_format(file_name)
+
+    if data_format == FORMAT_PARQUET:
+        try:
+            return _merge_results([_import_parquet(self, file_name, batch_size, mode, report_name)])
+        finally:
+            delete_upload(file_name)
+
+    try:
+        with _reading_upload():
+            if data_format == FORMAT_NDJSON:
+                fieldnames, chunks = None, [ndjson_range(file_name)]
+            else:
+                fieldnames, chunks = split_upload(file_name,
+                                                  settings.TRANSACTION_IMPORT_CHUNK_SIZE,
+                                                  settings.TRANSACTION_IMPORT_MAX_PARALLEL_CHUNKS)
+    except ValidationError:
+        delete_upload(file_name)
+        raise
+
+    if len(chunks) > 1:
+        logger.info(f"Importing {file_name} in {len(chunks)} parallel chunks.")
+        signatures = [process_csv_chunk.s(file_name, fieldnames, start, end, line_offset, batch_size, mode,
+                                          report_name=error_report_name(f"{report_id}.{index}")).set(task_id=uuid())
+                      for index, (start, end, line_offset) in enumerate(chunks)]
+        if not self.request.is_eager:
+            # TaskStatusView sums the progress of the chunk tasks until the chord callback stores the result
+            self.update_state(state=PROGRESS_STATE, meta={
+                "chunks": [{"task_id": signature.id, "bytes": end - start}
+                           for signature, (start, end, _) in zip(signatures, chunks)],
+                "started_at": time.time(),
+            })
+        if self.request.called_directly or self.request.is_eager:
+            # No worker runs the chord, nor result backend tracks it: the chunks are imported here, one by one
+            try:
+                results = [signature.apply(throw=True).get() for signature in signatures]
+            except Exception:
+                delete_upload(file_name)
+                raise
+            return merge_chunk_results(results, file_name, report_name)
+        body = merge_chunk_results.s(file_name, report_name).on_error(discard_upload.si(file_name))
+        return self.replace(chord(group(signatures), body))
+
+    try:
+        results = [_import_rows(self, _upload_rows(file_name, fieldnames, *chunk), batch_size, mode, report_name)
+                   for chunk in chunks]
+    finally:
+        delete_upload(file_name)
+    return _merge_results(results)
+
+
+@shared_task(bind=True)
+def process_csv_chunk(self, file_name, fieldnames, start, end, line_offset=1, batch_size=None,
+                      mode=IMPORT_MODE_INSERT, report_name=None):
+    """Import the rows stored between the `start` and `end` byte offsets of an upload.
+
+    `line_offset` is the number of file lines before `start`, so rejected rows are reported with their file line.
+    """
+
+    return _import_rows(self, _upload_rows(file_name, fieldnames, start, end, line_offset),
+                        batch_size, mode, report_name)
+
+
 @shared_task
-def process_csv_file(file_data):
+def merge_chunk_results(results, file_name, report_name):
+    """Chord callback merging chunk results and error reports in file order, once every chunk has been imported."""
+
+    delete_upload(file_name)
+    merge_error_reports([result['error_report'] for result in results], report_name)
+    return _merge_results(results)
+
+
+@shared_task
+def discard_upload(file_name):
+    delete_upload(file_name)
+
+
+@shared_task
+def create_transaction_partitions_task(months=None):
+    """Periodic task creating the partitions of the transaction table for the current month and the next `months`,
+    TRANSACTION_PARTITIONS_AHEAD by default, so imports rarely wait for one to be created."""
+
+    months = settings.TRANSACTION_PARTITIONS_AHEAD if months is None else months
+    current = month_start(timezone.now())
+    created = create_partitions(add_months(current, index) for index in range(months + 1))
+    logger.info(f"Created {len(created)} transaction partitions.")
+    return created
+
+
+@shared_task
+def delete_expired_error_reports_task():
+    """Periodic task deleting the error reports of imports whose results the result backend has expired."""
+
+    deleted = delete_expired_error_reports(timedelta(seconds=settings.CELERY_RESULT_EXPIRES))
+    logger.info(f"Deleted {deleted} expired error report files.")
+    return deleted
+
+
+def _merge_results(results):
+    rows_read = sum(result['rows_read'] for result in results)
+    inserted = sum(result['inserted'] for result in results)
+    rejected = sum(result['rejected'] for result in results)
+    sample = [error for result in results for error in result['errors']]
+
+    logger.warning(f"Inserted {inserted} of {rows_read} transactions, rejected {rejected}.")
+
+    return {'rows_read': rows_read, 'inserted': inserted, 'rejected': rejected,
+            'errors': sample[:settings.TRANSACTION_IMPORT_ERROR_SAMPLE_SIZE]}
+
+
+@contextmanager
+def _reading_upload():
+    """Turn the errors of an upload that cannot be read into the ValidationError the task fails with."""
 
     try:
-        decoded_file = file_data.decode('utf-8')
+        yield
     except UnicodeDecodeError as e:
         logger.error(f"Error decoding file: {e}")
-        raise ValidationError({"error": "Invalid file format. Please upload a valid CSV file."}, status=400)
+        raise ValidationError({"error": "Invalid file format. Please upload a valid CSV file."})
+    except InvalidUpload as e:
+        logger.error(f"Invalid file: {e}")
+        raise ValidationError({"error": str(e)})
+    except DECOMPRESSION_ERRORS as e:
+        logger.error(f"Error decompressing file: {e}")
+        raise ValidationError({"error": "Invalid compressed file. Please upload a valid compressed CSV file."})
+
+
+def _upload_rows(file_name, fieldnames, start, end, line_offset):
+    if upload_format(file_name)[0] == FORMAT_NDJSON:
+        return NdjsonRows(file_name, start, end, line_offset)
+    return UploadRows(file_name, fieldnames, start, end, line_offset)
+
+
+def _import_rows(task, upload_rows, batch_size=None, mode=IMPORT_MODE_INSERT, report_name=None):
+    """Validate the rows of an upload range and save the valid ones in batches of `batch_size` rows.
+
+    Rejected rows are spilled to an ErrorReport stored as `report_name`, only a sample of them is returned.
+    """
+
+    batch_size = batch_size or settings.TRANSACTION_IMPORT_BATCH_SIZE
+    validator = import_string(settings.TRANSACTION_IMPORT_VALIDATOR)()
+    progress = ImportProgress(task, upload_rows.bytes_total, settings.TRANSACTION_IMPORT_PROGRESS_INTERVAL)
+
+    report = ErrorReport(settings.TRANSACTION_IMPORT_ERROR_SAMPLE_SIZE)
+    inserted = 0
+    rows_read = 0
+    rows = []
+    lines = []
+    with _reading_upload():
+        # The file is read and decoded incrementally, only the current batch is kept in memory
+        for row in upload_rows:
+            rows_read += 1
+            rows.append(row)
+            lines.append(upload_rows.line_number)
+            if len(rows) >= batch_size:
+                inserted += _import_batch(validator, rows, lines, report, mode)
+                rows = []
+                lines = []
+                progress.update(rows_read, inserted, report.count, upload_rows.bytes_read)
+
+    if rows:
+        inserted += _import_batch(validator, rows, lines, report, mode)
+
+    return _import_result(rows_read, inserted, report, report_name)
+
+
+def _import_parquet(task, file_name, batch_size=None, mode=IMPORT_MODE_INSERT, report_name=None):
+    """Validate the record batches of a Parquet upload column by column and save their valid rows.
+
+    Rejected rows are reported with their row number in the file in place of a line number.
+    """
+
+    batch_size = batch_size or settings.TRANSACTION_IMPORT_BATCH_SIZE
+    validator = RecordBatchValidator(import_string(settings.TRANSACTION_IMPORT_VALIDATOR)())
+    batches = ParquetBatches(file_name, batch_size)
+    progress = ImportProgress(task, batches.bytes_total, settings.TRANSACTION_IMPORT_PROGRESS_INTERVAL)
+
+    report = ErrorReport(settings.TRANSACTION_IMPORT_ERROR_SAMPLE_SIZE)
+    inserted = 0
+    with _reading_upload():
+        for batch in batches:
+            rows = batch.to_pylist()
+            first_row = batches.rows_read - batch.num_rows + 1
+            transactions, row_errors = validator.validate_batch(batch, rows, mode)
+            inserted += _save_validated(transactions, row_errors, TextRows(rows),
+                                        range(first_row, first_row + batch.num_rows), report, mode)
+            progress.update(batches.rows_read, inserted, report.count, batches.bytes_read)
+
+    return _import_result(batches.rows_read, inserted, report, report_name)
+
 
-    # I thought also about csv.reader(decoded_file.splitlines()), to iterate over lines
-    csv_reader = csv.DictReader(io.StringIO(decoded_file))
+def _import_result(rows_read, inserted, report, report_name):
+    return {'rows_read': rows_read, 'inserted': inserted, 'rejected': report.count, 'errors': report.sample,
+            'error_report': report.save(report_name) if report_name else None}
 
-    errors = []
-    for row in csv_reader:
-        transaction_serializer = TransactionSerializer(data=row)
-        if transaction_serializer.is_valid():   # I am not raising exception if one of the rows is invalid
-            transaction_serializer.save()
+
+def _import_batch(validator, rows, lines, report, mode):
+    # I am not raising exception if one of the rows is invalid
+    rejected = [(index, errors) for index, row in enumerate(rows) if (errors := _reader_errors(row)) is not None]
+    if not rejected:
+        transactions, row_errors = validator.validate_batch(rows, mode)
+        return _save_validated(transactions, row_errors, rows, lines, report, mode)
+
+    # Rows the upload reader could not read are rejected in file order, along with the rows failing validation
+    rejected_indexes = {index for index, _ in rejected}
+    objects = [index for index in range(len(rows)) if index not in rejected_indexes]
+    transactions, row_errors = validator.validate_batch([rows[index] for index in objects], mode)
+    transactions = [(objects[index], instance) for index, instance in transactions]
+    row_errors = sorted([(objects[index], row_error) for index, row_error in row_errors] + rejected,
+                        key=lambda error: error[0])
+    return _save_validated(transactions, row_errors, rows, lines, report, mode)
+
+
+def _reader_errors(row):
+    """The errors of a row the upload reader could not read, None for the rows to validate."""
+
+    if row is None:
+        return INVALID_OBJECT_ERRORS
+    if type(row) is UndecodableRow:
+        return INVALID_ENCODING_ERRORS
+    return None
+
+
+def _save_validated(transactions, row_errors, rows, lines, report, mode):
+    """Report the rejected rows of a validated batch and save its transactions, returning how many were written."""
+
+    for index, row_error in row_errors:
+        report.add(lines[index], rows[index], row_error)
+    if not transactions:
+        return 0
+    # Partitions are created in their own transaction, before the batch writes rows in them
+    ensure_partitions(instance.timestamp for _, instance in transactions)
+    if copy_supported(mode):
+        return _copy_batch([(lines[index], rows[index], instance) for index, instance in transactions], report, mode)
+    if mode == IMPORT_MODE_INSERT:
+        return _save_batch([(lines[index], rows[index], instance) for index, instance in transactions], report)
+
+    # Conflicts on transaction_id are resolved by the database, in one statement for the whole batch. Not on
+    # PostgreSQL, whose partitioned table has no unique index on transaction_id alone: it merges with COPY
+    instances = [instance for _, instance in transactions]
+    with transaction.atomic():
+        # The stored versions of the rows are read first, for the rollups to count only what changes. Their ids
+        # are locked before, stored or not, so a concurrent import writing the same new id cannot count it too
+        lock_transaction_ids([instance.pk for instance in instances])
+        stored = list(filter_transaction_ids(Transaction.objects.select_for_update(),
+                                             [instance.pk for instance in instances]))
+        Transaction.objects.bulk_create(
+            instances,
+            ignore_conflicts=mode == IMPORT_MODE_SKIP_EXISTING,
+            update_conflicts=mode == IMPORT_MODE_UPSERT,
+            unique_fields=['transaction_id'] if mode == IMPORT_MODE_UPSERT else None,
+            update_fields=UPSERT_FIELDS if mode == IMPORT_MODE_UPSERT else None,
+        )
+        if mode == IMPORT_MODE_UPSERT:
+            update_rollups(added=instances, removed=stored)
         else:
-            errors.append({"row": row,
-                        "errors": transaction_serializer.errors})
+            stored_ids = {instance.pk for instance in stored}
+            update_rollups(added=[instance for instance in instances if instance.pk not in stored_ids])
+    return len(transactions)
 
-    logger.warning(f"Errors: {errors}")
 
-    return {'errors': errors}
\ No newline at end of file
+def _copy_batch(batch, report, mode):
+    """Write a batch of (line, row, Transaction) with COPY into a staging table merged in one statement, returning
+    how many were written. Rows another upload committed after they were validated are rejected in insert mode."""
+
+    instances = [instance for _, _, instance in batch]
+    try:
+        with transaction.atomic():
+            # The merge skips the stored ids, locked so no other import writes them before it. It returns the rows
+            # it inserted, only upserts need the stored versions of the rows they replace.
+            lock_transaction_ids([instance.pk for instance in instances])
+            stored = []
+            if mode == IMPORT_MODE_UPSERT:
+                stored = list(filter_transaction_ids(Transaction.objects.select_for_update(),
+                                                     [instance.pk for instance in instances]))
+            written = copy_transactions(instances, mode)
+            if mode == IMPORT_MODE_UPSERT:
+                update_rollups(added=instances, removed=stored)
+            else:
+                update_rollups(added=[instance for instance in instances if instance.pk in written])
+    except IntegrityError as e:
+        # Rows saved without the locks, by the API or an import without COPY, may have taken an id after the lookup
+        if mode != IMPORT_MODE_INSERT:
+            raise
+        logger.warning(f"Batch merge failed ({e}), retrying row by row.")
+        return _save_batch(batch, report)
+    if mode != IMPORT_MODE_INSERT:
+        return len(batch)
+
+    for line, row, instance in batch:
+        if instance.pk not in written:
+            report.add(line, row, {"transaction_id": [DUPLICATE_TRANSACTION_ERROR]})
+    return len(written)
+
+
+def _save_batch(batch, report):
+    """Insert a batch of (line, row, Transaction) with a single bulk_create, falling back to row by row inserts
+    if the batch conflicts."""
+
+    try:
+        with transaction.atomic():
+            instances = Transaction.objects.bulk_create([instance for _, _, instance in batch])
+            update_rollups(added=instances)
+        return len(batch)
+    except IntegrityError as e:
+        # Another upload may have committed some of these ids after they were validated
+        logger.warning(f"Batch insert failed ({e}), retrying row by row.")
+
+    # Each save() updates the rollups through the api.signals handlers
+    inserted = 0
+    for line, row, instance in batch:
+        try:
+            with transaction.atomic():
+                instance.save(force_insert=True)
+            inserted += 1
+        except IntegrityError:
+            report.add(line, row, {"transaction_id": [DUPLICATE_TRANSACTION_ERROR]})
+    return inserted
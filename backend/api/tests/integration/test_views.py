@@ -1,14 +1,20 @@
 import io
 import csv
+import base64
+import gzip
+import json
 import pytest
 import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+from unittest.mock import patch
 from django.urls import reverse
 from rest_framework.test import APIClient
 from django.contrib.auth.models import User
 
 from api.models import Transaction
 from lib.TransactionFactory import TransactionFactory
-from api.paginators import TransactionPaginator
+from api.paginators import TransactionPaginator, TransactionCursorPaginator
 
 
 LOOP_COUNT = 25
@@ -51,6 +57,109 @@ class TestTransactionViews:
         assert response.status_code == 200
         assert Transaction.objects.count() == LOOP_COUNT
 
+    def test_upload_gzip_csv(self):
+        transactions_data = [self.factory.generate_transaction_data(allow_duplicates=True) for _ in range(LOOP_COUNT)]
+        csv_file = io.BytesIO(gzip.compress(self.generate_csv_file(transactions_data).getvalue()))
+        csv_file.name = "file.csv.gz"
+
+        response = self.client.post(
+            reverse("transactions-upload"),
+            data={"file": csv_file}
+        )
+
+        assert response.status_code == 200
+        assert Transaction.objects.count() == LOOP_COUNT
+
+    def test_upload_ndjson(self):
+        transactions_data = [self.factory.generate_transaction_data(allow_duplicates=True) for _ in range(LOOP_COUNT)]
+        ndjson_file = io.BytesIO("\n".join(json.dumps(row) for row in transactions_data).encode("utf-8"))
+        ndjson_file.name = "file.ndjson"
+
+        response = self.client.post(
+            reverse("transactions-upload"),
+            data={"file": ndjson_file}
+        )
+
+        assert response.status_code == 200
+        assert Transaction.objects.count() == LOOP_COUNT
+
+    def test_upload_sends_only_file_name_to_task(self, upload_storage):
+        transactions_data = [self.factory.generate_transaction_data(allow_duplicates=True)]
+        csv_file = self.generate_csv_file(transactions_data)
+        csv_file.name = "file.csv"
+
+        with patch("api.views.process_csv_file.delay") as delay:
+            delay.return_value.id = "task-id"
+            response = self.client.post(
+                reverse("transactions-upload"),
+                data={"file": csv_file}
+            )
+
+        assert response.status_code == 200
+        assert response.json()["task_id"] == "task-id"
+        (file_name,), _ = delay.call_args
+        assert (upload_storage / file_name).read_bytes() == csv_file.getvalue()
+
+    def test_upload_upsert_mode(self):
+        transactions_data = [self.factory.generate_transaction_data(allow_duplicates=True) for _ in range(LOOP_COUNT)]
+        Transaction.objects.create(**transactions_data[0])
+        transactions_data[0]['quantity'] = '99'
+        csv_file = self.generate_csv_file(transactions_data)
+        csv_file.name = "file.csv"
+
+        response = self.client.post(
+            reverse("transactions-upload"),
+            data={"file": csv_file, "mode": "upsert"}
+        )
+
+        assert response.status_code == 200
+        assert Transaction.objects.count() == LOOP_COUNT
+        assert Transaction.objects.get(pk=transactions_data[0]['transaction_id']).quantity == 99
+
+    def test_upload_invalid_mode(self):
+        csv_file = self.generate_csv_file([self.factory.generate_transaction_data(allow_duplicates=True)])
+        csv_file.name = "file.csv"
+
+        response = self.client.post(
+            reverse("transactions-upload"),
+            data={"file": csv_file, "mode": "replace"}
+        )
+
+        assert response.status_code == 400
+        assert "mode" in response.json()
+
+    def test_task_status_progress(self):
+        meta = {"rows_read": 10, "rows_inserted": 9, "rows_rejected": 1, "bytes_read": 100, "bytes_total": 1000,
+                "rows_per_second": 5.0, "eta_seconds": 18.0}
+
+        with patch("api.views.AsyncResult") as async_result:
+            async_result.return_value.status = "PROGRESS"
+            async_result.return_value.result = meta
+            response = self.client.get(reverse("task-status", args=["task-id"]))
+
+        assert response.status_code == 200
+        assert response.json() == {"task_id": "task-id", "status": "PROGRESS", "progress": meta, "result": None}
+
+    def test_task_errors_paginated(self):
+        transactions_data = [self.factory.generate_transaction_data(allow_duplicates=True) for _ in range(LOOP_COUNT)]
+        for row in transactions_data[:15]:
+            row['quantity'] = '-1'
+        csv_file = self.generate_csv_file(transactions_data)
+        csv_file.name = "file.csv"
+        task_id = self.client.post(reverse("transactions-upload"), data={"file": csv_file}).json()["task_id"]
+
+        response = self.client.get(reverse("task-errors", args=[task_id]), {"page": 2, "page_size": 10})
+
+        assert response.status_code == 200
+        assert response.json()["count"] == 15
+        assert response.json()["results"] == [
+            {"line": line, "errors": {"quantity": ["invalid"]}} for line in range(12, 17)]
+
+    def test_task_errors_not_found(self):
+        response = self.client.get(reverse("task-errors", args=[str(uuid.uuid4())]))
+
+        assert response.status_code == 404
+
     def test_list_transactions_with_filtering(self):
         t1 = Transaction.objects.create(**self.factory.generate_transaction_data(allow_duplicates=True))
 
@@ -83,6 +192,155 @@ class TestTransactionViews:
         assert data["count"] == LOOP_COUNT
         assert len(data["results"]) == TransactionPaginator.page_size  
 
+    def test_list_transactions_cursor_pagination(self, django_assert_max_num_queries):
+        for _ in range(LOOP_COUNT):
+            Transaction.objects.create(**self.factory.generate_transaction_data(allow_duplicates=True))
+        expected = list(Transaction.objects.order_by('timestamp', 'transaction_id')
+                        .values_list('transaction_id', flat=True))
+
+        pages = []
+        url = reverse("transactions-list") + "?pagination=cursor&page_size=10"
+        while url:
+            with django_assert_max_num_queries(1) as context:
+                response = self.client.get(url)
+            assert response.status_code == 200
+            assert not any("COUNT(" in query["sql"] for query in context.captured_queries)
+            data = response.json()
+            assert "count" not in data
+            pages.append([item["transaction_id"] for item in data["results"]])
+            url = data["next"]
+
+        assert [len(page) for page in pages] == [10, 10, 5]
+        assert [uuid.UUID(transaction_id) for page in pages for transaction_id in page] == expected
+
+        previous = self.client.get(data["previous"]).json()
+        assert [item["transaction_id"] for item in previous["results"]] == pages[1]
+        assert self.client.get(previous["previous"]).json()["previous"] is None
+
+    def test_list_transactions_cursor_pagination_with_filtering(self):
+        transactions = [Transaction.objects.create(**self.factory.generate_transaction_data(allow_duplicates=True))
+                        for _ in range(LOOP_COUNT)]
+        customer_id = transactions[0].customer_id
+        expected = sorted(Transaction.objects.filter(customer_id=customer_id),
+                          key=lambda t: (t.timestamp, t.transaction_id.hex))
+
+        results = []
+        url = reverse("transactions-list")
+        params = {"customer_id": customer_id, "pagination": "cursor", "page_size": 1}
+        while url:
+            data = self.client.get(url, params).json()
+            results += [item["transaction_id"] for item in data["results"]]
+            url, params = data["next"], None
+
+        assert results == [str(t.transaction_id) for t in expected]
+
+    @pytest.mark.parametrize("page_size, expected", [("abc", 10), ("0", 10), ("-3", 10), ("1000", 20)])
+    def test_list_transactions_cursor_page_size(self, monkeypatch, page_size, expected):
+        monkeypatch.setattr(TransactionCursorPaginator, "max_page_size", 20)
+        for _ in range(LOOP_COUNT):
+            Transaction.objects.create(**self.factory.generate_transaction_data(allow_duplicates=True))
+
+        response = self.client.get(reverse("transactions-list"), {"pagination": "cursor", "page_size": page_size})
+
+        assert response.status_code == 200
+        assert len(response.json()["results"]) == expected
+
+    def test_list_transactions_invalid_cursor(self):
+        response = self.client.get(reverse("transactions-list"), {"pagination": "cursor", "cursor": "not-a-cursor"})
+
+        assert response.status_code == 404
+
+    @pytest.mark.parametrize("cursor", [
+        {"t": "2025-01-01T00:00:00+00:00", "id": "nope", "r": False},
+        {"t": "2025-01-01T00:00:00", "id": "d4a3f861-6c22-44f7-8121-09df0d5b79f3", "r": False},
+    ])
+    def test_list_transactions_tampered_cursor(self, cursor):
+        encoded = base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+
+        response = self.client.get(reverse("transactions-list"), {"pagination": "cursor", "cursor": encoded})
+
+        assert response.status_code == 404
+
+    def test_list_transactions_invalid_pagination(self):
+        response = self.client.get(reverse("transactions-list"), {"pagination": "offset"})
+
+        assert response.status_code == 400
+
+    def export(self, **params):
+        response = self.client.get(reverse("transactions-export"), params)
+        assert response.status_code == 200
+        assert response.streaming
+        return b"".join(response.streaming_content)
+
+    def test_export_csv(self, settings):
+        settings.TRANSACTION_EXPORT_CHUNK_SIZE = 7
+        transactions_data = [self.factory.generate_transaction_data(allow_duplicates=True) for _ in range(LOOP_COUNT)]
+        for row in transactions_data:
+            Transaction.objects.create(**row)
+
+        rows = list(csv.DictReader(io.StringIO(self.export().decode("utf-8"))))
+
+        assert [row["transaction_id"] for row in rows] == [
+            str(transaction_id) for transaction_id in
+            Transaction.objects.order_by('timestamp', 'transaction_id').values_list('transaction_id', flat=True)]
+        by_id = {row["transaction_id"]: row for row in transactions_data}
+        for row in rows:
+            expected = by_id[row["transaction_id"]]
+            assert Decimal(row["amount"]) == Decimal(expected["amount"])
+            assert datetime.fromisoformat(row["timestamp"]) == datetime.fromisoformat(expected["timestamp"])
+            assert (row["currency"], row["customer_id"], row["product_id"], row["quantity"]) == (
+                expected["currency"], expected["customer_id"], expected["product_id"], expected["quantity"])
+
+    def test_export_can_be_imported_again(self):
+        for _ in range(LOOP_COUNT):
+            Transaction.objects.create(**self.factory.generate_transaction_data(allow_duplicates=True))
+        exported = self.export(file_format="ndjson", compression="gzip")
+        Transaction.objects.all().delete()
+
+        upload = io.BytesIO(exported)
+        upload.name = "transactions.ndjson.gz"
+        response = self.client.post(reverse("transactions-upload"), data={"file": upload})
+
+        assert response.status_code == 200
+        assert Transaction.objects.count() == LOOP_COUNT
+
+    def test_export_ndjson_with_filters(self):
+        transactions = [Transaction.objects.create(**self.factory.generate_transaction_data(allow_duplicates=True))
+                        for _ in range(LOOP_COUNT)]
+        customer_id = transactions[0].customer_id
+        stored = list(Transaction.objects.filter(customer_id=customer_id).order_by('timestamp', 'transaction_id'))
+        start_date = stored[0].timestamp.date()
+        end_date = stored[-1].timestamp.date()
+
+        response = self.client.get(reverse("transactions-export"), {
+            "customer_id": customer_id, "start_date": start_date, "end_date": end_date, "file_format": "ndjson"})
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+
+        assert response["Content-Disposition"] == 'attachment; filename="transactions.ndjson"'
+        assert [row["transaction_id"] for row in rows] == [str(t.transaction_id) for t in stored]
+        assert rows[0]["quantity"] == stored[0].quantity
+
+        rows = self.export(customer_id=customer_id, start_date=end_date + timedelta(days=1), file_format="ndjson")
+        assert rows == b""
+
+    def test_export_gzip(self):
+        for _ in range(LOOP_COUNT):
+            Transaction.objects.create(**self.factory.generate_transaction_data(allow_duplicates=True))
+
+        response = self.client.get(reverse("transactions-export"), {"compression": "gzip"})
+        content = gzip.decompress(b"".join(response.streaming_content)).decode("utf-8")
+
+        assert response["Content-Type"] == "application/gzip"
+        assert response["Content-Disposition"] == 'attachment; filename="transactions.csv.gz"'
+        assert len(content.splitlines()) == LOOP_COUNT + 1
+
+    @pytest.mark.parametrize("params", [{"file_format": "xml"}, {"compression": "zip"},
+                                        {"start_date": "2025-02-01", "end_date": "2025-01-01"}])
+    def test_export_invalid(self, params):
+        response = self.client.get(reverse("transactions-export"), params)
+
+        assert response.status_code == 400
+
     def test_transaction_detail_view(self):
         transaction = Transaction.objects.create(**self.factory.generate_transaction_data(allow_duplicates=True))
 
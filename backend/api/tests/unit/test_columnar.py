@@ -0,0 +1,137 @@
+import io
+import pytest
+from datetime import datetime
+from decimal import Decimal
+from django.core.files.base import ContentFile
+
+from api.serializers import TransactionSerializer
+from api.lib.uploads import save_upload, InvalidUpload
+from api.lib.validators import TransactionRowValidator, SerializerRowValidator
+from lib.TransactionFactory import TransactionFactory
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+from api.lib.columnar import ParquetBatches, RecordBatchValidator  # noqa: E402
+
+LOOP_COUNT = 25
+
+TYPES = {
+    'transaction_id': pa.string(),
+    'timestamp': pa.timestamp('us', tz='UTC'),
+    'amount': pa.decimal128(10, 2),
+    'currency': pa.string(),
+    'customer_id': pa.string(),
+    'product_id': pa.string(),
+    'quantity': pa.int64(),
+}
+
+
+def typed_value(type, value):
+    if value is None or pa.types.is_string(type):
+        return value
+    if pa.types.is_timestamp(type):
+        return datetime.fromisoformat(value)
+    if pa.types.is_decimal(type):
+        return Decimal(value)
+    if pa.types.is_floating(type):
+        return float(value)
+    return int(value)
+
+
+def record_batch(transactions_data, types=TYPES):
+    return pa.record_batch([pa.array([typed_value(type, row[name]) for row in transactions_data], type)
+                            for name, type in types.items()], names=list(types))
+
+
+@pytest.mark.django_db
+class TestRecordBatchValidator:
+
+    @pytest.fixture(autouse=True)
+    def setup_method(self):
+        factory = TransactionFactory()
+        self.transactions_data = [
+            factory.generate_transaction_data(allow_duplicates=True) for _ in range(LOOP_COUNT)]
+
+    def assert_parity(self, batch):
+        rows = batch.to_pylist()
+
+        transactions, errors = RecordBatchValidator(TransactionRowValidator()).validate_batch(batch, rows)
+
+        expected_errors = []
+        for index, row in enumerate(rows):
+            transaction_serializer = TransactionSerializer(data=row)
+            if not transaction_serializer.is_valid():
+                expected_errors.append((index, transaction_serializer.errors))
+                continue
+            [transaction] = [transaction for position, transaction in transactions if position == index]
+            for field_name, value in transaction_serializer.validated_data.items():
+                assert getattr(transaction, field_name) == value, field_name
+                assert type(getattr(transaction, field_name)) is type(value), field_name
+        assert errors == expected_errors
+        return transactions, errors
+
+    def test_valid_batch(self):
+        transactions, errors = self.assert_parity(record_batch(self.transactions_data))
+
+        assert len(transactions) == LOOP_COUNT
+        assert errors == []
+
+    @pytest.mark.parametrize("field_name, value", [
+        ('amount', '-1.00'), ('amount', '0'), ('quantity', '-1'), ('currency', 'PL'), ('currency', ' eur '),
+        ('currency', 'P\x00L'), ('transaction_id', 'invalid'), ('customer_id', None), ('timestamp', None),
+    ])
+    def test_rejected_like_serializer(self, field_name, value):
+        self.transactions_data[3][field_name] = value
+
+        transactions, errors = self.assert_parity(record_batch(self.transactions_data))
+
+        assert len(transactions) + len(errors) == LOOP_COUNT
+
+    @pytest.mark.parametrize("field_name, type", [
+        ('amount', pa.float64()), ('amount', pa.string()), ('quantity', pa.string()), ('timestamp', pa.string()),
+    ])
+    def test_other_column_types(self, field_name, type):
+        self.transactions_data[3]['amount'] = '-1.50'
+        batch = record_batch(self.transactions_data, dict(TYPES, **{field_name: type}))
+
+        transactions, errors = self.assert_parity(batch)
+
+        assert [index for index, _ in errors] == [3]
+
+    def test_serializer_row_validator(self):
+        self.transactions_data[3]['currency'] = 'PL'
+        batch = record_batch(self.transactions_data)
+
+        transactions, errors = RecordBatchValidator(SerializerRowValidator()).validate_batch(batch, batch.to_pylist())
+
+        assert len(transactions) == LOOP_COUNT - 1
+        assert [index for index, _ in errors] == [3]
+
+
+class TestParquetBatches:
+
+    def store(self, table):
+        buffer = io.BytesIO()
+        pq.write_table(table, buffer)
+        return save_upload(ContentFile(buffer.getvalue(), name="upload.parquet"))
+
+    def test_batches(self):
+        file_name = self.store(pa.table({name: pa.array([None] * 5, type) for name, type in TYPES.items()}))
+        batches = ParquetBatches(file_name, batch_size=2)
+
+        assert [batch.num_rows for batch in batches] == [2, 2, 1]
+        assert batches.rows_read == 5
+        assert batches.bytes_read == batches.bytes_total
+
+    def test_missing_columns(self):
+        file_name = self.store(pa.table({'transaction_id': ['a'], 'amount': [1]}))
+
+        with pytest.raises(InvalidUpload, match="timestamp, currency, customer_id, product_id, quantity"):
+            list(ParquetBatches(file_name, batch_size=2))
+
+    def test_invalid_file(self):
+        file_name = save_upload(ContentFile(b"not a parquet file", name="upload.parquet"))
+
+        with pytest.raises(InvalidUpload):
+            list(ParquetBatches(file_name, batch_size=2))
@@ -0,0 +1,75 @@
+import os
+import time
+import pytest
+from datetime import timedelta
+
+from api.lib.error_reports import (ErrorReport, StoredErrorReport, error_report_name, error_index_name,
+                                   merge_error_reports, delete_expired_error_reports)
+from api.tasks import delete_expired_error_reports_task
+
+LOOP_COUNT = 25
+
+
+def saved_report(report_id, count):
+    report = ErrorReport(sample_size=5)
+    for line in range(count):
+        report.add(line + 2, {}, {"amount": ["invalid"]})
+    return report.save(error_report_name(report_id))
+
+
+class TestStoredErrorReport:
+
+    def test_count_stored_with_report(self, upload_storage):
+        name = saved_report('task', LOOP_COUNT)
+
+        # The whole report is never read to count it
+        (upload_storage / name).write_bytes(b'')
+        assert len(StoredErrorReport(name)) == LOOP_COUNT
+
+    @pytest.mark.parametrize("start, stop", [(0, 3), (99, 101), (100, 200), (250, 260), (298, 400), (300, 310)])
+    def test_pages(self, start, stop):
+        report = StoredErrorReport(saved_report('task', 300))
+
+        assert [entry['line'] for entry in report[start:stop]] == [line + 2 for line in range(start, min(stop, 300))]
+
+    def test_page_read_from_indexed_line(self, upload_storage):
+        name = saved_report('task', 300)
+        # Lines before the indexed one preceding the page are never read
+        content = (upload_storage / name).read_bytes()
+        offset = StoredErrorReport(name)._index_entry(3)
+        (upload_storage / name).write_bytes(b'x' * offset + content[offset:])
+
+        assert [entry['line'] for entry in StoredErrorReport(name)[250:252]] == [252, 253]
+
+    def test_merged_reports_indexed(self, upload_storage):
+        parts = [saved_report(f'task.{index}', count) for index, count in enumerate([130, 0, 75])]
+
+        name = merge_error_reports(parts, error_report_name('task'))
+
+        report = StoredErrorReport(name)
+        assert len(report) == 205
+        assert [entry['line'] for entry in report[128:132]] == [130, 131, 2, 3]
+        assert [entry['line'] for entry in report[200:205]] == [72, 73, 74, 75, 76]
+        assert sorted(os.listdir(upload_storage / 'errors')) == ['task.ndjson', 'task.ndjson.index']
+
+
+class TestDeleteExpiredErrorReports:
+
+    def test_old_reports_deleted(self, upload_storage):
+        old = saved_report('old', 3)
+        saved_report('new', 3)
+        hour_ago = time.time() - 3600
+        for name in (old, error_index_name(old)):
+            os.utime(upload_storage / name, (hour_ago, hour_ago))
+
+        assert delete_expired_error_reports(timedelta(minutes=30)) == 2
+        assert sorted(os.listdir(upload_storage / 'errors')) == ['new.ndjson', 'new.ndjson.index']
+
+    def test_no_reports(self, upload_storage):
+        assert delete_expired_error_reports(timedelta(0)) == 0
+
+    def test_task_uses_result_expiry(self, upload_storage, settings):
+        saved_report('task', 3)
+        settings.CELERY_RESULT_EXPIRES = 0
+
+        assert delete_expired_error_reports_task() == 2
@@ -0,0 +1,68 @@
+import pytest
+import uuid
+
+from api.lib.hll import Sketch, REGISTERS
+
+
+def values(count, seed):
+    # The same values in every run, so estimates are reproducible
+    return [uuid.uuid5(uuid.NAMESPACE_OID, f"{seed}-{index}") for index in range(count)]
+
+
+class TestSketch:
+
+    def test_empty(self):
+        assert Sketch().estimate() == 0
+        assert Sketch.from_bytes(Sketch().to_bytes()).estimate() == 0
+
+    @pytest.mark.parametrize("count", [1, 10, 100])
+    def test_small_sets_nearly_exact(self, count):
+        sketch = Sketch()
+        sketch.update(values(count, 'small'))
+
+        assert abs(sketch.estimate() - count) <= max(1, count // 100)
+
+    @pytest.mark.parametrize("count", [1_000, 20_000, 100_000])
+    def test_within_error_bound(self, count):
+        sketch = Sketch()
+        sketch.update(values(count, 'large'))
+
+        # Three standard errors
+        assert abs(sketch.estimate() - count) / count < 3 * 1.04 / REGISTERS ** 0.5
+
+    def test_adding_twice_changes_nothing(self):
+        sketch = Sketch()
+        sketch.update(values(50, 'twice'))
+        stored = sketch.to_bytes()
+
+        sketch.update(values(50, 'twice'))
+
+        assert sketch.to_bytes() == stored
+
+    @pytest.mark.parametrize("count", [10, 5_000])
+    def test_stored_round_trip(self, count):
+        sketch = Sketch()
+        sketch.update(values(count, 'stored'))
+
+        assert Sketch.from_bytes(sketch.to_bytes()).registers == sketch.registers
+
+    def test_sparse_until_smaller_dense(self):
+        sparse, dense = Sketch(), Sketch()
+        sparse.update(values(10, 'sparse'))
+        dense.update(values(10_000, 'dense'))
+
+        assert len(sparse.to_bytes()) < 50
+        assert len(dense.to_bytes()) == REGISTERS + 1
+
+    def test_merge_is_union(self):
+        first, second, union = Sketch(), Sketch(), Sketch()
+        first.update(values(3_000, 'first'))
+        second.update(values(30, 'second'))
+        union.update(values(3_000, 'first') + values(30, 'second') + values(20_000, 'third'))
+        third = Sketch()
+        third.update(values(20_000, 'third'))
+
+        merged = Sketch()
+        merged.merge(first.to_bytes(), second.to_bytes(), third.to_bytes(), first.to_bytes())
+
+        assert merged.registers == union.registers
@@ -0,0 +1,38 @@
+import pytest
+from uuid import UUID, uuid4
+from django.db import connection, transaction
+
+from api.lib.locks import advisory_lock_keys, lock_transaction_ids
+
+LOOP_COUNT = 25
+
+
+class TestAdvisoryLockKeys:
+
+    def test_sorted_signed_64_bit_keys(self):
+        transaction_ids = [uuid4() for _ in range(LOOP_COUNT)]
+
+        keys = advisory_lock_keys(transaction_ids + transaction_ids[:5])
+
+        assert len(keys) == LOOP_COUNT
+        assert keys == sorted(keys)
+        assert all(-2 ** 63 <= key < 2 ** 63 for key in keys)
+        assert advisory_lock_keys([UUID('ffffffff-ffff-ffff-0000-000000000000')]) == [-1]
+
+
+@pytest.mark.django_db
+class TestLockTransactionIds:
+
+    @pytest.mark.skipif(connection.vendor == 'postgresql', reason="SQLite transactions are serialized instead")
+    def test_no_query_on_sqlite(self, django_assert_num_queries):
+        with django_assert_num_queries(0):
+            lock_transaction_ids([uuid4()])
+
+    @pytest.mark.skipif(connection.vendor != 'postgresql', reason="Advisory locks need PostgreSQL")
+    def test_locks_held_by_transaction(self):
+        transaction_id = uuid4()
+        with transaction.atomic():
+            lock_transaction_ids([transaction_id])
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT count(*) FROM pg_locks WHERE locktype = 'advisory' AND pid = pg_backend_pid()")
+                assert cursor.fetchone()[0] == 1
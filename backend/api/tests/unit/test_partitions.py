@@ -0,0 +1,271 @@
+import io
+import time
+import pytest
+from datetime import date, datetime, timezone as dt_timezone
+from decimal import Decimal
+from unittest.mock import patch
+from uuid import UUID, uuid4
+from django.core.management import call_command
+from django.test.utils import CaptureQueriesContext
+from django.db import DatabaseError, IntegrityError, NotSupportedError, connection, transaction
+from django.utils import timezone
+
+from api.models import Transaction, TransactionKey
+from api.tasks import _copy_batch, create_transaction_partitions_task
+from api.lib.partitions import (DEFAULT_PARTITION, KEY_TABLE, KNOWN_PARTITIONS_TTL, month_start, add_months,
+                                months_between, partition_name, partition_months, create_partitions,
+                                ensure_partitions, forget_partitions, stored_transaction_ids,
+                                filter_transaction_ids)
+from api.lib.error_reports import ErrorReport
+from api.lib.constants import IMPORT_MODE_UPSERT
+from lib.TransactionFactory import TransactionFactory
+
+LOOP_COUNT = 25
+
+postgresql_only = pytest.mark.skipif(connection.vendor != 'postgresql', reason="Partitioning needs PostgreSQL")
+
+
+class TestMonths:
+
+    def test_month_start_in_time_zone(self):
+        assert month_start(date(2024, 2, 29)) == date(2024, 2, 1)
+        late = datetime(2024, 1, 31, 23, 30, tzinfo=dt_timezone.utc)
+        assert month_start(late) == date(2024, 1, 1)
+        with timezone.override('Europe/Warsaw'):
+            assert month_start(late) == date(2024, 2, 1)
+
+    def test_add_months_across_years(self):
+        assert add_months(date(2024, 11, 1), 3) == date(2025, 2, 1)
+        assert add_months(date(2024, 1, 1), -1) == date(2023, 12, 1)
+        assert add_months(date(2024, 1, 1), 0) == date(2024, 1, 1)
+
+    def test_months_between(self):
+        assert list(months_between(date(2023, 11, 15), date(2024, 2, 3))) == [
+            date(2023, 11, 1), date(2023, 12, 1), date(2024, 1, 1), date(2024, 2, 1)]
+        assert list(months_between(date(2024, 3, 1), date(2024, 2, 1))) == []
+
+    def test_partition_name(self):
+        assert partition_name(date(2024, 3, 1)) == 'api_transaction_p2024_03'
+
+
+@pytest.mark.django_db
+class TestCreatePartitions:
+
+    @pytest.fixture(autouse=True)
+    def setup_method(self):
+        factory = TransactionFactory()
+        self.transactions_data = [factory.generate_transaction_data(allow_duplicates=True) for _ in range(LOOP_COUNT)]
+
+    def partition_of(self, transaction_id):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT tableoid::regclass::text FROM api_transaction WHERE transaction_id = %s",
+                           [transaction_id])
+            return cursor.fetchone()[0]
+
+    def key_count(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM {KEY_TABLE}")
+            return cursor.fetchone()[0]
+
+    def test_current_and_next_months_by_task(self, settings):
+        settings.TRANSACTION_PARTITIONS_AHEAD = 2
+        current = month_start(timezone.now())
+
+        with patch('api.tasks.create_partitions', return_value=[]) as create:
+            assert create_transaction_partitions_task() == []
+
+        assert list(create.call_args.args[0]) == [current, add_months(current, 1), add_months(current, 2)]
+
+    @pytest.mark.skipif(connection.vendor == 'postgresql', reason="The table is partitioned on PostgreSQL")
+    def test_nothing_created_on_sqlite(self, django_assert_num_queries):
+        with django_assert_num_queries(0):
+            assert create_partitions([date(2024, 1, 1)]) == []
+            ensure_partitions([timezone.now()])
+        output = io.StringIO()
+        call_command('create_transaction_partitions', months=2, stdout=output)
+        assert output.getvalue() == "The transaction table is only partitioned on PostgreSQL.\n"
+
+    @postgresql_only
+    def test_months_ahead_partitioned_by_migration(self):
+        current = month_start(timezone.now())
+
+        assert set(months_between(current, add_months(current, 3))) <= partition_months()
+
+    @postgresql_only
+    def test_rows_of_default_partition_moved(self):
+        # No partition holds the year 2001, its rows are kept in the default one until it is created
+        Transaction.objects.bulk_create(Transaction(**{**row, 'timestamp': f'2001-01-{index + 1:02d}T12:00:00Z'})
+                                        for index, row in enumerate(self.transactions_data))
+        transaction_id = self.transactions_data[0]['transaction_id']
+        assert self.partition_of(transaction_id) == DEFAULT_PARTITION
+
+        assert create_partitions([date(2001, 1, 1), date(2001, 2, 1)]) == ['api_transaction_p2001_01',
+                                                                           'api_transaction_p2001_02']
+        assert create_partitions([date(2001, 1, 1)]) == []
+
+        assert self.partition_of(transaction_id) == 'api_transaction_p2001_01'
+        assert Transaction.objects.count() == LOOP_COUNT
+        assert self.key_count() == LOOP_COUNT
+
+    @postgresql_only
+    def test_ids_unique_across_partitions(self):
+        Transaction.objects.create(**{**self.transactions_data[0], 'timestamp': '2001-01-15T12:00:00Z'})
+
+        with pytest.raises(IntegrityError), transaction.atomic():
+            Transaction.objects.create(**{**self.transactions_data[0], 'timestamp': '2001-06-15T12:00:00Z'})
+
+        Transaction.objects.filter(pk=self.transactions_data[0]['transaction_id']).delete()
+        assert self.key_count() == 0
+
+    @postgresql_only
+    def test_upsert_moves_row_to_its_new_month(self):
+        create_partitions([date(2001, 1, 1), date(2001, 3, 1)])
+        Transaction.objects.create(**{**self.transactions_data[0], 'timestamp': '2001-01-15T12:00:00Z'})
+        instance = Transaction(**{**self.transactions_data[0], 'timestamp': '2001-03-15T12:00:00Z'})
+        instance.clean_fields()
+
+        assert _copy_batch([(2, self.transactions_data[0], instance)], ErrorReport(10), IMPORT_MODE_UPSERT) == 1
+
+        assert self.partition_of(instance.pk) == 'api_transaction_p2001_03'
+        assert self.key_count() == 1
+        assert TransactionKey.objects.get().timestamp == datetime(2001, 3, 15, 12, tzinfo=dt_timezone.utc)
+
+    @postgresql_only
+    def test_one_month_reads_one_partition(self):
+        create_partitions(months_between(date(2001, 1, 1), date(2001, 12, 1)))
+        queryset = Transaction.objects.filter(timestamp__gte=datetime(2001, 5, 3, tzinfo=dt_timezone.utc),
+                                              timestamp__lt=datetime(2001, 5, 28, tzinfo=dt_timezone.utc),
+                                              amount__gt=Decimal('0'))
+
+        plan = queryset.explain()
+
+        assert 'api_transaction_p2001_05' in plan
+        assert 'api_transaction_p2001_04' not in plan and DEFAULT_PARTITION not in plan
+
+
+@postgresql_only
+@pytest.mark.django_db
+class TestEnsurePartitions:
+
+    @pytest.fixture(autouse=True)
+    def setup_method(self):
+        forget_partitions()
+        yield
+        forget_partitions()
+
+    def ensure(self, callbacks, *timestamps):
+        # The months are known once the partitions are committed
+        with callbacks(execute=True):
+            ensure_partitions(timestamps)
+
+    def test_catalog_read_once_per_ttl(self, django_capture_on_commit_callbacks, django_assert_num_queries):
+        timestamp = datetime(2001, 4, 15, tzinfo=dt_timezone.utc)
+
+        self.ensure(django_capture_on_commit_callbacks, timestamp)
+        assert date(2001, 4, 1) in partition_months()
+        with django_assert_num_queries(0):
+            self.ensure(django_capture_on_commit_callbacks, timestamp, timestamp.replace(day=20))
+
+        with patch('api.lib.partitions.time.monotonic', return_value=time.monotonic() + KNOWN_PARTITIONS_TTL):
+            with CaptureQueriesContext(connection) as captured:
+                self.ensure(django_capture_on_commit_callbacks, timestamp)
+        assert any('pg_inherits' in query['sql'] for query in captured)
+
+    def test_dropped_partition_created_again(self, django_capture_on_commit_callbacks):
+        timestamp = datetime(2001, 4, 15, tzinfo=dt_timezone.utc)
+        self.ensure(django_capture_on_commit_callbacks, timestamp)
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TABLE api_transaction_p2001_04")
+
+        self.ensure(django_capture_on_commit_callbacks, timestamp)
+        assert date(2001, 4, 1) not in partition_months()
+
+        with patch('api.lib.partitions.time.monotonic', return_value=time.monotonic() + KNOWN_PARTITIONS_TTL):
+            self.ensure(django_capture_on_commit_callbacks, timestamp)
+        assert date(2001, 4, 1) in partition_months()
+
+    def test_failed_partition_tried_again(self, django_capture_on_commit_callbacks):
+        timestamp = datetime(2001, 4, 15, tzinfo=dt_timezone.utc)
+
+        with patch('api.lib.partitions.partition_months', side_effect=DatabaseError("lock timeout")):
+            self.ensure(django_capture_on_commit_callbacks, timestamp)
+        assert date(2001, 4, 1) not in partition_months()
+
+        self.ensure(django_capture_on_commit_callbacks, timestamp)
+        assert date(2001, 4, 1) in partition_months()
+
+
+@postgresql_only
+@pytest.mark.django_db
+class TestKeyTriggers:
+
+    @pytest.fixture(autouse=True)
+    def setup_method(self):
+        create_partitions([date(2001, 1, 1), date(2001, 3, 1)])
+        row = TransactionFactory().generate_transaction_data(allow_duplicates=True)
+        self.instance = Transaction.objects.create(**{**row, 'timestamp': '2001-01-15T12:00:00Z'})
+
+    def key(self):
+        return TransactionKey.objects.filter(pk=self.instance.pk).values_list('timestamp', flat=True).first()
+
+    def test_insert_stores_id_and_timestamp(self):
+        assert self.key() == datetime(2001, 1, 15, 12, tzinfo=dt_timezone.utc)
+
+    @pytest.mark.parametrize("timestamp", [datetime(2001, 1, 20, tzinfo=dt_timezone.utc),
+                                           datetime(2001, 3, 20, tzinfo=dt_timezone.utc),
+                                           datetime(2001, 6, 20, tzinfo=dt_timezone.utc)])
+    def test_update_follows_timestamp(self, timestamp):
+        # In its partition, to another one, and to the default one
+        Transaction.objects.filter(pk=self.instance.pk).update(timestamp=timestamp)
+
+        assert self.key() == timestamp
+        assert TransactionKey.objects.count() == 1
+
+    def test_delete_and_truncate_remove_ids(self):
+        self.instance.delete()
+        assert TransactionKey.objects.count() == 0
+
+        Transaction.objects.create(**TransactionFactory().generate_transaction_data(allow_duplicates=True))
+        with connection.cursor() as cursor:
+            cursor.execute("TRUNCATE api_transaction")
+        assert TransactionKey.objects.count() == 0
+
+    def test_id_cannot_be_updated(self):
+        with pytest.raises(NotSupportedError), transaction.atomic():
+            Transaction.objects.filter(pk=self.instance.pk).update(transaction_id=uuid4())
+
+
+@pytest.mark.django_db
+class TestTransactionIdLookups:
+
+    @pytest.fixture(autouse=True)
+    def setup_method(self):
+        create_partitions(months_between(date(2001, 1, 1), date(2001, 12, 1)))
+        factory = TransactionFactory()
+        rows = [factory.generate_transaction_data(allow_duplicates=True) for _ in range(12)]
+        for month, row in enumerate(rows, 1):
+            Transaction.objects.create(**{**row, 'timestamp': f'2001-{month:02d}-15T12:00:00Z'})
+        self.transaction_ids = [UUID(row['transaction_id']) for row in rows]
+
+    def test_stored_ids(self, django_assert_num_queries):
+        with django_assert_num_queries(1) as captured:
+            assert stored_transaction_ids([self.transaction_ids[4], uuid4()]) == {self.transaction_ids[4]}
+
+        if connection.vendor == 'postgresql':
+            assert KEY_TABLE in captured[0]['sql']
+
+    def test_filter_ids(self):
+        transaction_ids = [self.transaction_ids[4], self.transaction_ids[7], uuid4()]
+
+        found = filter_transaction_ids(Transaction.objects.order_by('timestamp'), transaction_ids)
+
+        assert [instance.pk for instance in found] == transaction_ids[:2]
+        assert not filter_transaction_ids(Transaction.objects.all(), [uuid4()]).exists()
+
+    @postgresql_only
+    def test_filter_ids_reads_their_partitions(self):
+        plan = filter_transaction_ids(Transaction.objects.all(), [self.transaction_ids[4]]).explain()
+
+        assert 'api_transaction_p2001_05' in plan
+        assert 'api_transaction_p2001_04' not in plan and DEFAULT_PARTITION not in plan
+
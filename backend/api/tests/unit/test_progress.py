@@ -0,0 +1,83 @@
+import time
+import pytest
+from unittest.mock import Mock, patch
+
+from api.lib.progress import ImportProgress, PROGRESS_STATE, chunked_progress, progress_meta
+
+
+def make_task(task_id="task-id", is_eager=False):
+    task = Mock()
+    task.request.id = task_id
+    task.request.is_eager = is_eager
+    return task
+
+
+class TestProgressMeta:
+
+    def test_throughput_and_eta(self):
+        meta = progress_meta(1000, 900, 100, 250, 1000, time.time() - 10)
+
+        assert meta["rows_read"] == 1000
+        assert meta["rows_inserted"] == 900
+        assert meta["rows_rejected"] == 100
+        assert meta["bytes_read"] == 250
+        assert meta["bytes_total"] == 1000
+        assert meta["rows_per_second"] == pytest.approx(100, rel=0.01)
+        assert meta["eta_seconds"] == pytest.approx(30, rel=0.01)
+
+    def test_nothing_read_yet(self):
+        meta = progress_meta(0, 0, 0, 0, 1000, time.time() - 1)
+
+        assert meta["eta_seconds"] is None
+
+
+class TestImportProgress:
+
+    def test_publishes_at_most_once_per_interval(self):
+        task = make_task()
+        progress = ImportProgress(task, 1000, interval=60)
+        progress.update(10, 10, 0, 100)
+        assert not task.update_state.called
+
+        progress.published_at -= 60
+        progress.update(20, 19, 1, 200)
+        progress.update(30, 29, 1, 300)
+
+        task.update_state.assert_called_once()
+        _, kwargs = task.update_state.call_args
+        assert kwargs["state"] == PROGRESS_STATE
+        assert kwargs["meta"]["rows_read"] == 20
+        assert kwargs["meta"]["rows_rejected"] == 1
+
+    @pytest.mark.parametrize("task", [None, make_task(task_id=None), make_task(is_eager=True)])
+    def test_disabled_without_result_backend(self, task):
+        progress = ImportProgress(task, 1000, interval=0)
+
+        progress.update(10, 10, 0, 100)
+
+        assert not progress.enabled
+
+
+class TestChunkedProgress:
+
+    def test_sums_chunks(self):
+        states = {
+            "done": Mock(state="SUCCESS", result={"rows_read": 10, "inserted": 8, "rejected": 2, "errors": [{}, {}]}),
+            "running": Mock(state=PROGRESS_STATE, info={
+                "rows_read": 5, "rows_inserted": 5, "rows_rejected": 0, "bytes_read": 50}),
+            "waiting": Mock(state="PENDING"),
+        }
+        meta = {
+            "chunks": [{"task_id": "done", "bytes": 100}, {"task_id": "running", "bytes": 100},
+                       {"task_id": "waiting", "bytes": 100}],
+            "started_at": time.time() - 1,
+        }
+
+        with patch("api.lib.progress.AsyncResult", side_effect=states.get):
+            progress = chunked_progress(meta)
+
+        assert progress["rows_read"] == 15
+        assert progress["rows_inserted"] == 13
+        assert progress["rows_rejected"] == 2
+        assert progress["bytes_read"] == 150
+        assert progress["bytes_total"] == 300
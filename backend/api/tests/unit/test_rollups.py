@@ -0,0 +1,127 @@
+import pytest
+from datetime import datetime, timezone
+from decimal import Decimal
+from uuid import UUID, uuid4
+from django.core.management import call_command
+
+from api.models import Transaction, TransactionDailyRollup, DistinctDailySketch
+from api.tasks import process_csv_file
+from api.lib.rollups import update_rollups, rebuild_rollups
+from api.lib.hll import Sketch
+from api.tests.unit.test_tasks import store_csv_file
+from lib.TransactionFactory import TransactionFactory
+
+LOOP_COUNT = 25
+
+
+def sketch_rows():
+    return sorted((field, entity_id, day, bytes(registers)) for field, entity_id, day, registers
+                  in DistinctDailySketch.objects.values_list('field', 'entity_id', 'day', 'registers'))
+
+
+def rollup_rows():
+    return sorted(TransactionDailyRollup.objects.values_list(
+        'day', 'customer_id', 'product_id', 'currency', 'transaction_count', 'amount_total', 'quantity_total'))
+
+
+@pytest.mark.django_db
+class TestRollups:
+
+    @pytest.fixture(autouse=True)
+    def setup_method(self):
+        self.factory = TransactionFactory()
+        self.transactions_data = [
+            self.factory.generate_transaction_data(allow_duplicates=True) for _ in range(LOOP_COUNT)]
+
+    def transaction(self, **values):
+        data = dict(self.factory.generate_transaction_data(allow_duplicates=True), **values)
+        return Transaction(**data)
+
+    def test_update_rollups_increments_rows(self):
+        timestamp = datetime(2025, 3, 1, 12, tzinfo=timezone.utc)
+        first = self.transaction(timestamp=timestamp, amount=Decimal('1.25'), quantity=2)
+        second = self.transaction(timestamp=timestamp.replace(hour=23), amount=Decimal('2.50'), quantity=3,
+                                  customer_id=first.customer_id, product_id=first.product_id, currency=first.currency)
+
+        update_rollups(added=[first])
+        update_rollups(added=[second])
+
+        rollup = TransactionDailyRollup.objects.get()
+        assert rollup.day == timestamp.date()
+        assert (rollup.transaction_count, rollup.amount_total, rollup.quantity_total) == (2, Decimal('3.75'), 5)
+
+        update_rollups(removed=[first, second])
+
+        assert not TransactionDailyRollup.objects.exists()
+
+    @pytest.mark.parametrize("mode", ['insert', 'skip_existing', 'upsert'])
+    def test_import_keeps_rollups_exact(self, mode):
+        for row in self.transactions_data[:10]:
+            Transaction.objects.create(**row)
+        for row in self.transactions_data:
+            row['amount'] = '12.34'
+            row['quantity'] = '7'
+
+        process_csv_file(store_csv_file(self.transactions_data), batch_size=10, mode=mode)
+        incremental = rollup_rows()
+        incremental_sketches = sketch_rows()
+        rebuild_rollups()
+
+        assert incremental == rollup_rows()
+        assert incremental_sketches == sketch_rows()
+        assert sum(row[4] for row in incremental) == LOOP_COUNT
+
+    def test_signals_follow_saves_and_deletes(self):
+        transactions = [Transaction.objects.create(**row) for row in self.transactions_data]
+        transactions[0].timestamp = datetime(2020, 1, 1, tzinfo=timezone.utc)
+        transactions[0].amount = Decimal('99.99')
+        transactions[0].save()
+        transactions[1].delete()
+        incremental = rollup_rows()
+        incremental_sketches = sketch_rows()
+        rebuild_rollups()
+
+        assert incremental == rollup_rows()
+        assert incremental_sketches == sketch_rows()
+        assert sum(row[4] for row in incremental) == LOOP_COUNT - 1
+
+    def test_rebuild_command(self):
+        for row in self.transactions_data:
+            Transaction.objects.create(**row)
+        TransactionDailyRollup.objects.all().delete()
+
+        call_command('rebuild_transaction_rollups', batch_size=3)
+
+        assert sum(TransactionDailyRollup.objects.values_list('transaction_count', flat=True)) == LOOP_COUNT
+        assert (sum(TransactionDailyRollup.objects.values_list('amount_total', flat=True))
+                == sum(Decimal(row['amount']) for row in self.transactions_data))
+
+    def test_sketches_forget_removed_values(self):
+        timestamp = datetime(2025, 3, 1, 12, tzinfo=timezone.utc)
+        first = self.transaction(timestamp=timestamp)
+        # A product of its own, the factory draws products from a small pool
+        second = self.transaction(timestamp=timestamp, customer_id=first.customer_id, product_id=str(uuid4()))
+
+        update_rollups(added=[first, second])
+        assert DistinctDailySketch.objects.filter(field='product_id').count() == 2
+
+        update_rollups(removed=[second])
+
+        assert sorted(DistinctDailySketch.objects.values_list('field', 'entity_id')) == [
+            ('customer_id', UUID(first.customer_id)), ('product_id', UUID(first.product_id))]
+        expected = Sketch()
+        expected.add(UUID(first.product_id))
+        assert bytes(DistinctDailySketch.objects.get(field='customer_id').registers) == expected.to_bytes()
+
+
+@pytest.mark.django_db(transaction=True)
+class TestRollupsInAutocommit:
+
+    def test_signals_outside_of_transaction(self):
+        # As for a save outside of a request or task: the sketch rows are still locked in a transaction
+        instance = Transaction.objects.create(**TransactionFactory().generate_transaction_data())
+
+        assert DistinctDailySketch.objects.filter(entity_id=instance.customer_id).exists()
+        instance.delete()
+        assert not TransactionDailyRollup.objects.exists()
+
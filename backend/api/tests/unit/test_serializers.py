@@ -1,7 +1,11 @@
+import io
 import pytest
 import uuid
+import codecs
+import gzip
 
 from api.serializers import TransactionSerializer, CsvFileSerializer
+from api.lib.constants import CSV_SAMPLE_SIZE
 from django.core.files.uploadedfile import SimpleUploadedFile
 
 @pytest.fixture
@@ -30,14 +34,14 @@ class TestCsvFileSerializer:
         serializer = CsvFileSerializer(data={'file': file})
         assert not serializer.is_valid()
         assert 'file' in serializer.errors
-        assert 'File must be a CSV.' in serializer.errors['file']
+        assert 'File must be a CSV, NDJSON or Parquet file.' in serializer.errors['file']
 
     def test_csv_file_serializer_invalid_extension(self, create_file):
         file = create_file("test.txt", self.content, "text/csv")
         serializer = CsvFileSerializer(data={'file': file})
         assert not serializer.is_valid()
         assert 'file' in serializer.errors
-        assert 'File must be a CSV.' in serializer.errors['file']
+        assert 'File must be a CSV, NDJSON or Parquet file.' in serializer.errors['file']
 
     def test_csv_file_serializer_too_large(self, create_file):
         file = create_file("test.csv", self.content * int(50 * 1024 * 1024/73 +1), "text/csv")  # 51MB
@@ -53,6 +57,100 @@ class TestCsvFileSerializer:
         assert 'file' in serializer.errors
         assert 'The submitted file is empty.' in serializer.errors['file']
 
+    def test_csv_file_serializer_header_with_byte_order_mark(self):
+        file = SimpleUploadedFile("test.csv", codecs.BOM_UTF8 + self.content.encode(), content_type="text/csv")
+        serializer = CsvFileSerializer(data={'file': file})
+        assert serializer.is_valid()
+
+    @pytest.mark.parametrize("header", [
+        "transaction_id,timestamp,amount,currency,customer_id,product_id\n",
+        "timestamp,transaction_id,amount,currency,customer_id,product_id,quantity\n",
+        "transaction_id;timestamp;amount;currency;customer_id;product_id;quantity\n",
+    ])
+    def test_csv_file_serializer_unexpected_header(self, create_file, header):
+        file = create_file("test.csv", header, "text/csv")
+        serializer = CsvFileSerializer(data={'file': file})
+        assert not serializer.is_valid()
+        assert any("CSV header must be" in str(err) for err in serializer.errors['file'])
+
+    def test_csv_file_serializer_reads_only_sample(self):
+        # Bytes past the sample are left to the import task, which rejects an invalid encoding
+        content = self.content.encode() + b"a" * CSV_SAMPLE_SIZE + b"\xff\xfe\n"
+        file = SimpleUploadedFile("test.csv", content, content_type="text/csv")
+        serializer = CsvFileSerializer(data={'file': file})
+        assert serializer.is_valid()
+        assert file.tell() == 0
+
+    def test_csv_file_serializer_header_without_line_end(self, create_file):
+        file = create_file("test.csv", "a," * CSV_SAMPLE_SIZE, "text/csv")
+        serializer = CsvFileSerializer(data={'file': file})
+        assert not serializer.is_valid()
+        assert 'Uploaded file is not a valid CSV.' in serializer.errors['file']
+
+    def test_csv_file_serializer_invalid_encoding(self):
+        file = SimpleUploadedFile("test.csv", b"transaction_id,\xff\xfe\n", content_type="text/csv")
+        serializer = CsvFileSerializer(data={'file': file})
+        assert not serializer.is_valid()
+        assert 'Uploaded file is not a valid CSV.' in serializer.errors['file']
+
+    @pytest.mark.parametrize("name", ["test.csv.gz", "test.CSV.gz.txt"])
+    def test_csv_file_serializer_gzip(self, name):
+        file = SimpleUploadedFile(name, gzip.compress(self.content.encode()), content_type="application/gzip")
+        serializer = CsvFileSerializer(data={'file': file})
+        assert serializer.is_valid() == name.endswith('.csv.gz')
+
+    def test_csv_file_serializer_zstd(self):
+        zstandard = pytest.importorskip("zstandard")
+        content = zstandard.ZstdCompressor().compress(self.content.encode())
+        file = SimpleUploadedFile("test.csv.zst", content, content_type="application/zstd")
+        serializer = CsvFileSerializer(data={'file': file})
+        assert serializer.is_valid()
+
+    def test_csv_file_serializer_gzip_unexpected_header(self):
+        file = SimpleUploadedFile("test.csv.gz", gzip.compress(b"a,b\n"), content_type="application/gzip")
+        serializer = CsvFileSerializer(data={'file': file})
+        assert not serializer.is_valid()
+        assert any("CSV header must be" in str(err) for err in serializer.errors['file'])
+
+    def test_csv_file_serializer_invalid_gzip(self):
+        file = SimpleUploadedFile("test.csv.gz", self.content.encode(), content_type="application/gzip")
+        serializer = CsvFileSerializer(data={'file': file})
+        assert not serializer.is_valid()
+        assert 'Uploaded file is not a valid CSV.' in serializer.errors['file']
+
+    @pytest.mark.parametrize("content, valid", [
+        (b'\n{"transaction_id": "1", "timestamp": "", "amount": 1, "currency": "PLN", "customer_id": "2", '
+         b'"product_id": "3", "quantity": 1}\n', True),
+        (b'{"transaction_id": "1", "amount": 1}\n', False),
+        (b'[1, 2]\n', False),
+        (b'transaction_id,timestamp\n', False),
+    ])
+    def test_csv_file_serializer_ndjson(self, content, valid):
+        file = SimpleUploadedFile("test.ndjson", content, content_type="application/x-ndjson")
+        serializer = CsvFileSerializer(data={'file': file})
+        assert serializer.is_valid() == valid
+
+    @pytest.mark.parametrize("columns, valid", [
+        (['transaction_id', 'timestamp', 'amount', 'currency', 'customer_id', 'product_id', 'quantity'], True),
+        (['quantity', 'product_id', 'customer_id', 'currency', 'amount', 'timestamp', 'transaction_id', 'note'], True),
+        (['transaction_id', 'timestamp', 'amount'], False),
+    ])
+    def test_csv_file_serializer_parquet(self, columns, valid):
+        pa = pytest.importorskip("pyarrow")
+        pq = pytest.importorskip("pyarrow.parquet")
+        output = io.BytesIO()
+        pq.write_table(pa.table({name: ['x'] for name in columns}), output)
+        file = SimpleUploadedFile("test.parquet", output.getvalue(), content_type="application/vnd.apache.parquet")
+        serializer = CsvFileSerializer(data={'file': file})
+        assert serializer.is_valid() == valid
+
+    def test_csv_file_serializer_invalid_parquet(self, create_file):
+        pytest.importorskip("pyarrow")
+        file = create_file("test.parquet", self.content, "application/vnd.apache.parquet")
+        serializer = CsvFileSerializer(data={'file': file})
+        assert not serializer.is_valid()
+        assert 'Uploaded file is not a valid Parquet file.' in serializer.errors['file']
+
 
 @pytest.mark.django_db
 class TestTransactionSerializer:
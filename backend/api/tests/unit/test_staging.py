@@ -0,0 +1,140 @@
+import pytest
+from decimal import Decimal
+from unittest.mock import patch
+from django.db import IntegrityError, connection
+
+from api.models import Transaction, TransactionDailyRollup
+from api.tasks import _copy_batch
+from api.lib.staging import copy_supported, merge_sql
+from api.lib.validators import DUPLICATE_TRANSACTION_ERROR
+from api.lib.error_reports import ErrorReport
+from api.lib.constants import IMPORT_MODE_INSERT, IMPORT_MODE_SKIP_EXISTING, IMPORT_MODE_UPSERT
+from lib.TransactionFactory import TransactionFactory
+
+LOOP_COUNT = 25
+
+postgresql_only = pytest.mark.skipif(connection.vendor != 'postgresql', reason="COPY needs PostgreSQL")
+
+
+class TestMergeSql:
+
+    @pytest.mark.parametrize("mode", [IMPORT_MODE_INSERT, IMPORT_MODE_SKIP_EXISTING])
+    def test_stored_ids_skipped(self, mode):
+        sql = merge_sql(mode)
+
+        assert sql.startswith('INSERT INTO "api_transaction" ("transaction_id", "timestamp", "amount", ')
+        assert 'FROM "transaction_import_staging" AS staged' in sql
+        # Ids are unique through the key table, the partitioned table has no unique index for ON CONFLICT
+        assert sql.endswith('WHERE NOT EXISTS (SELECT 1 FROM "api_transaction_key" AS stored '
+                            'WHERE stored."transaction_id" = staged."transaction_id") RETURNING "transaction_id"')
+        assert 'ON CONFLICT' not in sql
+
+    def test_stored_rows_updated_in_upsert_mode(self):
+        sql = merge_sql(IMPORT_MODE_UPSERT)
+
+        assert sql.startswith('WITH updated AS (UPDATE "api_transaction" AS stored SET '
+                              '"timestamp" = staged."timestamp", "amount" = staged."amount", ')
+        assert '"transaction_id" = staged."transaction_id",' not in sql
+        assert f'inserted AS ({merge_sql(IMPORT_MODE_INSERT)})' in sql
+        assert sql.endswith('SELECT "transaction_id" FROM updated UNION ALL SELECT "transaction_id" FROM inserted')
+
+
+@pytest.mark.django_db
+class TestCopyBatch:
+
+    @pytest.fixture(autouse=True)
+    def setup_method(self):
+        factory = TransactionFactory()
+        self.transactions_data = [factory.generate_transaction_data(allow_duplicates=True) for _ in range(LOOP_COUNT)]
+        self.batch = [(line, row, Transaction(**row)) for line, row in enumerate(self.transactions_data, start=2)]
+        for _, _, instance in self.batch:
+            # Typed values, as returned by the row validators
+            instance.clean_fields()
+
+    def test_disabled_outside_postgresql(self, settings):
+        assert copy_supported() == (connection.vendor == 'postgresql')
+        settings.TRANSACTION_IMPORT_COPY = False
+        assert not copy_supported()
+        # Only the merge skips or overwrites stored rows of the partitioned table
+        assert copy_supported(IMPORT_MODE_UPSERT) == (connection.vendor == 'postgresql')
+
+    def rollup_count(self):
+        return sum(TransactionDailyRollup.objects.values_list('transaction_count', flat=True))
+
+    def test_ids_not_written_reported_in_insert_mode(self):
+        # Simulates a merge skipping a row committed by another upload after the batch was validated
+        written = {instance.pk for _, _, instance in self.batch} - {self.batch[2][2].pk}
+        report = ErrorReport(sample_size=10)
+
+        with patch('api.tasks.copy_transactions', return_value=written) as copy:
+            assert _copy_batch(self.batch, report, IMPORT_MODE_INSERT) == LOOP_COUNT - 1
+
+        copy.assert_called_once_with([instance for _, _, instance in self.batch], IMPORT_MODE_INSERT)
+        assert report.sample == [{"line": 4, "row": self.transactions_data[2],
+                                  "errors": {"transaction_id": [DUPLICATE_TRANSACTION_ERROR]}}]
+        assert self.rollup_count() == LOOP_COUNT - 1
+
+    def test_conflicting_merge_retried_row_by_row(self):
+        # Simulates a row saved without the locks, by the API, after the merge looked the ids up
+        Transaction.objects.create(**self.transactions_data[2])
+        report = ErrorReport(sample_size=10)
+
+        with patch('api.tasks.copy_transactions', side_effect=IntegrityError):
+            assert _copy_batch(self.batch, report, IMPORT_MODE_INSERT) == LOOP_COUNT - 1
+
+        assert report.sample == [{"line": 4, "row": self.transactions_data[2],
+                                  "errors": {"transaction_id": [DUPLICATE_TRANSACTION_ERROR]}}]
+        assert Transaction.objects.count() == LOOP_COUNT
+
+    def test_only_written_ids_counted_in_skip_mode(self):
+        written = {instance.pk for _, _, instance in self.batch[:10]}
+        report = ErrorReport(sample_size=10)
+
+        with patch('api.tasks.copy_transactions', return_value=written):
+            assert _copy_batch(self.batch, report, IMPORT_MODE_SKIP_EXISTING) == LOOP_COUNT
+
+        assert report.count == 0
+        assert self.rollup_count() == 10
+
+    def test_replaced_rows_uncounted_in_upsert_mode(self):
+        Transaction.objects.create(**{**self.transactions_data[0], 'amount': Decimal('1.00')})
+        report = ErrorReport(sample_size=10)
+
+        with patch('api.tasks.copy_transactions', return_value={instance.pk for _, _, instance in self.batch}):
+            assert _copy_batch(self.batch, report, IMPORT_MODE_UPSERT) == LOOP_COUNT
+
+        assert report.count == 0
+        # The stored version of the first row is taken out of the rollups, its new version added
+        assert self.rollup_count() == LOOP_COUNT
+        assert sum(TransactionDailyRollup.objects.values_list('amount_total', flat=True)) == sum(
+            instance.amount for _, _, instance in self.batch)
+
+    @postgresql_only
+    def test_batch_copied(self):
+        report = ErrorReport(sample_size=10)
+
+        assert _copy_batch(self.batch, report, IMPORT_MODE_INSERT) == LOOP_COUNT
+        assert report.count == 0
+        assert Transaction.objects.count() == LOOP_COUNT
+        assert sum(TransactionDailyRollup.objects.values_list('transaction_count', flat=True)) == LOOP_COUNT
+
+    @postgresql_only
+    def test_rows_stored_meanwhile_reported(self):
+        # Simulates a row committed by another upload after the batch was validated
+        Transaction.objects.create(**self.transactions_data[2])
+        report = ErrorReport(sample_size=10)
+
+        assert _copy_batch(self.batch, report, IMPORT_MODE_INSERT) == LOOP_COUNT - 1
+        assert report.sample == [{"line": 4, "row": self.transactions_data[2],
+                                  "errors": {"transaction_id": [DUPLICATE_TRANSACTION_ERROR]}}]
+        assert sum(TransactionDailyRollup.objects.values_list('transaction_count', flat=True)) == LOOP_COUNT
+
+    @postgresql_only
+    def test_stored_rows_updated_in_upsert_mode(self):
+        Transaction.objects.create(**{**self.transactions_data[0], 'amount': Decimal('1.00')})
+        report = ErrorReport(sample_size=10)
+
+        assert _copy_batch(self.batch, report, IMPORT_MODE_UPSERT) == LOOP_COUNT
+        assert Transaction.objects.get(pk=self.transactions_data[0]['transaction_id']).amount == \
+            self.batch[0][2].amount
+        assert sum(TransactionDailyRollup.objects.values_list('transaction_count', flat=True)) == LOOP_COUNT
@@ -0,0 +1,455 @@
+import io
+import csv
+import gzip
+import json
+import pytest
+from datetime import datetime
+from decimal import Decimal
+from unittest.mock import patch
+from celery.contrib.testing.worker import start_worker
+from django.core.files.base import ContentFile
+from django.db import connection
+from rest_framework.exceptions import ValidationError
+
+from core.celery import app as celery_app
+from api.models import Transaction
+from api.tasks import process_csv_file, process_csv_chunk, _save_batch
+from api.lib.validators import DUPLICATE_TRANSACTION_ERROR
+from api.lib.uploads import save_upload
+from api.lib.error_reports import ErrorReport, StoredErrorReport, error_report_name
+from lib.TransactionFactory import TransactionFactory
+
+LOOP_COUNT = 25
+
+
+def csv_content(transactions_data):
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=transactions_data[0].keys())
+    writer.writeheader()
+    for row in transactions_data:
+        writer.writerow(row)
+    return output.getvalue().encode("utf-8")
+
+
+def store_csv_file(transactions_data):
+    return save_upload(ContentFile(csv_content(transactions_data)))
+
+
+@pytest.mark.django_db
+class TestProcessCsvFile:
+
+    @pytest.fixture(autouse=True)
+    def setup_method(self):
+        factory = TransactionFactory()
+        self.transactions_data = [
+            factory.generate_transaction_data(allow_duplicates=True) for _ in range(LOOP_COUNT)]
+
+    @pytest.mark.parametrize("batch_size", [1, 7, LOOP_COUNT, 1000])
+    def test_all_rows_inserted(self, batch_size):
+        result = process_csv_file(store_csv_file(self.transactions_data), batch_size=batch_size)
+
+        assert result == {'rows_read': LOOP_COUNT, 'inserted': LOOP_COUNT, 'rejected': 0, 'errors': []}
+        assert Transaction.objects.count() == LOOP_COUNT
+
+    def test_invalid_rows_reported(self):
+        self.transactions_data[3]['amount'] = '-1'
+        self.transactions_data[10]['quantity'] = 'ten'
+
+        result = process_csv_file(store_csv_file(self.transactions_data), batch_size=4)
+
+        assert result['inserted'] == LOOP_COUNT - 2
+        assert [error['row']['transaction_id'] for error in result['errors']] == [
+            self.transactions_data[3]['transaction_id'], self.transactions_data[10]['transaction_id']]
+        assert "Amount must be greater than zero." in result['errors'][0]['errors']['amount']
+        assert "A valid integer is required." in result['errors'][1]['errors']['quantity']
+        assert [error['line'] for error in result['errors']] == [5, 12]
+
+    def test_errors_sampled_and_stored(self, settings):
+        settings.TRANSACTION_IMPORT_ERROR_SAMPLE_SIZE = 2
+        for row in self.transactions_data[:5]:
+            row['currency'] = 'PL'
+
+        result = process_csv_file.apply((store_csv_file(self.transactions_data),), kwargs={'batch_size': 2})
+
+        assert result.get()['rejected'] == 5
+        assert [error['line'] for error in result.get()['errors']] == [2, 3]
+        report = StoredErrorReport(error_report_name(result.id))
+        assert len(report) == 5
+        assert report[1:4] == [{"line": line, "errors": {"currency": ["invalid"]}} for line in (3, 4, 5)]
+
+    def test_no_error_report_without_errors(self, upload_storage):
+        result = process_csv_file.apply((store_csv_file(self.transactions_data),))
+
+        assert result.get()['rejected'] == 0
+        assert not StoredErrorReport(error_report_name(result.id)).exists()
+
+    @pytest.mark.parametrize("batch_size", [5, 1000])
+    def test_duplicate_rows_reported(self, batch_size):
+        # One duplicate inside the same batch, one in a later batch
+        self.transactions_data.insert(2, dict(self.transactions_data[1]))
+        self.transactions_data.append(dict(self.transactions_data[0]))
+
+        result = process_csv_file(store_csv_file(self.transactions_data), batch_size=batch_size)
+
+        assert result['inserted'] == LOOP_COUNT
+        assert len(result['errors']) == 2
+        for error in result['errors']:
+            assert DUPLICATE_TRANSACTION_ERROR in error['errors']['transaction_id']
+        assert Transaction.objects.count() == LOOP_COUNT
+
+    def test_already_stored_rows_reported(self):
+        Transaction.objects.create(**self.transactions_data[5])
+
+        result = process_csv_file(store_csv_file(self.transactions_data), batch_size=10)
+
+        assert result['inserted'] == LOOP_COUNT - 1
+        assert len(result['errors']) == 1
+        assert Transaction.objects.count() == LOOP_COUNT
+
+    def test_conflicting_batch_falls_back_to_row_inserts(self):
+        # Simulates a row committed by another upload after the batch was validated
+        Transaction.objects.create(**self.transactions_data[2])
+        batch = [(line, row, Transaction(**row)) for line, row in enumerate(self.transactions_data[:5], start=2)]
+        report = ErrorReport(sample_size=10)
+
+        inserted = _save_batch(batch, report)
+
+        assert inserted == 4
+        assert report.sample == [{"line": 4, "row": self.transactions_data[2],
+                                  "errors": {"transaction_id": [DUPLICATE_TRANSACTION_ERROR]}}]
+        assert Transaction.objects.count() == 5
+
+    def test_processed_file_removed(self, upload_storage):
+        file_name = store_csv_file(self.transactions_data)
+        assert (upload_storage / file_name).exists()
+
+        process_csv_file(file_name)
+
+        assert not (upload_storage / file_name).exists()
+
+    def test_invalid_header_encoding(self, upload_storage):
+        file_name = save_upload(ContentFile(b"transaction_id,\xff\xfe\n1,2\n"))
+
+        with pytest.raises(ValidationError):
+            process_csv_file(file_name)
+        assert not (upload_storage / file_name).exists()
+
+    def test_invalid_encoding_rejects_its_row(self):
+        # Batches before the line are committed by the time it is read, only its row is rejected
+        content = csv_content(self.transactions_data).split(b"\n")
+        content[15] = content[15].replace(b",", b"\xff,", 1)
+
+        result = process_csv_file(save_upload(ContentFile(b"\n".join(content))), batch_size=10)
+
+        assert result['inserted'] == LOOP_COUNT - 1
+        assert result['rejected'] == 1
+        assert result['errors'][0]['line'] == 16
+        assert result['errors'][0]['errors'] == {'non_field_errors': ['Line is not valid UTF-8.']}
+        assert result['errors'][0]['row']['transaction_id'].endswith('\ufffd')
+        assert Transaction.objects.count() == LOOP_COUNT - 1
+
+
+@pytest.mark.django_db
+class TestProcessCompressedCsvFile:
+
+    @pytest.fixture(autouse=True)
+    def setup_method(self, settings):
+        # Compressed files are never split, however many rows they hold
+        settings.TRANSACTION_IMPORT_CHUNK_SIZE = 4
+        factory = TransactionFactory()
+        self.transactions_data = [
+            factory.generate_transaction_data(allow_duplicates=True) for _ in range(LOOP_COUNT)]
+
+    def test_all_rows_inserted(self, upload_storage):
+        file_name = save_upload(ContentFile(gzip.compress(csv_content(self.transactions_data)), name="file.csv.gz"))
+
+        result = process_csv_file.apply((file_name,), kwargs={'batch_size': 7}).get()
+
+        assert result == {'rows_read': LOOP_COUNT, 'inserted': LOOP_COUNT, 'rejected': 0, 'errors': []}
+        assert Transaction.objects.count() == LOOP_COUNT
+        assert not (upload_storage / file_name).exists()
+
+    def test_corrupted_file(self, upload_storage):
+        content = gzip.compress(csv_content(self.transactions_data))
+        file_name = save_upload(ContentFile(content[:len(content) // 2], name="file.csv.gz"))
+
+        with pytest.raises(ValidationError):
+            process_csv_file(file_name)
+        assert not (upload_storage / file_name).exists()
+
+    def test_decompressed_size_limited(self, settings):
+        content = csv_content(self.transactions_data)
+        settings.TRANSACTION_UPLOAD_MAX_DECOMPRESSED_SIZE = len(content) // 2
+        file_name = save_upload(ContentFile(gzip.compress(content), name="file.csv.gz"))
+
+        with pytest.raises(ValidationError, match="exceeds"):
+            process_csv_file(file_name)
+
+
+@pytest.mark.django_db
+class TestProcessNdjsonFile:
+
+    @pytest.fixture(autouse=True)
+    def setup_method(self):
+        factory = TransactionFactory()
+        self.transactions_data = [
+            factory.generate_transaction_data(allow_duplicates=True) for _ in range(LOOP_COUNT)]
+
+    def store_ndjson_file(self, lines):
+        return save_upload(ContentFile("\n".join(lines).encode("utf-8"), name="file.ndjson"))
+
+    def test_all_rows_inserted(self, upload_storage):
+        for row in self.transactions_data:
+            row['quantity'] = int(row['quantity'])
+        file_name = self.store_ndjson_file(json.dumps(row) for row in self.transactions_data)
+
+        result = process_csv_file(file_name, batch_size=7)
+
+        assert result == {'rows_read': LOOP_COUNT, 'inserted': LOOP_COUNT, 'rejected': 0, 'errors': []}
+        assert Transaction.objects.count() == LOOP_COUNT
+        assert not (upload_storage / file_name).exists()
+
+    def test_invalid_lines_reported(self):
+        self.transactions_data[2]['amount'] = -1
+        lines = [json.dumps(row) for row in self.transactions_data]
+        lines[5] = '{"transaction_id": '
+
+        result = process_csv_file(self.store_ndjson_file(lines))
+
+        assert result['inserted'] == LOOP_COUNT - 2
+        assert [(error['line'], list(error['errors'])) for error in result['errors']] == [
+            (3, ['amount']), (6, ['non_field_errors'])]
+
+
+@pytest.mark.django_db
+class TestProcessParquetFile:
+
+    @pytest.fixture(autouse=True)
+    def setup_method(self):
+        factory = TransactionFactory()
+        self.transactions_data = [
+            factory.generate_transaction_data(allow_duplicates=True) for _ in range(LOOP_COUNT)]
+
+    def store_parquet_file(self):
+        pa = pytest.importorskip("pyarrow")
+        pq = pytest.importorskip("pyarrow.parquet")
+        table = pa.table({
+            'transaction_id': [row['transaction_id'] for row in self.transactions_data],
+            'timestamp': pa.array([datetime.fromisoformat(row['timestamp']) for row in self.transactions_data],
+                                  pa.timestamp('us', tz='UTC')),
+            'amount': pa.array([Decimal(row['amount']) for row in self.transactions_data], pa.decimal128(10, 2)),
+            'currency': [row['currency'] for row in self.transactions_data],
+            'customer_id': [row['customer_id'] for row in self.transactions_data],
+            'product_id': [row['product_id'] for row in self.transactions_data],
+            'quantity': [int(row['quantity']) for row in self.transactions_data],
+        })
+        output = io.BytesIO()
+        pq.write_table(table, output, row_group_size=10)
+        return save_upload(ContentFile(output.getvalue(), name="file.parquet"))
+
+    def test_all_rows_inserted(self, upload_storage):
+        file_name = self.store_parquet_file()
+
+        result = process_csv_file(file_name, batch_size=7)
+
+        assert result == {'rows_read': LOOP_COUNT, 'inserted': LOOP_COUNT, 'rejected': 0, 'errors': []}
+        stored = Transaction.objects.get(pk=self.transactions_data[0]['transaction_id'])
+        assert stored.amount == Decimal(self.transactions_data[0]['amount'])
+        assert stored.timestamp == datetime.fromisoformat(self.transactions_data[0]['timestamp'])
+        assert not (upload_storage / file_name).exists()
+
+    def test_invalid_rows_reported(self):
+        self.transactions_data[3]['amount'] = '-1'
+        self.transactions_data[10]['currency'] = 'PL'
+        Transaction.objects.create(**self.transactions_data[20])
+
+        result = process_csv_file(self.store_parquet_file(), batch_size=7)
+
+        assert result['inserted'] == LOOP_COUNT - 3
+        assert [(error['line'], list(error['errors'])) for error in result['errors']] == [
+            (4, ['amount']), (11, ['currency']), (21, ['transaction_id'])]
+        assert result['errors'][0]['row']['amount'] == '-1.00'
+
+    def test_invalid_file(self, upload_storage):
+        pytest.importorskip("pyarrow")
+        file_name = save_upload(ContentFile(b"not a parquet file", name="file.parquet"))
+
+        with pytest.raises(ValidationError):
+            process_csv_file(file_name)
+        assert not (upload_storage / file_name).exists()
+
+
+@pytest.mark.django_db
+class TestProcessCsvFileModes:
+
+    @pytest.fixture(autouse=True)
+    def setup_method(self):
+        factory = TransactionFactory()
+        self.transactions_data = [
+            factory.generate_transaction_data(allow_duplicates=True) for _ in range(LOOP_COUNT)]
+        self.stored = [Transaction.objects.create(**row) for row in self.transactions_data[:10]]
+        for row in self.transactions_data:
+            row['amount'] = '12.34'
+
+    def test_insert_rejects_existing(self):
+        result = process_csv_file(store_csv_file(self.transactions_data), mode='insert')
+
+        assert result['inserted'] == LOOP_COUNT - 10
+        assert len(result['errors']) == 10
+
+    @pytest.mark.parametrize("validator", [
+        'api.lib.validators.TransactionRowValidator', 'api.lib.validators.SerializerRowValidator'])
+    def test_skip_existing_keeps_stored(self, settings, validator):
+        settings.TRANSACTION_IMPORT_VALIDATOR = validator
+
+        result = process_csv_file(store_csv_file(self.transactions_data), batch_size=10, mode='skip_existing')
+
+        assert result['errors'] == []
+        assert Transaction.objects.count() == LOOP_COUNT
+        for stored in self.stored:
+            stored.refresh_from_db()
+            assert stored.amount != Decimal('12.34')
+
+    @pytest.mark.parametrize("validator", [
+        'api.lib.validators.TransactionRowValidator', 'api.lib.validators.SerializerRowValidator'])
+    def test_upsert_overwrites_stored(self, settings, validator):
+        settings.TRANSACTION_IMPORT_VALIDATOR = validator
+
+        result = process_csv_file(store_csv_file(self.transactions_data), batch_size=10, mode='upsert')
+
+        assert result == {'rows_read': LOOP_COUNT, 'inserted': LOOP_COUNT, 'rejected': 0, 'errors': []}
+        assert Transaction.objects.count() == LOOP_COUNT
+        assert set(Transaction.objects.values_list('amount', flat=True)) == {Decimal('12.34')}
+
+    @pytest.mark.skipif(connection.vendor == 'postgresql', reason="PostgreSQL upserts merge with COPY")
+    def test_one_statement_per_batch(self, django_assert_num_queries):
+        file_name = store_csv_file(self.transactions_data)
+
+        # One INSERT per batch of 10 rows, with a read of the stored rows and a rollup update, each wrapped in a
+        # savepoint. The first batch overwrites the stored rows, and deletes the rollup rows it empties. The
+        # batches of new rows also create, lock and write their daily sketches.
+        with django_assert_num_queries(3 * 5 + 1 + 2 * 3):
+            process_csv_file(file_name, batch_size=10, mode='upsert')
+
+    @pytest.mark.parametrize("mode, amount", [('skip_existing', '1.00'), ('upsert', '3.00')])
+    def test_repeated_rows_in_file(self, mode, amount):
+        rows = [dict(self.transactions_data[-1], amount=value) for value in ('1.00', '2.00', '3.00')]
+
+        result = process_csv_file(store_csv_file(rows), mode=mode)
+
+        assert result['errors'] == []
+        assert Transaction.objects.get(pk=rows[0]['transaction_id']).amount == Decimal(amount)
+
+
+@pytest.mark.django_db
+class TestProcessCsvFileInChunks:
+
+    # Run eagerly or called directly, the chunk tasks are applied in-process instead of a chord
+
+    @pytest.fixture(autouse=True)
+    def setup_method(self, settings):
+        settings.TRANSACTION_IMPORT_CHUNK_SIZE = 4
+        settings.TRANSACTION_IMPORT_MAX_PARALLEL_CHUNKS = 3
+        factory = TransactionFactory()
+        self.transactions_data = [
+            factory.generate_transaction_data(allow_duplicates=True) for _ in range(LOOP_COUNT)]
+
+    def test_chunked_result_equals_serial(self, settings):
+        self.transactions_data[1]['amount'] = '-1'
+        self.transactions_data[12]['currency'] = 'PL'
+        self.transactions_data[20]['transaction_id'] = 'invalid'
+        file_data = store_csv_file(self.transactions_data)
+
+        with patch("api.tasks.process_csv_chunk.run", wraps=process_csv_chunk.run) as process_chunk:
+            chunked = process_csv_file.apply((file_data,))
+        chunked_result = chunked.get()
+        assert process_chunk.call_count == 3
+
+        Transaction.objects.all().delete()
+        settings.TRANSACTION_IMPORT_CHUNK_SIZE = LOOP_COUNT
+        serial = process_csv_file.apply((store_csv_file(self.transactions_data),))
+        serial_result = serial.get()
+
+        assert chunked_result == serial_result
+        assert [error['line'] for error in chunked_result['errors']] == [3, 14, 22]
+        chunked_report = StoredErrorReport(error_report_name(chunked.id))
+        assert chunked_report[:] == StoredErrorReport(error_report_name(serial.id))[:]
+        assert len(chunked_report) == 3
+        assert chunked_result['inserted'] == LOOP_COUNT - 3
+        assert Transaction.objects.count() == LOOP_COUNT - 3
+
+    def test_chunked_file_removed(self, upload_storage):
+        file_name = store_csv_file(self.transactions_data)
+
+        process_csv_file.apply((file_name,)).get()
+
+        assert not (upload_storage / file_name).exists()
+
+    def test_chunked_when_called_directly(self, upload_storage):
+        celery_app.conf.task_always_eager = False
+        self.transactions_data[6]['amount'] = '-1'
+        file_name = store_csv_file(self.transactions_data)
+
+        with patch("api.tasks.process_csv_chunk.run", wraps=process_csv_chunk.run) as process_chunk:
+            result = process_csv_file(file_name)
+
+        assert process_chunk.call_count == 3
+        assert result['inserted'] == LOOP_COUNT - 1
+        assert [error['line'] for error in result['errors']] == [8]
+        assert Transaction.objects.count() == LOOP_COUNT - 1
+        assert not (upload_storage / file_name).exists()
+
+    def test_failed_chunk_removes_file(self, upload_storage):
+        file_name = store_csv_file(self.transactions_data)
+
+        with patch("api.tasks.process_csv_chunk.run", side_effect=RuntimeError), pytest.raises(RuntimeError):
+            process_csv_file.apply((file_name,)).get()
+
+        assert not (upload_storage / file_name).exists()
+
+
+@pytest.mark.django_db(transaction=True)
+class TestProcessCsvFileByWorker:
+
+    @pytest.fixture(autouse=True)
+    def setup_method(self, settings):
+        settings.TRANSACTION_IMPORT_CHUNK_SIZE = 4
+        settings.TRANSACTION_IMPORT_MAX_PARALLEL_CHUNKS = 3
+        factory = TransactionFactory()
+        self.transactions_data = [
+            factory.generate_transaction_data(allow_duplicates=True) for _ in range(LOOP_COUNT)]
+
+    @pytest.fixture
+    def worker(self):
+        """An in-memory broker and result backend, and a worker thread running the chord."""
+
+        def reconnect():
+            # The app keeps its broker connections and result backend once made
+            celery_app._pool = None
+            celery_app.amqp._producer_pool = None
+            celery_app._backend = celery_app._get_backend()
+
+        # Settings are read with the CELERY namespace
+        conf = {key: celery_app.conf[key] for key in ('CELERY_BROKER_URL', 'CELERY_RESULT_BACKEND')}
+        celery_app.conf.update(CELERY_BROKER_URL='memory://', CELERY_RESULT_BACKEND='cache+memory://')
+        celery_app.conf.task_always_eager = False
+        reconnect()
+        try:
+            with start_worker(celery_app, pool='solo', perform_ping_check=False):
+                yield
+        finally:
+            celery_app.conf.update(conf)
+            reconnect()
+
+    def test_chord_result_under_task_id(self, worker, upload_storage):
+        self.transactions_data[6]['amount'] = '-1'
+        file_name = store_csv_file(self.transactions_data)
+
+        task = process_csv_file.delay(file_name)
+        result = task.get(timeout=30)
+
+        assert result['inserted'] == LOOP_COUNT - 1
+        assert [error['line'] for error in result['errors']] == [8]
+        assert [error['line'] for error in StoredErrorReport(error_report_name(task.id))[:]] == [8]
+        assert Transaction.objects.count() == LOOP_COUNT - 1
+        assert not (upload_storage / file_name).exists()
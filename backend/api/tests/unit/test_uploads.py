@@ -0,0 +1,154 @@
+import gzip
+import pytest
+from django.core.files.base import ContentFile
+
+from api.lib.uploads import (save_upload, split_upload, ndjson_range, UploadRows, NdjsonRows, UndecodableRow,
+                             UploadTooLarge)
+
+HEADER = b"a,b\r\n"
+
+
+def store(content, name=None):
+    return save_upload(ContentFile(content, name=name))
+
+
+def zstd_compress(content):
+    zstandard = pytest.importorskip("zstandard")
+    return zstandard.ZstdCompressor().compress(content)
+
+
+def read_chunks(file_name, chunk_rows, max_chunks):
+    fieldnames, chunks = split_upload(file_name, chunk_rows, max_chunks)
+    return [[row['a'] for row in UploadRows(file_name, fieldnames, start, end)] for start, end, _ in chunks]
+
+
+class TestSplitUpload:
+
+    @pytest.mark.parametrize("chunk_rows, max_chunks, expected", [
+        (2, 10, [['0', '1'], ['2', '3'], ['4']]),
+        (5, 10, [['0', '1', '2', '3', '4']]),
+        (1, 2, [['0', '1', '2'], ['3', '4']]),
+        (1, 5, [['0'], ['1'], ['2'], ['3'], ['4']]),
+    ])
+    def test_chunks_cover_all_rows(self, chunk_rows, max_chunks, expected):
+        file_name = store(HEADER + b"".join(b"%d,x\r\n" % i for i in range(5)))
+
+        assert read_chunks(file_name, chunk_rows, max_chunks) == expected
+
+    def test_missing_final_newline(self):
+        file_name = store(HEADER + b"0,x\r\n1,x")
+
+        assert read_chunks(file_name, 1, 10) == [['0'], ['1']]
+
+    def test_quoted_newline_not_split(self):
+        file_name = store(HEADER + b'0,"multi\r\nline"\r\n1,x\r\n')
+        fieldnames, chunks = split_upload(file_name, 1, 10)
+
+        rows = [list(UploadRows(file_name, fieldnames, start, end)) for start, end, _ in chunks]
+
+        assert rows == [[{'a': '0', 'b': 'multi\r\nline'}], [{'a': '1', 'b': 'x'}]]
+
+    def test_undecodable_lines_mark_their_row(self):
+        file_name = store(HEADER + b'0,\xff\r\n1,"multi\r\n\xfe"\r\n2,x\r\n')
+        fieldnames, chunks = split_upload(file_name, 10, 10)
+
+        rows = list(UploadRows(file_name, fieldnames, *chunks[0][:2]))
+
+        assert [type(row) for row in rows] == [UndecodableRow, UndecodableRow, dict]
+        assert rows == [{'a': '0', 'b': '\ufffd'}, {'a': '1', 'b': 'multi\r\n\ufffd'}, {'a': '2', 'b': 'x'}]
+
+    def test_byte_order_mark_stripped(self):
+        file_name = store(b"\xef\xbb\xbf" + HEADER + b"0,x\r\n")
+
+        assert read_chunks(file_name, 1, 10) == [['0']]
+
+    def test_header_only(self):
+        file_name = store(HEADER)
+
+        assert split_upload(file_name, 1, 10) == (['a', 'b'], [])
+
+    def test_empty_file(self):
+        file_name = store(b"")
+
+        assert split_upload(file_name, 1, 10) == (None, [])
+
+    def test_bytes_read(self):
+        content = HEADER + b"0,x\r\n1,x\r\n"
+        file_name = store(content)
+        fieldnames, [(start, end, _)] = split_upload(file_name, 10, 10)
+        rows = UploadRows(file_name, fieldnames, start, end)
+
+        iterator = iter(rows)
+        next(iterator)
+        assert rows.bytes_read == len(b"0,x\r\n")
+        list(iterator)
+        assert rows.bytes_read == end - start == len(content) - len(HEADER)
+
+    def test_line_numbers(self):
+        file_name = store(HEADER + b'0,x\r\n1,"multi\r\nline"\r\n\r\n2,x\r\n3,x\r\n')
+        fieldnames, chunks = split_upload(file_name, 2, 10)
+
+        line_numbers = []
+        for start, end, line_offset in chunks:
+            rows = UploadRows(file_name, fieldnames, start, end, line_offset)
+            line_numbers.append([(row['a'], rows.line_number) for row in rows])
+
+        assert line_numbers == [[('0', 2), ('1', 4)], [('2', 6)], [('3', 7)]]
+
+
+class TestCompressedUpload:
+
+    CONTENT = HEADER + b'0,x\r\n1,"multi\r\nline"\r\n2,x\r\n'
+
+    @pytest.mark.parametrize("suffix, compress", [(".csv.gz", gzip.compress), (".csv.zst", zstd_compress)])
+    def test_rows_decompressed(self, suffix, compress):
+        file_name = store(compress(self.CONTENT), name=f"upload{suffix}")
+        assert file_name.endswith(suffix)
+
+        fieldnames, chunks = split_upload(file_name, 1, 10)
+        assert chunks == [(len(HEADER), None, 1)]
+
+        rows = UploadRows(file_name, fieldnames, *chunks[0])
+        assert [(row['b'], rows.line_number) for row in rows] == [('x', 2), ('multi\r\nline', 4), ('x', 5)]
+        assert rows.bytes_read == rows.bytes_total
+
+    def test_header_only(self):
+        file_name = store(gzip.compress(HEADER), name="upload.csv.gz")
+
+        assert split_upload(file_name, 1, 10) == (['a', 'b'], [])
+
+    def test_decompressed_size_limited(self, settings):
+        settings.TRANSACTION_UPLOAD_MAX_DECOMPRESSED_SIZE = len(self.CONTENT) - 1
+        file_name = store(gzip.compress(self.CONTENT), name="upload.csv.gz")
+        fieldnames, chunks = split_upload(file_name, 1, 10)
+
+        with pytest.raises(UploadTooLarge):
+            list(UploadRows(file_name, fieldnames, *chunks[0]))
+
+    def test_header_size_limited(self, settings):
+        settings.TRANSACTION_UPLOAD_MAX_DECOMPRESSED_SIZE = 100
+        file_name = store(gzip.compress(b"a" * 1000), name="upload.csv.gz")
+
+        with pytest.raises(UploadTooLarge):
+            split_upload(file_name, 1, 10)
+
+
+class TestNdjsonRows:
+
+    CONTENT = b'{"a": "0"}\n\n[1, 2]\nnot json\r\n{"a": 1}'
+
+    @pytest.mark.parametrize("suffix, compress", [(".ndjson", bytes), (".ndjson.gz", gzip.compress)])
+    def test_rows(self, suffix, compress):
+        file_name = store(compress(self.CONTENT), name=f"upload{suffix}")
+        rows = NdjsonRows(file_name, *ndjson_range(file_name))
+
+        assert [(row, rows.line_number) for row in rows] == [({'a': '0'}, 1), (None, 3), (None, 4), ({'a': 1}, 5)]
+        assert rows.bytes_read == rows.bytes_total
+
+    @pytest.mark.parametrize("suffix, compress", [(".ndjson", bytes), (".ndjson.zst", zstd_compress)])
+    def test_undecodable_line(self, suffix, compress):
+        file_name = store(compress(b'{"a": "0"}\n{"a": "\xff"}\nnot \xff json\n{"a": 1}'), name=f"upload{suffix}")
+        rows = NdjsonRows(file_name, *ndjson_range(file_name))
+
+        assert [(type(row), row, rows.line_number) for row in rows] == [
+            (dict, {'a': '0'}, 1), (UndecodableRow, {'a': '\ufffd'}, 2), (UndecodableRow, {}, 3), (dict, {'a': 1}, 4)]
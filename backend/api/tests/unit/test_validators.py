@@ -0,0 +1,160 @@
+import uuid
+import pytest
+from rest_framework.fields import empty
+
+from api.models import Transaction
+from api.serializers import TransactionSerializer
+from api.lib.validators import TransactionRowValidator, SerializerRowValidator, DUPLICATE_TRANSACTION_ERROR
+from lib.TransactionFactory import TransactionFactory
+
+
+INVALID_VALUES = {
+    'transaction_id': [empty, None, '', ' ', 'invalid-uuid', '123', '{12345678-1234-5678-1234-567812345678}',
+                       'urn:uuid:12345678-1234-5678-1234-567812345678', '12345678123456781234567812345678',
+                       'D4A3F861-6C22-44F7-8121-09DF0D5B79F3', ' d4a3f861-6c22-44f7-8121-09df0d5b79f3'],
+    'timestamp': [empty, None, '', '2025/07/14 12:15:30', '2025-07-14', '2025-07-14T12:15', '2025-07-14 12:15:30',
+                  '2025-07-14T12:15:30.123456+02:00', '2025-13-14T12:15:30Z', '2025-07-14T25:15:30Z',
+                  '2025-07-14T12:15:30+25:00', '0001-01-01T00:00:00+01:00', 'now', ' 2025-07-14T12:15:30Z'],
+    'amount': [empty, None, '', ' ', 'abc', '-100', '0', '0.00', '0.001', '0.005', '1.005', '12345678.99',
+               '123456789.99', '1e2', '1E-2', 'NaN', 'Infinity', '-Infinity', ' 5.5 ', '+5', '1_000', '5,50',
+               '9' * 1001],
+    'currency': [empty, None, '', '   ', 'PL', 'pln', 'PLNN', ' eur ', 'E\x00R', '\ud800AB', 'A B', 'A\tB', 'zł1'],
+    'customer_id': [empty, None, '', 'asdassdsad', '{12345678-1234-5678-1234-567812345678}'],
+    'product_id': [empty, None, '', '123', 'D4A3F861-6C22-44F7-8121-09DF0D5B79F3'],
+    'quantity': [empty, None, '', ' ', 'ten', '-5', '0', ' 3 ', '1.0', '1.00 ', '1.5', '1e3', '1_000', '+7',
+                 '٣', '9223372036854775807', '9223372036854775808', '-9223372036854775809', '1' * 1001],
+}
+
+CASES = [(field_name, value) for field_name, values in INVALID_VALUES.items() for value in values]
+
+# Values as decoded from NDJSON or read from Parquet files, rather than CSV text
+NATIVE_VALUES = {
+    'transaction_id': [uuid.UUID('d4a3f861-6c22-44f7-8121-09df0d5b79f3'), 123, 1.5, [], {}],
+    'amount': [12, 12.5, 0.001, -1.5, 0, 1e20, float('nan'), float('inf'), True],
+    'currency': [123, True, ['PLN']],
+    'quantity': [0, 3, -5, 2 ** 63, 3.0, 3.5, True, False],
+}
+
+NATIVE_CASES = [(field_name, value) for field_name, values in NATIVE_VALUES.items() for value in values]
+
+
+@pytest.mark.django_db
+class TestTransactionRowValidatorParity:
+    """The fast validator must accept, convert and reject exactly like TransactionSerializer."""
+
+    @pytest.fixture(autouse=True)
+    def setup_method(self):
+        self.factory = TransactionFactory()
+        self.validator = TransactionRowValidator()
+
+    def assert_parity(self, row):
+        transaction_serializer = TransactionSerializer(data=row)
+        is_valid = transaction_serializer.is_valid()
+
+        transactions, errors = self.validator.validate_batch([row])
+
+        if is_valid:
+            assert errors == []
+            [(index, transaction)] = transactions
+            assert index == 0
+            for field_name, value in transaction_serializer.validated_data.items():
+                assert getattr(transaction, field_name) == value, field_name
+                assert type(getattr(transaction, field_name)) is type(value), field_name
+        else:
+            assert transactions == []
+            [(index, row_errors)] = errors
+            assert index == 0
+            assert row_errors == transaction_serializer.errors
+            for field_name, details in transaction_serializer.errors.items():
+                assert [detail.code for detail in row_errors[field_name]] == [detail.code for detail in details]
+
+    def test_valid_row(self):
+        for _ in range(10):
+            self.assert_parity(self.factory.generate_transaction_data(allow_duplicates=True))
+
+    @pytest.mark.parametrize("field_name, value", CASES)
+    def test_single_field(self, field_name, value):
+        row = self.factory.generate_transaction_data(allow_duplicates=True)
+        if value is empty:
+            del row[field_name]
+        else:
+            row[field_name] = value
+
+        self.assert_parity(row)
+
+    @pytest.mark.parametrize("field_name, value", NATIVE_CASES)
+    def test_native_values(self, field_name, value):
+        row = self.factory.generate_transaction_data(allow_duplicates=True)
+        row[field_name] = value
+
+        self.assert_parity(row)
+
+    def test_all_fields_invalid(self):
+        row = {field_name: 'x' for field_name in INVALID_VALUES}
+
+        self.assert_parity(row)
+
+    def test_extra_columns_ignored(self):
+        row = self.factory.generate_transaction_data(allow_duplicates=True)
+        row[None] = ['unexpected', 'values']
+        row['note'] = 'unexpected column'
+
+        self.assert_parity(row)
+
+    def test_existing_transaction_id(self):
+        row = self.factory.generate_transaction_data(allow_duplicates=True)
+        Transaction.objects.create(**row)
+
+        self.assert_parity(row)
+
+    def test_existing_transaction_id_with_other_errors(self):
+        row = self.factory.generate_transaction_data(allow_duplicates=True)
+        Transaction.objects.create(**row)
+        row['amount'] = '-1'
+
+        self.assert_parity(row)
+
+
+@pytest.mark.django_db
+class TestTransactionRowValidatorBatch:
+
+    @pytest.fixture(autouse=True)
+    def setup_method(self):
+        factory = TransactionFactory()
+        self.rows = [factory.generate_transaction_data(allow_duplicates=True) for _ in range(10)]
+
+    def test_uniqueness_checked_with_one_query(self, django_assert_num_queries):
+        Transaction.objects.create(**self.rows[4])
+        validator = TransactionRowValidator()
+
+        with django_assert_num_queries(1):
+            transactions, errors = validator.validate_batch(self.rows)
+
+        assert [index for index, _ in transactions] == [0, 1, 2, 3, 5, 6, 7, 8, 9]
+        assert errors == [(4, {'transaction_id': [DUPLICATE_TRANSACTION_ERROR]})]
+
+    @pytest.mark.parametrize("validator_class", [TransactionRowValidator, SerializerRowValidator])
+    def test_duplicates_inside_batch(self, validator_class):
+        duplicate = dict(self.rows[2])
+        invalid_duplicate = dict(self.rows[3], amount='-1')
+        rows = self.rows + [duplicate, invalid_duplicate]
+
+        transactions, errors = validator_class().validate_batch(rows)
+
+        assert [index for index, _ in transactions] == list(range(10))
+        assert errors[0] == (10, {'transaction_id': [DUPLICATE_TRANSACTION_ERROR]})
+        assert errors[1][0] == 11
+        assert "Amount must be greater than zero." in errors[1][1]['amount']
+
+    def test_duplicate_of_invalid_row_accepted(self):
+        invalid = dict(self.rows[0], amount='-1')
+
+        transactions, errors = TransactionRowValidator().validate_batch([invalid] + self.rows)
+
+        assert [index for index, _ in transactions] == list(range(1, 11))
+        assert [index for index, _ in errors] == [0]
+
+    def test_transaction_ids_parsed(self):
+        transactions, _ = TransactionRowValidator().validate_batch(self.rows)
+
+        assert all(isinstance(transaction.transaction_id, uuid.UUID) for _, transaction in transactions)
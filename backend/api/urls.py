@@ -5,6 +5,8 @@ from . import views
 urlpatterns = [
     path('transactions/upload',views.TransactionUploadView.as_view(), name='transactions-upload'),
     path('transactions/', views.TransactionListView.as_view(), name = 'transactions-list'),
+    path('transactions/export/', views.TransactionExportView.as_view(), name='transactions-export'),
     path('transactions/<uuid:transaction_id>/', views.TransactionDetailView.as_view(), name = 'transactions-detail'),
     path('tasks/<str:task_id>/', views.TaskStatusView.as_view(), name='task-status'),
+    path('tasks/<str:task_id>/errors/', views.TaskErrorsView.as_view(), name='task-errors'),
 ]
\ No newline at end of file
@@ -1,4 +1,8 @@
+from datetime import datetime, time, timedelta
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from django.shortcuts import render
+from django.utils import timezone
 from rest_framework.views import APIView
 from rest_framework.generics import ListAPIView, RetrieveAPIView
 from rest_framework.response import Response
@@ -6,13 +10,19 @@ from django.shortcuts import get_object_or_404
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from celery.result import AsyncResult
 from rest_framework import status
+from rest_framework.exceptions import NotFound
 
 
-from .serializers import CsvFileSerializer, TransactionSerializer, TransactionListSerializer, TransactionDetailViewSerializer
+from .serializers import CsvFileSerializer, TransactionSerializer, TransactionListSerializer, TransactionDetailViewSerializer, ImportErrorSerializer, TransactionExportSerializer
 from .models import Transaction
-from .paginators import TransactionPaginator
+from .paginators import TransactionPaginator, TransactionCursorPaginator, ErrorReportPaginator
 from lib.logging_config import logger
 from .tasks import process_csv_file
+from .lib.uploads import save_upload
+from .lib.partitions import filter_transaction_ids
+from .lib.progress import PROGRESS_STATE, chunked_progress
+from .lib.error_reports import StoredErrorReport, error_report_name
+from .lib.exports import export_chunks, gzip_chunks, EXPORT_CONTENT_TYPES, EXPORT_SUFFIXES
 
 
 
@@ -22,13 +32,15 @@ class TransactionUploadView(APIView):
     permission_classes = [IsAuthenticated]
     
     def post(self, request):
+        csv_file_serializer = CsvFileSerializer(data=request.data)
+        csv_file_serializer.is_valid(raise_exception=True)
+
         try:
-            csv_file_serializer = CsvFileSerializer(data=request.data)
-            csv_file_serializer.is_valid(raise_exception=True)
             file = csv_file_serializer.validated_data['file']
-            file_data = file.read()
 
-            task = process_csv_file.delay(file_data)
+            # Only the stored file name goes through the broker, the worker streams the file from storage
+            file_name = save_upload(file)
+            task = process_csv_file.delay(file_name, mode=csv_file_serializer.validated_data['mode'])
 
             return Response({
                 "message": "CSV file is being processed.",
@@ -48,6 +60,7 @@ class TaskStatusView(APIView):
     def get(self, request, task_id):
         result = AsyncResult(task_id)
         task_result = result.result
+        progress = None
         
         if isinstance(task_result, Exception):
             task_result = str(task_result)
@@ -55,13 +68,32 @@ class TaskStatusView(APIView):
         if result.status == 'PENDING':
             task_result = None
 
+        if result.status == PROGRESS_STATE:
+            progress = chunked_progress(task_result) if "chunks" in task_result else task_result
+            task_result = None
+
         return Response({
             "task_id": task_id,
             "status": result.status,
+            "progress": progress,
             "result": task_result
         }, status=status.HTTP_200_OK)
 
 
+class TaskErrorsView(ListAPIView):
+    """View to page through every row rejected by an import task, with its file line and error codes."""
+
+    permission_classes = [IsAuthenticated]
+    serializer_class = ImportErrorSerializer
+    pagination_class = ErrorReportPaginator
+
+    def get_queryset(self):
+        report = StoredErrorReport(error_report_name(self.kwargs['task_id']))
+        if not report.exists():
+            raise NotFound("No error report for this task.")
+        return report
+
+
 class TransactionListView(ListAPIView):
     """View to list transactions with optional filtering by customer_id and product_id."""
 
@@ -69,13 +101,23 @@ class TransactionListView(ListAPIView):
     serializer_class = TransactionSerializer
     pagination_class = TransactionPaginator
 
+    @property
+    def paginator(self):
+        # Page numbers stay the default, `pagination=cursor` opts in to keyset pagination
+        if not hasattr(self, '_paginator'):
+            if self.request.query_params.get('pagination') == 'cursor':
+                self._paginator = TransactionCursorPaginator()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
     def get_queryset(self):
         try:
             input_data_serializer = TransactionListSerializer(
                 data=self.request.query_params)
             input_data_serializer.is_valid(raise_exception=True)
 
-            queryset = Transaction.objects.all()
+            queryset = Transaction.objects.order_by('timestamp', 'transaction_id')
 
             customer_id = input_data_serializer.validated_data.get(
                 'customer_id', None)
@@ -94,6 +136,40 @@ class TransactionListView(ListAPIView):
             raise e
 
 
+class TransactionExportView(APIView):
+    """View to stream every transaction matching the filters as a CSV or NDJSON file, optionally gzip compressed."""
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        input_data_serializer = TransactionExportSerializer(data=request.query_params)
+        input_data_serializer.is_valid(raise_exception=True)
+        data = input_data_serializer.validated_data
+
+        queryset = Transaction.objects.order_by('timestamp', 'transaction_id')
+        if data.get('customer_id'):
+            queryset = queryset.filter(customer_id=data['customer_id'])
+        if data.get('product_id'):
+            queryset = queryset.filter(product_id=data['product_id'])
+        # Both dates are included whole, in TIME_ZONE
+        if 'start_date' in data:
+            queryset = queryset.filter(timestamp__gte=timezone.make_aware(datetime.combine(data['start_date'], time.min)))
+        if 'end_date' in data:
+            queryset = queryset.filter(timestamp__lt=timezone.make_aware(
+                datetime.combine(data['end_date'] + timedelta(days=1), time.min)))
+
+        file_format = data['file_format']
+        chunks = export_chunks(queryset, file_format, settings.TRANSACTION_EXPORT_CHUNK_SIZE)
+        file_name = f"transactions{EXPORT_SUFFIXES[file_format]}"
+        if data.get('compression'):
+            response = StreamingHttpResponse(gzip_chunks(chunks), content_type='application/gzip')
+            file_name += '.gz'
+        else:
+            response = StreamingHttpResponse(chunks, content_type=f"{EXPORT_CONTENT_TYPES[file_format]}; charset=utf-8")
+        response['Content-Disposition'] = f'attachment; filename="{file_name}"'
+        return response
+
+
 class TransactionDetailView(RetrieveAPIView):
     """View to retrieve details of a specific transaction by transaction_id."""
     
@@ -109,7 +185,7 @@ class TransactionDetailView(RetrieveAPIView):
 
             transaction_id = input_data_serializer.validated_data.get(
                 'transaction_id', None)
-            return get_object_or_404(Transaction, transaction_id=transaction_id)
+            return get_object_or_404(filter_transaction_ids(Transaction.objects.all(), [transaction_id]))
         except Exception as e:
             logger.error(f"Error in TransactionDetailView: {e}")
             raise e
@@ -0,0 +1,72 @@
+"""Compare the latency and result of exact and approximate (HyperLogLog) distinct customer counts of the product
+summary, for products with many customers.
+
+Run from the backend directory:
+    python -m benchmarks.distinct --rows 1000000 --customers 500000 --products 5
+"""
+import argparse
+import statistics
+import time
+import uuid
+
+from benchmarks.utils import benchmark_database
+from benchmarks.indexes import insert_transactions
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from api.models import Transaction
+from api.lib.rollups import rebuild_rollups
+
+
+def measure(client, url, params, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.get(url, params)
+        timings.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.status_code
+    return statistics.median(timings), response.json()['total_unique_customers']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--customers', type=int, default=500_000)
+    parser.add_argument('--products', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    customers = [uuid.uuid4() for _ in range(args.customers)]
+    products = [uuid.uuid4() for _ in range(args.products)]
+    with benchmark_database():
+        insert_transactions(args.rows, customers, products)
+        # bulk_create() bypasses the rollup and sketch updates of the import
+        rebuild_rollups()
+        settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, 'testserver']
+        # Every request computes its summary
+        settings.CACHES['reports'] = {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username='benchmark'))
+
+        results = []
+        for product_id in products:
+            url = reverse('product-summary', args=[product_id])
+            exact_count = Transaction.objects.filter(product_id=product_id).values('customer_id').distinct().count()
+            exact = measure(client, url, {}, args.repeat)
+            approximate = measure(client, url, {'approx': 'true'}, args.repeat)
+            results.append((product_id, exact_count, exact, approximate))
+
+    print(f"{args.rows} rows, {args.customers} customers, {args.products} products, "
+          f"median of {args.repeat} requests\n")
+    print(f"{'customers':>10} {'exact ms':>10} {'approx ms':>10} {'estimate':>10} {'error %':>8}")
+    for product_id, exact_count, (exact_time, counted), (approx_time, estimate) in results:
+        assert counted == exact_count
+        print(f"{exact_count:>10} {exact_time * 1000:>10.1f} {approx_time * 1000:>10.1f} {estimate:>10} "
+              f"{(estimate - exact_count) / exact_count * 100:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
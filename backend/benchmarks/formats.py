@@ -0,0 +1,50 @@
+"""Compare ingestion throughput of the same transactions uploaded as CSV, NDJSON and Parquet.
+
+Parquet requires pyarrow. Run from the backend directory:
+    python -m benchmarks.formats --rows 100000 1000000
+"""
+import argparse
+from django.core.files.base import ContentFile
+
+from benchmarks.utils import benchmark_database, generate_rows, rows_to_csv, rows_to_ndjson, rows_to_parquet, timer
+
+from api.models import Transaction
+from api.tasks import process_csv_file
+from api.lib.uploads import save_upload
+
+
+FORMATS = {
+    'csv': ('file.csv', rows_to_csv),
+    'ndjson': ('file.ndjson', rows_to_ndjson),
+    'parquet': ('file.parquet', rows_to_parquet),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 1_000_000])
+    parser.add_argument('--batch-size', type=int, default=None)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'format':>10} {'MB':>8} {'seconds':>10} {'rows/s':>10}")
+    for count in args.rows:
+        rows = generate_rows(count)
+        results = {}
+        sizes = {}
+        with benchmark_database():
+            for data_format, (name, write) in FORMATS.items():
+                Transaction.objects.all().delete()
+                file_data = write(rows)
+                sizes[data_format] = len(file_data)
+                file_name = save_upload(ContentFile(file_data, name=name))
+                with timer(results, data_format):
+                    process_csv_file(file_name, batch_size=args.batch_size)
+                assert Transaction.objects.count() == count
+
+        for data_format, seconds in results.items():
+            print(f"{count:>10} {data_format:>10} {sizes[data_format] / 2 ** 20:>8.1f} "
+                  f"{seconds:>10.2f} {count / seconds:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
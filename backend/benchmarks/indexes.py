@@ -0,0 +1,121 @@
+"""Compare query plans and latency of the transaction list and summary endpoints with and without the
+Transaction indexes.
+
+Run from the backend directory:
+    python -m benchmarks.indexes --rows 1000000
+"""
+import argparse
+import random
+import statistics
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+from benchmarks.utils import benchmark_database
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from api.models import Transaction, TransactionDailyRollup
+from api.lib.rollups import rebuild_rollups
+
+
+def insert_transactions(count, customers, products, batch_size=10_000, days=365, end=None):
+    """Insert `count` random transactions spread over the given customer and product ids, over the `days` days
+    before `end`, by default the last year."""
+
+    now = end or datetime.now(timezone.utc)
+    for start in range(0, count, batch_size):
+        Transaction.objects.bulk_create([
+            Transaction(
+                transaction_id=uuid.uuid4(),
+                timestamp=now - timedelta(seconds=random.randint(0, days * 24 * 3600)),
+                amount=Decimal(random.randint(100, 10_000)) / 100,
+                currency=random.choice(["PLN", "EUR", "USD"]),
+                customer_id=random.choice(customers),
+                product_id=random.choice(products),
+                quantity=random.randint(1, 10),
+            )
+            for _ in range(min(batch_size, count - start))
+        ])
+
+
+def endpoint_requests(customer_id, product_id):
+    """The requests each endpoint is measured with, with the main queryset it runs."""
+
+    end = date.today()
+    start = end - timedelta(days=90)
+    return {
+        'list by customer': (reverse('transactions-list'), {'customer_id': customer_id},
+                             Transaction.objects.filter(customer_id=customer_id)),
+        'list by product': (reverse('transactions-list'), {'product_id': product_id},
+                            Transaction.objects.filter(product_id=product_id)),
+        'customer summary': (reverse('customer-summary', args=[customer_id]), {},
+                             Transaction.objects.filter(customer_id=customer_id).order_by('timestamp')),
+        'customer summary, 90 days': (reverse('customer-summary', args=[customer_id]),
+                                      {'start_date': start, 'end_date': end},
+                                      Transaction.objects.filter(customer_id=customer_id, timestamp__gte=start,
+                                                                 timestamp__lte=end)),
+        'product summary': (reverse('product-summary', args=[product_id]), {},
+                            Transaction.objects.filter(product_id=product_id)),
+        # Leaderboards read the daily rollups only, the transaction indexes do not change them
+        'top customers of product': (reverse('top-customers'), {'product_id': product_id},
+                                     TransactionDailyRollup.objects.filter(product_id=product_id)),
+        'top products, 30 days': (reverse('top-products'),
+                                  {'start_date': end - timedelta(days=30), 'end_date': end},
+                                  TransactionDailyRollup.objects.filter(day__gte=end - timedelta(days=30))),
+    }
+
+
+def measure(client, requests, repeat):
+    results = {}
+    for name, (url, params, queryset) in requests.items():
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            response = client.get(url, params)
+            timings.append(time.perf_counter() - start)
+            assert response.status_code == 200, (name, response.status_code)
+        results[name] = (statistics.median(timings), queryset.explain())
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--customers', type=int, default=10_000)
+    parser.add_argument('--products', type=int, default=1_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    customers = [uuid.uuid4() for _ in range(args.customers)]
+    products = [uuid.uuid4() for _ in range(args.products)]
+    with benchmark_database():
+        insert_transactions(args.rows, customers, products)
+        # bulk_create() bypasses the rollup updates of the import, the summaries read them
+        rebuild_rollups()
+        settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, 'testserver']
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username='benchmark'))
+        requests = endpoint_requests(customers[0], products[0])
+
+        indexed = measure(client, requests, args.repeat)
+        with connection.schema_editor() as schema_editor:
+            for index in Transaction._meta.indexes:
+                schema_editor.remove_index(Transaction, index)
+        unindexed = measure(client, requests, args.repeat)
+
+    print(f"{args.rows} rows, {args.customers} customers, {args.products} products, median of {args.repeat} requests\n")
+    print(f"{'endpoint':>26} {'no index ms':>12} {'indexed ms':>12}")
+    for name in requests:
+        print(f"{name:>26} {unindexed[name][0] * 1000:>12.1f} {indexed[name][0] * 1000:>12.1f}")
+    for name in requests:
+        print(f"\n{name}\n  without indexes: {unindexed[name][1]}\n  with indexes:    {indexed[name][1]}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Compare row by row and batched CSV ingestion throughput, with both row validators.
+
+Run from the backend directory:
+    python -m benchmarks.ingest --rows 100000 1000000
+"""
+import argparse
+import csv
+import io
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+from benchmarks.utils import benchmark_database, generate_rows, rows_to_csv, timer
+
+from api.models import Transaction
+from api.serializers import TransactionSerializer
+from api.tasks import process_csv_file
+from api.lib.uploads import save_upload
+
+
+VALIDATORS = {
+    'batched': 'api.lib.validators.SerializerRowValidator',
+    'batched fast': 'api.lib.validators.TransactionRowValidator',
+}
+
+
+def process_csv_file_row_by_row(file_data):
+    """The ingestion loop before batching: one serializer and one INSERT per row."""
+
+    csv_reader = csv.DictReader(io.StringIO(file_data.decode('utf-8')))
+    errors = []
+    for row in csv_reader:
+        transaction_serializer = TransactionSerializer(data=row)
+        if transaction_serializer.is_valid():
+            transaction_serializer.save()
+        else:
+            errors.append({"row": row, "errors": transaction_serializer.errors})
+    return {'errors': errors}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 1_000_000])
+    parser.add_argument('--batch-size', type=int, default=None)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'mode':>14} {'seconds':>10} {'rows/s':>10}", flush=True)
+    for count in args.rows:
+        file_data = rows_to_csv(generate_rows(count))
+        results = {}
+        # Each mode starts from an empty database, rollups and sketches included
+        with benchmark_database():
+            with timer(results, 'row by row'):
+                process_csv_file_row_by_row(file_data)
+            assert Transaction.objects.count() == count
+            print_result(count, 'row by row', results)
+        for mode, validator in VALIDATORS.items():
+            with benchmark_database():
+                settings.TRANSACTION_IMPORT_VALIDATOR = validator
+                file_name = save_upload(ContentFile(file_data))
+                # Called directly, files over TRANSACTION_IMPORT_CHUNK_SIZE rows are imported chunk after chunk
+                with timer(results, mode):
+                    process_csv_file(file_name, batch_size=args.batch_size)
+                assert Transaction.objects.count() == count
+                print_result(count, mode, results)
+
+
+def print_result(count, mode, results):
+    # Printed as soon as measured, runs of a million rows take hours row by row
+    seconds = results[mode]
+    print(f"{count:>10} {mode:>14} {seconds:>10.2f} {count / seconds:>10.0f}", flush=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Measure a one-month customer summary over years of history in the transaction table partitioned by month, with
+and without partition pruning. Requires PostgreSQL, the only database the table is partitioned on.
+
+Range summaries read the daily rollups of the whole days and the transactions of the partial days at the edges,
+bounded on timestamp: with pruning those edge queries read the partitions of their month only, whatever the
+length of the stored history.
+
+Run from the backend directory, with DATABASE_URL pointing to PostgreSQL:
+    python -m benchmarks.partitions --rows-per-year 200000 --years 5
+"""
+import argparse
+import re
+import statistics
+import sys
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone
+
+from benchmarks.utils import benchmark_database
+from benchmarks.indexes import insert_transactions
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from api.models import Transaction
+from api.lib.partitions import transactions_partitioned, create_partitions, months_between, partition_months
+from api.lib.rollups import rebuild_rollups
+
+PARTITION_PATTERN = re.compile(r'\bapi_transaction_(?:p\d{4}_\d{2}|default)\b')
+
+
+def measure(client, customers, params, repeat):
+    timings = []
+    for _ in range(repeat):
+        for customer_id in customers:
+            start = time.perf_counter()
+            response = client.get(reverse('customer-summary', args=[customer_id]), params)
+            timings.append(time.perf_counter() - start)
+            assert response.status_code == 200, response.status_code
+    return statistics.median(timings)
+
+
+def scanned_partitions(customer_id, start, end):
+    """Partitions in the plan of the transactions of a partial edge day of the range."""
+
+    plan = Transaction.objects.filter(customer_id=customer_id, timestamp__gte=start, timestamp__lt=end).explain()
+    return len(set(PARTITION_PATTERN.findall(plan)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows-per-year', type=int, default=200_000)
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--customers', type=int, default=1_000)
+    parser.add_argument('--products', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    if not transactions_partitioned():
+        sys.exit("The transaction table is only partitioned on PostgreSQL, set DATABASE_URL to a PostgreSQL database.")
+
+    customers = [uuid.uuid4() for _ in range(args.customers)]
+    products = [uuid.uuid4() for _ in range(args.products)]
+    today = date.today()
+    one_month = {'start_date': today - timedelta(days=30), 'end_date': today}
+    # The hours of the first day of the range, read from the transactions
+    edge = datetime.combine(one_month['start_date'], datetime.min.time(), timezone.utc) + timedelta(hours=12)
+    measured = customers[:10]
+
+    results = []
+    with benchmark_database():
+        settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, 'testserver']
+        # Every request computes its summary
+        settings.CACHES['reports'] = {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username='benchmark'))
+
+        end = datetime.now(timezone.utc)
+        create_partitions(months_between(end - timedelta(days=365 * args.years), end))
+        insert_transactions(args.rows_per_year * args.years, customers, products, days=365 * args.years, end=end)
+        # bulk_create() bypasses the rollup updates of the import, the summaries read them
+        rebuild_rollups()
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        rows, partitions = Transaction.objects.count(), len(partition_months())
+
+        for pruning in ('on', 'off'):
+            with connection.cursor() as cursor:
+                cursor.execute(f"SET enable_partition_pruning = {pruning}")
+            results.append((pruning, scanned_partitions(measured[0], edge, edge + timedelta(hours=12)),
+                            measure(client, measured, one_month, args.repeat),
+                            measure(client, measured, {}, args.repeat)))
+
+    print(f"{rows} rows over {args.years} years in {partitions} monthly partitions, {args.customers} customers, "
+          f"median of {args.repeat * len(measured)} requests\n")
+    print(f"{'pruning':>8} {'partitions read':>16} {'one month ms':>13} {'all time ms':>12}")
+    for pruning, scanned, month_time, all_time in results:
+        print(f"{pruning:>8} {scanned:>16} {month_time * 1000:>13.1f} {all_time * 1000:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+import os
+import csv
+import json
+import logging
+import io
+import tempfile
+import time
+from contextlib import contextmanager
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+django.setup()
+
+from django.conf import settings
+from django.db import connection
+
+from lib.TransactionFactory import TransactionFactory
+
+# Neither per-query debug logging nor the SQL log kept by DEBUG should be part of the measurement
+logging.disable(logging.WARNING)
+settings.DEBUG = False
+
+
+@contextmanager
+def benchmark_database():
+    """Create a throwaway, file backed copy of the database and upload storage, so benchmarks never touch real data."""
+
+    with tempfile.TemporaryDirectory() as directory:
+        if connection.vendor == 'sqlite':
+            settings.DATABASES['default'].setdefault('TEST', {})['NAME'] = os.path.join(directory, 'benchmark.sqlite3')
+        settings.STORAGES['transaction_uploads']['OPTIONS']['location'] = os.path.join(directory, 'uploads')
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            yield
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def generate_rows(count):
+    """Generate `count` random transaction rows, as they would be read from a CSV file."""
+
+    factory = TransactionFactory()
+    return [factory.generate_transaction_data(allow_duplicates=True) for _ in range(count)]
+
+
+def rows_to_csv(rows):
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=rows[0].keys())
+    writer.writeheader()
+    writer.writerows(rows)
+    return output.getvalue().encode('utf-8')
+
+
+def rows_to_ndjson(rows):
+    return "\n".join(json.dumps(row) for row in rows).encode('utf-8')
+
+
+def rows_to_parquet(rows):
+    """Write rows to Parquet with the column types an export would use, requires pyarrow."""
+
+    from datetime import datetime
+    from decimal import Decimal
+    import pyarrow
+    import pyarrow.parquet
+
+    table = pyarrow.table({
+        'transaction_id': [row['transaction_id'] for row in rows],
+        'timestamp': pyarrow.array([datetime.fromisoformat(row['timestamp']) for row in rows],
+                                   pyarrow.timestamp('us', tz='UTC')),
+        'amount': pyarrow.array([Decimal(row['amount']) for row in rows], pyarrow.decimal128(10, 2)),
+        'currency': [row['currency'] for row in rows],
+        'customer_id': [row['customer_id'] for row in rows],
+        'product_id': [row['product_id'] for row in rows],
+        'quantity': pyarrow.array([int(row['quantity']) for row in rows], pyarrow.int64()),
+    })
+    output = io.BytesIO()
+    pyarrow.parquet.write_table(table, output)
+    return output.getvalue()
+
+
+@contextmanager
+def timer(results, key):
+    start = time.perf_counter()
+    yield
+    results[key] = time.perf_counter() - start
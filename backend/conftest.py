@@ -0,0 +1,50 @@
+import pytest
+from django.core.cache import caches
+
+from core.celery import app as celery_app
+
+
+@pytest.fixture(autouse=True)
+def celery_eager():
+    """Run Celery tasks in-process, so that upload tests do not need a running broker."""
+
+    celery_app.conf.task_always_eager = True
+    celery_app.conf.task_eager_propagates = True
+    yield
+
+
+@pytest.fixture(autouse=True)
+def upload_storage(settings, tmp_path):
+    """Spool uploaded files to a per-test directory."""
+
+    settings.STORAGES = {
+        **settings.STORAGES,
+        "transaction_uploads": {
+            "BACKEND": "django.core.files.storage.FileSystemStorage",
+            "OPTIONS": {"location": tmp_path / "uploads"},
+        },
+    }
+    return tmp_path / "uploads"
+
+
+@pytest.fixture(autouse=True)
+def reports_cache(settings):
+    """Cache reports in memory, emptied for each test."""
+
+    settings.CACHES = {
+        **settings.CACHES,
+        "reports": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "reports"},
+    }
+    caches["reports"].clear()
+    return caches["reports"]
+
+
+
+@pytest.fixture
+def exchange_rates(db):
+    """The rates of the ExchangeRate table by currency, as seeded by its migration, for expected totals in PLN."""
+
+    from reports.models import ExchangeRate
+
+    # The earliest rate of each currency, the seeded one, is kept last
+    return {rate.currency: rate.rate for rate in ExchangeRate.objects.order_by('-valid_from')}
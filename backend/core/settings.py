@@ -14,6 +14,8 @@ from pathlib import Path
 from datetime import timedelta
 import os
 
+from core.database import database_from_url, SQLITE_OPTIONS
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -93,12 +95,32 @@ WSGI_APPLICATION = 'core.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# PostgreSQL or SQLite from DATABASE_URL, see core.database. Without it, the SQLite file backend/db.sqlite3, which
+# lets one process write at a time: imports and reports served concurrently need PostgreSQL.
+DATABASE_URL = os.getenv('DATABASE_URL')
+if DATABASE_URL:
+    DATABASES = {
+        'default': database_from_url(
+            DATABASE_URL,
+            # Seconds a connection is kept open for the next requests or tasks of its thread
+            conn_max_age=int(os.getenv('DATABASE_CONN_MAX_AGE', 60)),
+            # A psycopg connection pool per process in place of persistent connections, PostgreSQL only
+            pool=os.getenv('DATABASE_POOL', 'False').lower() in ('1', 'true', 'yes'),
+            pool_min_size=int(os.getenv('DATABASE_POOL_MIN_SIZE', 2)),
+            pool_max_size=int(os.getenv('DATABASE_POOL_MAX_SIZE', 10)),
+        ),
     }
-}
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'OPTIONS': SQLITE_OPTIONS,
+        }
+    }
+
+# SQLite builds the Transaction indexes without their covering columns, which only PostgreSQL supports
+SILENCED_SYSTEM_CHECKS = ['models.W040']
 
 
 # Password validation
@@ -138,6 +160,23 @@ USE_TZ = True
 STATIC_URL = "/static/"
 STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
 
+# Uploaded transaction files are spooled here until the import task has processed them.
+# The directory must be shared by the web and Celery containers, or replaced by a shared storage backend.
+TRANSACTION_UPLOAD_ROOT = os.getenv('TRANSACTION_UPLOAD_ROOT', os.path.join(BASE_DIR, "uploads"))
+
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+    },
+    "transaction_uploads": {
+        "BACKEND": os.getenv('TRANSACTION_UPLOAD_STORAGE', "django.core.files.storage.FileSystemStorage"),
+        "OPTIONS": {"location": TRANSACTION_UPLOAD_ROOT},
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -146,4 +185,63 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL')
 CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND')
 CELERY_ACCEPT_CONTENT = ['json']
-CELERY_TASK_SERIALIZER = 'json'
\ No newline at end of file
+CELERY_TASK_SERIALIZER = 'json'
+# Seconds task results are kept, the error reports of import tasks are deleted after as long
+CELERY_RESULT_EXPIRES = int(os.getenv('CELERY_RESULT_EXPIRES', 24 * 3600))
+# Periodic tasks run by celery beat
+CELERY_BEAT_SCHEDULE = {
+    'delete-expired-error-reports': {
+        'task': 'api.tasks.delete_expired_error_reports_task',
+        'schedule': 3600,
+    },
+    'create-transaction-partitions': {
+        'task': 'api.tasks.create_transaction_partitions_task',
+        'schedule': 24 * 3600,
+    },
+}
+
+# Number of validated CSV rows written to the database with a single bulk insert
+TRANSACTION_IMPORT_BATCH_SIZE = int(os.getenv('TRANSACTION_IMPORT_BATCH_SIZE', 1000))
+# Validates imported rows batch by batch, api.lib.validators.SerializerRowValidator runs the full TransactionSerializer per row
+TRANSACTION_IMPORT_VALIDATOR = os.getenv('TRANSACTION_IMPORT_VALIDATOR', 'api.lib.validators.TransactionRowValidator')
+
+# Minimum number of seconds between two progress updates published by an import task
+TRANSACTION_IMPORT_PROGRESS_INTERVAL = float(os.getenv('TRANSACTION_IMPORT_PROGRESS_INTERVAL', 2))
+# Files with more rows are split into chunks of this many rows, imported in parallel by Celery workers
+TRANSACTION_IMPORT_CHUNK_SIZE = int(os.getenv('TRANSACTION_IMPORT_CHUNK_SIZE', 100000))
+# Upper bound of chunk tasks per file, chunks grow beyond TRANSACTION_IMPORT_CHUNK_SIZE rows to respect it
+TRANSACTION_IMPORT_MAX_PARALLEL_CHUNKS = int(os.getenv('TRANSACTION_IMPORT_MAX_PARALLEL_CHUNKS', 8))
+# Number of rejected rows returned whole in the task result, the full list is paged through tasks/<task_id>/errors/
+TRANSACTION_IMPORT_ERROR_SAMPLE_SIZE = int(os.getenv('TRANSACTION_IMPORT_ERROR_SAMPLE_SIZE', 100))
+# On PostgreSQL, import batches are loaded with COPY into a staging table and merged in one statement. Set to False
+# to insert them with the ORM as on other databases, in insert mode only: skip_existing and upsert batches are always
+# merged on PostgreSQL, the partitioned transaction table has no unique index for the ORM's ON CONFLICT
+TRANSACTION_IMPORT_COPY = os.getenv('TRANSACTION_IMPORT_COPY', 'True').lower() in ('1', 'true', 'yes')
+# On PostgreSQL, months ahead of the current one the periodic task keeps a partition of the transaction table for
+TRANSACTION_PARTITIONS_AHEAD = int(os.getenv('TRANSACTION_PARTITIONS_AHEAD', 3))
+# Compressed uploads (.csv.gz, .csv.zst) may not decompress to more bytes than this
+TRANSACTION_UPLOAD_MAX_DECOMPRESSED_SIZE = int(os.getenv('TRANSACTION_UPLOAD_MAX_DECOMPRESSED_SIZE', 500 * 1024 * 1024))
+
+# What reports do with transactions in a currency without an exchange rate, 'error' or 'skip' (see reports.lib.constants)
+REPORTS_UNKNOWN_CURRENCY_POLICY = os.getenv('REPORTS_UNKNOWN_CURRENCY_POLICY', 'error')
+
+# Cache of report responses, shared by the web and Celery processes through Redis (redis://redis:6379/1 in .env).
+# Without REPORTS_CACHE_URL nothing is cached: a per-process cache would miss the invalidations sent by imports.
+REPORTS_CACHE_URL = os.getenv('REPORTS_CACHE_URL')
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'reports': ({'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': REPORTS_CACHE_URL}
+                if REPORTS_CACHE_URL else {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}),
+}
+# Seconds a report response stays cached, imports touching its customer or product invalidate it earlier
+REPORTS_CACHE_TIMEOUT = int(os.getenv('REPORTS_CACHE_TIMEOUT', 3600))
+# Most ids a batch summary request may ask for
+REPORTS_BATCH_MAX_IDS = int(os.getenv('REPORTS_BATCH_MAX_IDS', 1000))
+# Rows fetched from the database cursor, and written to the response, at a time by transactions/export/
+TRANSACTION_EXPORT_CHUNK_SIZE = int(os.getenv('TRANSACTION_EXPORT_CHUNK_SIZE', 2000))
+
+# Most buckets a time series report may hold, ranges holding more are rejected
+REPORTS_TIMESERIES_MAX_BUCKETS = int(os.getenv('REPORTS_TIMESERIES_MAX_BUCKETS', 1000))
+
+# Most entries a leaderboard report may return
+REPORTS_TOP_MAX_LIMIT = int(os.getenv('REPORTS_TOP_MAX_LIMIT', 100))
@@ -0,0 +1,85 @@
+import uuid
+from django.conf import settings
+from django.core.cache import caches
+
+
+REPORTS_CACHE_ALIAS = 'reports'
+# Version of every report, changed when all of them may be stale, as after rebuilding the rollups
+GLOBAL_VERSION_KEY = 'reports:version'
+
+
+def get_reports_cache():
+    return caches[REPORTS_CACHE_ALIAS]
+
+
+def version_key(kind: str, entity_id) -> str:
+    return f"reports:version:{kind}:{entity_id}"
+
+
+def bump_versions(customer_ids=(), product_ids=(), everything=False):
+    """Invalidate the cached reports of the given customers and products, or of all of them, in one cache call.
+
+    Versions are random tokens rather than counters, so they are replaced with a single set_many() however many
+    ids a batch touched, and a version evicted from the cache never comes back with a value already used.
+    """
+
+    keys = ([version_key('customer', customer_id) for customer_id in customer_ids]
+            + [version_key('product', product_id) for product_id in product_ids])
+    if everything:
+        keys.append(GLOBAL_VERSION_KEY)
+    if keys:
+        get_reports_cache().set_many({key: uuid.uuid4().hex for key in keys}, timeout=None)
+
+
+def cached_reports(kind: str, entity_ids, params, compute_many, report: str = 'summary') -> dict:
+    """Return the reports of several customers or products, the cached ones whose versions hold and the others
+    built with a single `compute_many(missed_ids)` call, which maps ids to their report.
+
+    The versions and the cached reports are read with one get_many(), so a hit never reaches the database. A report
+    is cached with the versions read before computing it: an import committed meanwhile changes them, and the next
+    request computes the report again. Reports that are exceptions are returned but not cached. `report` names
+    the kind of report, which with `params` tells apart the reports of an id.
+    """
+
+    cache = get_reports_cache()
+    version_keys = {entity_id: version_key(kind, entity_id) for entity_id in entity_ids}
+    report_keys = {entity_id: f"reports:{kind}-{report}:{entity_id}:{':'.join(str(param) for param in params)}"
+                   for entity_id in entity_ids}
+    values = cache.get_many([GLOBAL_VERSION_KEY, *version_keys.values(), *report_keys.values()])
+
+    global_version = _version(cache, values, GLOBAL_VERSION_KEY)
+    reports = {}
+    missed = {}
+    for entity_id in entity_ids:
+        versions = [global_version, _version(cache, values, version_keys[entity_id])]
+        cached = values.get(report_keys[entity_id])
+        if cached is not None and cached[0] == versions:
+            reports[entity_id] = cached[1]
+        else:
+            missed[entity_id] = versions
+
+    if missed:
+        computed = compute_many(list(missed))
+        cacheable = {}
+        for entity_id, versions in missed.items():
+            reports[entity_id] = computed.get(entity_id)
+            if None not in versions and not isinstance(reports[entity_id], Exception):
+                cacheable[report_keys[entity_id]] = (versions, reports[entity_id])
+        cache.set_many(cacheable, settings.REPORTS_CACHE_TIMEOUT)
+    return reports
+
+
+def cached_report(kind: str, entity_id, params, compute, report: str = 'summary'):
+    """Return the report `compute()` builds for a customer or product, from the cache while its versions hold."""
+
+    return cached_reports(kind, [entity_id], params, lambda entity_ids: {entity_id: compute()}, report)[entity_id]
+
+
+def _version(cache, values, key):
+    version = values.get(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        # Another request or an import may have set it first, theirs wins
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key)
+    return version
@@ -1,5 +1,17 @@
-EXCHANGE_RATES = {
-    "PLN": 1.0,
-    "EUR": 4.3,
-    "USD": 4.0,
-}
\ No newline at end of file
+# What calculate_total_amount_PLN() does with transactions in a currency without an exchange rate at their time:
+# raise UnknownCurrencyError, or leave them out of the total and log a warning
+UNKNOWN_CURRENCY_ERROR = 'error'
+UNKNOWN_CURRENCY_SKIP = 'skip'
+UNKNOWN_CURRENCY_POLICIES = (UNKNOWN_CURRENCY_ERROR, UNKNOWN_CURRENCY_SKIP)
+
+# Bucket sizes of the time series reports
+INTERVAL_DAY = 'day'
+INTERVAL_WEEK = 'week'
+INTERVAL_MONTH = 'month'
+INTERVALS = (INTERVAL_DAY, INTERVAL_WEEK, INTERVAL_MONTH)
+
+# Totals the leaderboard reports rank by
+TOP_BY_AMOUNT = 'amount'
+TOP_BY_QUANTITY = 'quantity'
+TOP_BY_COUNT = 'count'
+TOP_ORDERS = (TOP_BY_AMOUNT, TOP_BY_QUANTITY, TOP_BY_COUNT)
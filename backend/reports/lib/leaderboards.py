@@ -0,0 +1,52 @@
+from datetime import date
+from decimal import Decimal
+from django.db.models import F, Sum
+
+from api.models import TransactionDailyRollup
+from reports.lib.constants import TOP_BY_AMOUNT, TOP_BY_QUANTITY, TOP_BY_COUNT
+from reports.lib.utils import amount_PLN_aggregates, total_amount_PLN
+
+
+# Ordering of each ranking, ties broken by id so that pages of equal totals are stable
+TOP_ORDERING = {
+    TOP_BY_AMOUNT: F('total_amount_PLN').desc(nulls_last=True),
+    TOP_BY_QUANTITY: F('total_quantity').desc(),
+    TOP_BY_COUNT: F('count').desc(),
+}
+
+
+def top(field: str, order_by: str, limit: int, filters: dict = None, start_date: date = None,
+        end_date: date = None) -> list:
+    """Rank the values of `field` by their total amount in PLN, quantity or number of transactions, and return
+    the first `limit` of them.
+
+    `filters` restricts the transactions counted, by customer or product id, to the days from `start_date` to
+    `end_date`, both included. The daily rollups are grouped, ordered and cut by the database, in a single query.
+    Returns a list of dicts of the value, the total amount in PLN, the total quantity and the number of
+    transactions. Transactions in a currency without an exchange rate are handled with the unknown currency policy,
+    for the values returned.
+    """
+
+    rollups = TransactionDailyRollup.objects.filter(**(filters or {}))
+    if start_date is not None:
+        rollups = rollups.filter(day__gte=start_date)
+    if end_date is not None:
+        rollups = rollups.filter(day__lte=end_date)
+    ranked = list(rollups.values(field).annotate(
+        **amount_PLN_aggregates('amount_total', count='transaction_count', day='day'),
+        count=Sum('transaction_count'),
+        total_quantity=Sum('quantity_total'),
+    ).order_by(TOP_ORDERING[order_by], field)[:limit])
+
+    # A value with transactions in an unknown currency would be ranked on part of its amount
+    total_amount_PLN({
+        'total_amount_PLN': None,
+        'unknown_currency_count': sum(values['unknown_currency_count'] or 0 for values in ranked),
+    }, rollups.filter(**{f'{field}__in': [values[field] for values in ranked]}))
+
+    return [{
+        field: values[field],
+        'total_amount_PLN': values['total_amount_PLN'] or Decimal(0),
+        'total_quantity': values['total_quantity'],
+        'transaction_count': values['count'],
+    } for values in ranked]
@@ -0,0 +1,10 @@
+from reports.lib.cache import bump_versions
+
+
+def exchange_rates_changed():
+    """Drop every cached report once stored exchange rates changed.
+
+    Report queries look rates up in the ExchangeRate table themselves, so only cached reports can be stale.
+    """
+
+    bump_versions(everything=True)
@@ -0,0 +1,177 @@
+import operator
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from functools import reduce
+from django.db.models import Q, Sum, Count, Min
+from django.utils import timezone
+
+from api.models import Transaction, TransactionDailyRollup, DistinctDailySketch
+from api.lib.hll import Sketch
+from reports.lib.utils import amount_PLN_aggregates, total_amount_PLN, UnknownCurrencyError, day_start
+
+
+def split_range(start: datetime = None, end: datetime = None):
+    """Split the timestamp range [start, end] into the days rollups hold whole and the partial days at its edges.
+
+    Returns a filter on rollup days, None when the range holds no whole day, and a filter on transaction timestamps
+    for the partial days, None when there are none. Open bounds are passed as None.
+    """
+
+    first_day = None
+    if start is not None:
+        first_day = timezone.localdate(start)
+        if start > day_start(first_day):
+            first_day += timedelta(days=1)
+    # Days ending at or before `end`, the day of `end` is always an edge: it holds the transactions at `end` itself
+    end_day = timezone.localdate(end) if end is not None else None
+
+    if first_day is not None and end_day is not None and first_day >= end_day:
+        return None, Q(timestamp__gte=start, timestamp__lte=end)
+
+    days = Q()
+    edges = []
+    if first_day is not None:
+        days &= Q(day__gte=first_day)
+        if start < day_start(first_day):
+            edges.append(Q(timestamp__gte=start, timestamp__lt=day_start(first_day)))
+    if end_day is not None:
+        days &= Q(day__lt=end_day)
+        edges.append(Q(timestamp__gte=day_start(end_day), timestamp__lte=end))
+    return days, reduce(operator.or_, edges) if edges else None
+
+
+def summarize_many(field: str, entity_ids, distinct_field: str, start: datetime = None, end: datetime = None,
+                   earliest=False, approx=False) -> dict:
+    """Summarize the transactions of each of `entity_ids`, the values of `field`, between the `start` and `end`
+    timestamps (both included), with grouped queries whose number does not depend on the number of ids.
+
+    Whole days are read from the daily rollups and only the partial days at the edges of the range from the
+    transactions, so the cost grows with the number of days rather than of transactions. Returns a dict mapping
+    the ids with transactions to a dict of the total amount in PLN, the total quantity, the exact number of
+    distinct `distinct_field` values and, with `earliest`, the timestamp of the first transaction. Ids whose
+    transactions are in a currency without an exchange rate map to the UnknownCurrencyError raised for them
+    under the error policy.
+
+    With `approx`, distinct counts are estimated by merging the daily HyperLogLog sketches of the range, which
+    reads one row per day however many distinct values there are, within about 1.6% (standard error) of the
+    exact count.
+    """
+
+    days, edges = split_range(start, end)
+    in_ids = {f'{field}__in': list(entity_ids)}
+    distinct = {} if approx else {'distinct_count': Count(distinct_field, distinct=True)}
+    parts = defaultdict(dict)
+    if days is not None:
+        rollups = TransactionDailyRollup.objects.filter(days, **in_ids)
+        for values in rollups.values(field).annotate(
+                **amount_PLN_aggregates('amount_total', count='transaction_count', day='day'),
+                count=Sum('transaction_count'),
+                total_quantity=Sum('quantity_total'),
+                **distinct,
+                first_day=Min('day'),
+        ).order_by():
+            parts[values[field]][rollups] = values
+    if edges is not None:
+        transactions = Transaction.objects.filter(edges, **in_ids)
+        for values in transactions.values(field).annotate(
+                **amount_PLN_aggregates(),
+                count=Count('pk'),
+                total_quantity=Sum('quantity'),
+                **distinct,
+                earliest=Min('timestamp'),
+        ).order_by():
+            parts[values[field]][transactions] = values
+
+    summaries = {}
+    for entity_id, aggregated in parts.items():
+        try:
+            total = total_amount_PLN({
+                'total_amount_PLN': _add(aggregated.values(), 'total_amount_PLN'),
+                'unknown_currency_count': _add(aggregated.values(), 'unknown_currency_count'),
+            }, *[source.filter(**{field: entity_id}) for source in aggregated])
+        except UnknownCurrencyError as e:
+            summaries[entity_id] = e
+            continue
+        summaries[entity_id] = {
+            'total_amount_PLN': total,
+            'total_quantity': _add(aggregated.values(), 'total_quantity'),
+            'distinct_count': next(iter(aggregated.values())).get('distinct_count'),
+        }
+
+    # A value may be found in both the rollups and the edges, counting the UNION of both keeps it once
+    in_both = [entity_id for entity_id, aggregated in parts.items()
+               if len(aggregated) > 1 and entity_id in summaries and not isinstance(summaries[entity_id], Exception)]
+    if approx:
+        _add_approximate_distinct(field, distinct_field, days, edges, summaries)
+    elif in_both:
+        in_both_ids = {f'{field}__in': in_both}
+        pairs = (rollups.filter(**in_both_ids).values_list(field, distinct_field)
+                 .union(transactions.filter(**in_both_ids).values_list(field, distinct_field)))
+        for entity_id, count in Counter(entity_id for entity_id, _ in pairs).items():
+            summaries[entity_id]['distinct_count'] = count
+
+    if earliest:
+        _add_earliest(field, parts, summaries)
+    return summaries
+
+
+def _add_approximate_distinct(field, distinct_field, days, edges, summaries):
+    # Whole days are counted from their sketches, the partial days at the edges from their distinct values
+    ids = [entity_id for entity_id, summary in summaries.items() if not isinstance(summary, Exception)]
+    if not ids:
+        return
+    sketches = {entity_id: Sketch() for entity_id in ids}
+    if days is not None:
+        stored = defaultdict(list)
+        for entity_id, registers in (DistinctDailySketch.objects.filter(days, field=field, entity_id__in=ids)
+                                     .values_list('entity_id', 'registers')):
+            stored[entity_id].append(registers)
+        for entity_id, registers in stored.items():
+            sketches[entity_id].merge(*registers)
+    if edges is not None:
+        for entity_id, value in (Transaction.objects.filter(edges, **{f'{field}__in': ids})
+                                 .values_list(field, distinct_field).distinct()):
+            sketches[entity_id].add(value)
+    for entity_id, sketch in sketches.items():
+        summaries[entity_id]['distinct_count'] = sketch.estimate()
+
+
+def _add_earliest(field, parts, summaries):
+    # The earliest transaction is the first one of the edges when it comes before the rollup days, otherwise the
+    # first one of the first rollup day, which a single query finds for every id reading only that day
+    first_days = {}
+    for entity_id, aggregated in parts.items():
+        if isinstance(summaries[entity_id], Exception):
+            continue
+        first_day = edge_earliest = None
+        for values in aggregated.values():
+            first_day = values.get('first_day', first_day)
+            edge_earliest = values.get('earliest', edge_earliest)
+        if first_day is not None and (edge_earliest is None or edge_earliest >= day_start(first_day)):
+            first_days[entity_id] = first_day
+        else:
+            summaries[entity_id]['earliest_transaction_date'] = edge_earliest
+
+    if first_days:
+        first_day_filter = reduce(operator.or_, [
+            Q(**{field: entity_id}, timestamp__gte=day_start(day), timestamp__lt=day_start(day + timedelta(days=1)))
+            for entity_id, day in first_days.items()])
+        for values in (Transaction.objects.filter(first_day_filter)
+                       .values(field).annotate(earliest=Min('timestamp')).order_by()):
+            summaries[values[field]]['earliest_transaction_date'] = values['earliest']
+
+
+def summarize(field: str, entity_id, distinct_field: str, start: datetime = None, end: datetime = None,
+              earliest=False, approx=False):
+    """Summarize the transactions of one id like summarize_many(), returning None when it has none."""
+
+    summary = summarize_many(field, [entity_id], distinct_field, start, end, earliest, approx).get(entity_id)
+    if isinstance(summary, UnknownCurrencyError):
+        raise summary
+    return summary
+
+
+def _add(aggregated, name):
+    # Sum of the aggregates `name` of several queries, None like SQL when all of them are NULL
+    values = [values[name] for values in aggregated if values[name] is not None]
+    return sum(values[1:], values[0]) if values else None
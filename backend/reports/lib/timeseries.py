@@ -0,0 +1,120 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.db.models import Sum
+from django.db.models.functions import TruncDay, TruncWeek, TruncMonth
+
+from api.models import TransactionDailyRollup
+from reports.lib.constants import INTERVAL_DAY, INTERVAL_WEEK, INTERVAL_MONTH
+from reports.lib.utils import amount_PLN_aggregates, total_amount_PLN
+
+
+TRUNCATE = {INTERVAL_DAY: TruncDay, INTERVAL_WEEK: TruncWeek, INTERVAL_MONTH: TruncMonth}
+
+
+class TooManyBucketsError(ValueError):
+    """Raised when a time series would hold more than REPORTS_TIMESERIES_MAX_BUCKETS buckets."""
+
+    def __init__(self, count):
+        self.count = count
+        super().__init__(
+            f"The range holds {count} buckets, at most {settings.REPORTS_TIMESERIES_MAX_BUCKETS} are allowed.")
+
+
+def bucket_start(day: date, interval: str) -> date:
+    """Return the first day of the bucket holding `day`, weeks starting on Monday like TruncWeek."""
+
+    if interval == INTERVAL_WEEK:
+        return day - timedelta(days=day.weekday())
+    if interval == INTERVAL_MONTH:
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(start: date, interval: str) -> date:
+    """Return the first day of the bucket following the one starting on `start`."""
+
+    if interval == INTERVAL_WEEK:
+        return start + timedelta(weeks=1)
+    if interval == INTERVAL_MONTH:
+        return (start + timedelta(days=31)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def buckets(first: date, last: date, interval: str):
+    """Yield the first day of every bucket from the one holding `first` to the one holding `last`."""
+
+    start = bucket_start(first, interval)
+    while start <= last:
+        yield start
+        start = next_bucket(start, interval)
+
+
+def bucket_count(first: date, last: date, interval: str) -> int:
+    """Return the number of buckets `buckets()` yields from `first` to `last`, without going through them."""
+
+    if interval == INTERVAL_WEEK:
+        count = (last - bucket_start(first, interval)).days // 7 + 1
+    elif interval == INTERVAL_MONTH:
+        count = (last.year - first.year) * 12 + last.month - first.month + 1
+    else:
+        count = (last - first).days + 1
+    return max(count, 0)
+
+
+def check_bucket_count(first: date, last: date, interval: str):
+    """Raise TooManyBucketsError if the range from `first` to `last` holds too many buckets."""
+
+    count = bucket_count(first, last, interval)
+    if count > settings.REPORTS_TIMESERIES_MAX_BUCKETS:
+        raise TooManyBucketsError(count)
+
+
+def timeseries(field: str, entity_id, interval: str, start_date: date = None, end_date: date = None):
+    """Total the transactions of one id, the value of `field`, per day, week or month, between `start_date` and
+    `end_date` (both included, in TIME_ZONE like rollup days).
+
+    Buckets are grouped and totalled by the database over the daily rollups, in a single query. Returns the list of
+    buckets, in order and with the empty ones filled with zeros, as dicts of their first day, the total amount in
+    PLN, the total quantity and the number of transactions. Returns None when the id has no transactions at all
+    in the range. Transactions in a currency without an exchange rate are handled with the unknown currency policy.
+    Without dates the series spans the transactions of the id, TooManyBucketsError is raised if that holds too many
+    buckets to fill in.
+    """
+
+    rollups = TransactionDailyRollup.objects.filter(**{field: entity_id})
+    if start_date is not None:
+        rollups = rollups.filter(day__gte=start_date)
+    if end_date is not None:
+        rollups = rollups.filter(day__lte=end_date)
+    grouped = rollups.annotate(period=TRUNCATE[interval]('day')).values('period').annotate(
+        **amount_PLN_aggregates('amount_total', count='transaction_count', day='day'),
+        count=Sum('transaction_count'),
+        total_quantity=Sum('quantity_total'),
+    ).order_by('period')
+    totals = {values['period']: values for values in grouped}
+    if not totals:
+        return None
+
+    # The policy applies to the range as a whole: it raises for any unknown currency, or leaves them all out
+    total_amount_PLN({
+        'total_amount_PLN': None,
+        'unknown_currency_count': sum(values['unknown_currency_count'] or 0 for values in totals.values()),
+    }, rollups)
+
+    first, last = start_date or min(totals), end_date or max(totals)
+    check_bucket_count(first, last, interval)
+    series = []
+    for period in buckets(first, last, interval):
+        values = totals.get(period, _EMPTY)
+        series.append({
+            'period': period,
+            'total_amount_PLN': values['total_amount_PLN'] or Decimal(0),
+            'total_quantity': values['total_quantity'] or 0,
+            'transaction_count': values['count'],
+        })
+    return series
+
+
+# Totals of a bucket without transactions
+_EMPTY = {'total_amount_PLN': None, 'total_quantity': None, 'count': 0}
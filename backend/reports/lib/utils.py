@@ -1,29 +1,134 @@
+from datetime import datetime, time
 from decimal import Decimal
-from django.db.models import QuerySet
-from api.models import Transaction
-from reports.lib.constants import EXCHANGE_RATES
+from django.conf import settings
+from django.db.models import (QuerySet, F, Sum, Count, Q, DecimalField, Exists, OuterRef, Subquery,
+                              ExpressionWrapper)
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from api.models import Transaction, TransactionDailyRollup
+from reports.models import ExchangeRate
+from reports.lib.constants import UNKNOWN_CURRENCY_SKIP, UNKNOWN_CURRENCY_POLICIES
 from lib.logging_config import logger
 
 
-def calculate_total_amount_PLN(transactions: QuerySet[Transaction] ) -> Decimal:
-    """Calculate the total amount of transactions in PLN."""
+class UnknownCurrencyError(ValueError):
+    """Raised when transactions to total in PLN are in a currency without an exchange rate at their time."""
 
-    total_amount = 0
-    for transaction in transactions:
-        try:
-            rate = EXCHANGE_RATES.get(transaction.currency)
-        except KeyError:
-            rate = 1
-            logger.error(f"Currency {transaction.currency} not found, using default rate of 1.")
+    def __init__(self, currencies):
+        self.currencies = currencies
+        super().__init__(f"No exchange rate for currencies: {', '.join(currencies)}.")
 
-        total_amount += transaction.amount* Decimal(rate)
-    return total_amount
 
-def calculate_total_unique_field(transactions: QuerySet[Transaction], field: str) -> int:
-    """Calculate the total number of unique values for a given field in transactions."""
-    
-    unique_fields = set(transactions.values_list(field, flat=True))
+def day_start(day) -> datetime:
+    """Return the first instant of `day` in the TIME_ZONE setting, where rollup days and exchange rates begin."""
+
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _amount_PLN_field() -> DecimalField:
+    """Decimal field holding exact products of an amount and a rate, and sums of them."""
+
+    amount = Transaction._meta.get_field('amount')
+    rate = ExchangeRate._meta.get_field('rate')
+    # Room for summing up to 10^10 amounts without overflowing
+    return DecimalField(max_digits=amount.max_digits + rate.max_digits + 10,
+                        decimal_places=amount.decimal_places + rate.decimal_places)
+
+
+def _rate_date(day: str = None):
+    # Date of the outer row an exchange rate is looked up for: its `day` date field, or the date of its timestamp
+    # in the TIME_ZONE setting, where rates begin
+    if day is not None:
+        return OuterRef(day)
+    return TruncDate(ExpressionWrapper(OuterRef('timestamp'), output_field=Transaction._meta.get_field('timestamp')))
+
+
+def _rates(day: str = None) -> QuerySet:
+    """Exchange rates of the currency of the outer row valid at its date, the latest first.
+
+    Rows are dated by the `day` date field, or by their timestamp when it is None.
+    """
+
+    return (ExchangeRate.objects.filter(currency=OuterRef('currency'), valid_from__lte=_rate_date(day))
+            .order_by('-valid_from'))
+
+
+def with_rate(day: str = None) -> Q:
+    """Condition on the rows with an exchange rate at their date, dated like in _rates()."""
+
+    return Q(Exists(_rates(day)))
+
+
+def amount_PLN(amount: str = 'amount', day: str = None):
+    """Expression converting the `amount` field of a row to PLN with the exchange rate at its date, NULL when its
+    currency has none then. Rows are dated by the `day` date field, or by their timestamp when it is None.
+
+    The rate is looked up by the database, through the (currency, valid_from) unique index, so queries stay the
+    same size however many rates are stored.
+    """
+
+    output_field = _amount_PLN_field()
+    rate = Subquery(_rates(day).values('rate')[:1], output_field=ExchangeRate._meta.get_field('rate'))
+    return ExpressionWrapper(F(amount) * rate, output_field=output_field)
 
-    return len(unique_fields)
 
+def amount_PLN_aggregates(amount: str = 'amount', count: str = None, day: str = None):
+    """Aggregates computing the total amount in PLN of a QuerySet, and counting its rows without an exchange rate.
+
+    For QuerySets of rows standing for several transactions, like daily rollups, `count` names the field holding
+    how many each row stands for and `day` the date field they are dated by.
+    """
+
+    unknown = ~with_rate(day)
+    return {
+        'total_amount_PLN': Sum(amount_PLN(amount, day), output_field=_amount_PLN_field()),
+        'unknown_currency_count': Sum(count, filter=unknown) if count else Count('pk', filter=unknown),
+    }
+
+
+def total_amount_PLN(aggregated: dict, *sources: QuerySet, unknown_currency: str = None) -> Decimal:
+    """Return the total of values aggregated with amount_PLN_aggregates(), applying the unknown currency policy.
+
+    `sources` are the QuerySets the values were aggregated from, of transactions or daily rollups, read again only
+    to name unknown currencies. `unknown_currency` defaults to the REPORTS_UNKNOWN_CURRENCY_POLICY setting.
+    """
+
+    unknown_currency = unknown_currency or settings.REPORTS_UNKNOWN_CURRENCY_POLICY
+    if unknown_currency not in UNKNOWN_CURRENCY_POLICIES:
+        raise ValueError(f"Unknown currency policy {unknown_currency!r}.")
+
+    if aggregated['unknown_currency_count']:
+        currencies = sorted({currency for source in sources
+                             for currency in source.exclude(with_rate(_date_field(source)))
+                             .values_list('currency', flat=True).distinct()})
+        if unknown_currency != UNKNOWN_CURRENCY_SKIP:
+            raise UnknownCurrencyError(currencies)
+        logger.warning(f"Skipped {aggregated['unknown_currency_count']} transactions in currencies "
+                       f"without an exchange rate: {', '.join(currencies)}.")
+
+    total = aggregated['total_amount_PLN']
+    if total is None:
+        return Decimal(0).quantize(Decimal(1).scaleb(-_amount_PLN_field().decimal_places))
+    return total
+
+
+def _date_field(queryset: QuerySet):
+    # Daily rollups are dated by their day, transactions by their timestamp
+    return 'day' if queryset.model is TransactionDailyRollup else None
+
+
+def calculate_total_amount_PLN(transactions: QuerySet[Transaction], unknown_currency: str = None) -> Decimal:
+    """Calculate the total amount of transactions in PLN, with a single aggregate query."""
+
+    return total_amount_PLN(transactions.aggregate(**amount_PLN_aggregates()), transactions,
+                            unknown_currency=unknown_currency)
+
+def round_PLN(amount: Decimal) -> Decimal:
+    """Round an amount in PLN to the decimal places of Transaction.amount, half to even like round()."""
+
+    return amount.quantize(Decimal(1).scaleb(-Transaction._meta.get_field('amount').decimal_places))
+
+def calculate_total_unique_field(transactions: QuerySet[Transaction], field: str) -> int:
+    """Calculate the total number of unique values for a given field in transactions, with COUNT(DISTINCT) in SQL."""
 
+    return transactions.aggregate(unique_count=Count(field, distinct=True))['unique_count']
@@ -0,0 +1,43 @@
+import csv
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from reports.models import ExchangeRate
+from reports.lib.rates import exchange_rates_changed
+
+
+class Command(BaseCommand):
+    help = ("Load exchange rates to PLN from a CSV file with currency, valid_from and rate columns. "
+            "A rate is valid from its valid_from day until the next rate of its currency.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help="CSV file with a header row.")
+        parser.add_argument('--replace', action='store_true',
+                            help="Delete every stored rate missing from the file.")
+
+    def handle(self, *args, file, replace, **options):
+        with open(file, newline='', encoding='utf-8-sig') as csv_file:
+            rates = [self.parse_row(row, line_number)
+                     for line_number, row in enumerate(csv.DictReader(csv_file), start=2)]
+
+        with transaction.atomic():
+            if replace:
+                ExchangeRate.objects.all().delete()
+            ExchangeRate.objects.bulk_create(rates, update_conflicts=True, unique_fields=['currency', 'valid_from'],
+                                             update_fields=['rate'])
+            # Bulk writes send no signal, the reports learn about the change once it is committed
+            transaction.on_commit(exchange_rates_changed)
+        self.stdout.write(f"Loaded {len(rates)} exchange rates.")
+
+    def parse_row(self, row, line_number):
+        try:
+            currency = row['currency'].strip().upper()
+            rate = Decimal(row['rate'])
+            valid_from = date.fromisoformat(row['valid_from'].strip())
+        except (KeyError, AttributeError, ValueError, InvalidOperation) as e:
+            raise CommandError(f"Line {line_number}: invalid exchange rate {row}: {e}")
+        if len(currency) != 3 or not rate > 0:
+            raise CommandError(f"Line {line_number}: invalid exchange rate {row}.")
+        return ExchangeRate(currency=currency, valid_from=valid_from, rate=rate)
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.4 on 2026-10-18 13:46
+
+import datetime
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def seed_exchange_rates(apps, schema_editor):
+    # The rates reports used before they were stored, valid for all earlier transactions
+    ExchangeRate = apps.get_model('reports', 'ExchangeRate')
+    ExchangeRate.objects.bulk_create([
+        ExchangeRate(currency=currency, valid_from=datetime.date(1970, 1, 1), rate=Decimal(rate))
+        for currency, rate in (('PLN', '1.0'), ('EUR', '4.3'), ('USD', '4.0'))
+    ])
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExchangeRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(max_length=3)),
+                ('valid_from', models.DateField()),
+                ('rate', models.DecimalField(decimal_places=6, max_digits=12)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('currency', 'valid_from'), name='exchange_rate_currency_valid_from')],
+            },
+        ),
+        migrations.RunPython(seed_exchange_rates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+from django.db import models
+
+
+class ExchangeRate(models.Model):
+    """Rate converting amounts in `currency` to PLN, from the `valid_from` day, in the TIME_ZONE setting, until the
+    day the next rate of the currency is valid from."""
+
+    currency = models.CharField(max_length=3)
+    valid_from = models.DateField()
+    rate = models.DecimalField(max_digits=12, decimal_places=6)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['currency', 'valid_from'], name='exchange_rate_currency_valid_from'),
+        ]
+
+    def __str__(self):
+        return f"{self.currency} {self.rate} from {self.valid_from}"
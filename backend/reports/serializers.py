@@ -1,7 +1,15 @@
+from django.conf import settings
 from rest_framework import serializers
 
+from reports.lib.constants import INTERVALS, INTERVAL_DAY, TOP_ORDERS, TOP_BY_AMOUNT
+from reports.lib.timeseries import check_bucket_count, TooManyBucketsError
 
-class CustomerSummarySerializer(serializers.Serializer):
+
+class ProductSummarySerializer(serializers.Serializer):
+    approx = serializers.BooleanField(default=False)
+
+
+class CustomerSummarySerializer(ProductSummarySerializer):
     start_date = serializers.DateField(required=False)
     end_date = serializers.DateField(required=False)
 
@@ -14,4 +22,31 @@ class CustomerSummarySerializer(serializers.Serializer):
         if 'start_date' not in data and 'end_date' in data or 'end_date' not in data and 'start_date' in data:
             raise serializers.ValidationError(
                 "Both start date and end date must be provided together.")
-        return data
\ No newline at end of file
+        return data
+
+
+class SummaryBatchSerializer(CustomerSummarySerializer):
+    ids = serializers.ListField(child=serializers.UUIDField(), allow_empty=False,
+                                max_length=settings.REPORTS_BATCH_MAX_IDS)
+
+
+class TimeseriesSerializer(CustomerSummarySerializer):
+    approx = None
+    interval = serializers.ChoiceField(choices=INTERVALS, default=INTERVAL_DAY)
+
+    def validate(self, data):
+        data = super().validate(data)
+        if 'start_date' in data:
+            try:
+                check_bucket_count(data['start_date'], data['end_date'], data['interval'])
+            except TooManyBucketsError as e:
+                raise serializers.ValidationError(str(e))
+        return data
+
+
+class TopSerializer(CustomerSummarySerializer):
+    approx = None
+    customer_id = serializers.UUIDField(required=False)
+    product_id = serializers.UUIDField(required=False)
+    order_by = serializers.ChoiceField(choices=TOP_ORDERS, default=TOP_BY_AMOUNT)
+    limit = serializers.IntegerField(min_value=1, max_value=settings.REPORTS_TOP_MAX_LIMIT, default=20)
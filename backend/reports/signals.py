@@ -0,0 +1,23 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from api.lib.rollups import rollups_updated
+from .models import ExchangeRate
+from .lib.cache import bump_versions
+from .lib.rates import exchange_rates_changed
+
+
+@receiver(rollups_updated)
+def invalidate_cached_reports(sender, customer_ids, product_ids, **kwargs):
+    if customer_ids is None:
+        bump_versions(everything=True)
+    else:
+        bump_versions(customer_ids, product_ids)
+
+
+# Bulk changes, like those of the load_exchange_rates command, send no signal: they call exchange_rates_changed()
+
+@receiver([post_save, post_delete], sender=ExchangeRate)
+def invalidate_exchange_rates(sender, **kwargs):
+    transaction.on_commit(exchange_rates_changed)
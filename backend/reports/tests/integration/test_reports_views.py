@@ -1,3 +1,4 @@
+import io
 import pytest
 from decimal import Decimal
 from django.urls import reverse
@@ -5,10 +6,10 @@ from rest_framework.test import APIClient
 from django.contrib.auth.models import User
 
 from uuid import uuid4
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 
 from api.models import Transaction
-from reports.lib.constants import EXCHANGE_RATES
+from reports.lib.summaries import day_start
 from lib.TransactionFactory import TransactionFactory
 
 LOOP_COUNT = 25
@@ -18,8 +19,9 @@ LOOP_COUNT = 25
 class TestCustomerSummaryView:
 
     @pytest.fixture(autouse=True)
-    def setup_method(self):
+    def setup_method(self, exchange_rates):
         factory = TransactionFactory()
+        self.exchange_rates = exchange_rates
         self.client = APIClient()
         user = User.objects.create_user(username="testuser", password="testpass123")
 
@@ -43,7 +45,7 @@ class TestCustomerSummaryView:
             data = response.json()
 
             expected_total_amount_PLN = sum(
-                Decimal(tr['amount']) * Decimal(EXCHANGE_RATES[tr['currency']])
+                Decimal(tr['amount']) * self.exchange_rates[tr['currency']]
                 for tr in transactions_per_customer
             )
 
@@ -64,6 +66,41 @@ class TestCustomerSummaryView:
         assert response.status_code == 404
         assert "error" in response.json()
 
+    def test_customer_summary_queries(self, django_assert_num_queries):
+        customer_id = self.backup_data[0]['customer_id']
+
+        # One query on the rollups, and one for the earliest transaction
+        with django_assert_num_queries(2):
+            response = self.client.get(f"/reports/customer-summary/{customer_id}/")
+        assert response.status_code == 200
+
+        # The partial days at the edges of the range add one query on the transactions
+        with django_assert_num_queries(3):
+            response = self.client.get(f"/reports/customer-summary/{customer_id}/",
+                                       data={"start_date": "2000-01-01", "end_date": "2100-01-01"})
+        assert response.status_code == 200
+
+        with django_assert_num_queries(1):
+            response = self.client.get(f"/reports/customer-summary/{uuid4()}/")
+        assert response.status_code == 404
+
+    def test_customer_summary_cached_until_import(self, django_assert_num_queries, django_capture_on_commit_callbacks):
+        customer_id = self.backup_data[0]['customer_id']
+        url = f"/reports/customer-summary/{customer_id}/"
+        first = self.client.get(url).json()
+
+        with django_assert_num_queries(0):
+            assert self.client.get(url).json() == first
+
+        row = dict(self.backup_data[0], transaction_id=str(uuid4()), amount="10.00", currency="PLN")
+        csv_file = io.BytesIO((",".join(row) + "\n" + ",".join(row.values()) + "\n").encode("utf-8"))
+        csv_file.name = "file.csv"
+        with django_capture_on_commit_callbacks(execute=True):
+            assert self.client.post(reverse("transactions-upload"), data={"file": csv_file}).status_code == 200
+
+        assert Decimal(str(self.client.get(url).json()["total_amount_PLN"])) == (
+            Decimal(str(first["total_amount_PLN"])) + Decimal("10.00"))
+
     def test_customer_summary_with_date_filter(self):
 
         customer_id = self.backup_data[0]['customer_id']
@@ -87,7 +124,7 @@ class TestCustomerSummaryView:
         ]
 
         expected_total_amount_PLN = sum(
-            Decimal(tr['amount']) * Decimal(EXCHANGE_RATES[tr['currency']])
+            Decimal(tr['amount']) * self.exchange_rates[tr['currency']]
             for tr in filtered_transactions
         )
         unique_products = set(tr['product_id'] for tr in filtered_transactions)
@@ -103,8 +140,9 @@ class TestCustomerSummaryView:
 class TestProductSummaryView:
 
     @pytest.fixture(autouse=True)
-    def setup_method(self):
+    def setup_method(self, exchange_rates):
         factory = TransactionFactory()
+        self.exchange_rates = exchange_rates
         self.client = APIClient()
         user = User.objects.create_user(username="testuser", password="testpass123")
 
@@ -131,7 +169,7 @@ class TestProductSummaryView:
             total_quantity = sum(int(tr['quantity'])
                                  for tr in transactions_per_product)
             expected_amount = sum(
-                Decimal(tr['amount']) * Decimal(EXCHANGE_RATES[tr['currency']])
+                Decimal(tr['amount']) * self.exchange_rates[tr['currency']]
                 for tr in transactions_per_product
             )
             unique_customers = set([tr['customer_id']
@@ -149,6 +187,40 @@ class TestProductSummaryView:
         assert response.status_code == 404
         assert "error" in response.json()
 
+    def test_product_summary_single_query(self, django_assert_num_queries):
+        product_id = self.backup_data[0]['product_id']
+
+        with django_assert_num_queries(1):
+            response = self.client.get(f"/reports/product-summary/{product_id}/")
+        assert response.status_code == 200
+
+        with django_assert_num_queries(1):
+            response = self.client.get(f"/reports/product-summary/{uuid4()}/")
+        assert response.status_code == 404
+
+    def test_product_summary_approximate(self):
+        for product_id in set(tr['product_id'] for tr in self.backup_data):
+            url = f"/reports/product-summary/{product_id}/"
+
+            response = self.client.get(url, {"approx": "true"})
+
+            assert response.status_code == 200
+            # Sketches of a few customers count them exactly
+            assert response.json() == self.client.get(url).json()
+
+        assert self.client.get(url, {"approx": "maybe"}).status_code == 400
+
+    def test_product_summary_unknown_currency(self):
+        product_id = self.backup_data[0]['product_id']
+        transaction = Transaction.objects.get(pk=self.backup_data[0]['transaction_id'])
+        transaction.currency = 'GBP'
+        transaction.save()
+
+        response = self.client.get(f"/reports/product-summary/{product_id}/")
+
+        assert response.status_code == 422
+        assert "GBP" in response.json()["error"]
+
 
     def test_product_summary_view_with_date_filter(self):
         for product_id in set(tr['product_id'] for tr in self.backup_data):
@@ -174,7 +246,7 @@ class TestProductSummaryView:
 
             total_quantity = sum(int(tr['quantity']) for tr in filtered_transactions)
             expected_amount = sum(
-                Decimal(tr['amount']) * Decimal(EXCHANGE_RATES[tr['currency']])
+                Decimal(tr['amount']) * self.exchange_rates[tr['currency']]
                 for tr in filtered_transactions
             )
             unique_customers = set(tr['customer_id'] for tr in filtered_transactions)
@@ -184,3 +256,257 @@ class TestProductSummaryView:
             assert abs(Decimal(data["total_amount_PLN"]) -
                        expected_amount) < Decimal('0.01')
             assert data["total_unique_customers"] == len(unique_customers)
+
+
+@pytest.mark.django_db
+class TestSummaryBatchViews:
+
+    @pytest.fixture(autouse=True)
+    def setup_method(self):
+        factory = TransactionFactory()
+        self.client = APIClient()
+        user = User.objects.create_user(username="testuser", password="testpass123")
+
+        self.client.force_authenticate(user=user)
+        self.backup_data = []
+
+        for _ in range(LOOP_COUNT):
+            transaction_data = factory.generate_transaction_data(
+                allow_duplicates=True)
+            _ = Transaction.objects.create(**transaction_data)
+            self.backup_data.append(transaction_data)
+
+    def test_customer_summary_batch(self, django_assert_num_queries):
+        customer_ids = sorted(set(tr['customer_id'] for tr in self.backup_data))
+        missing_id = str(uuid4())
+
+        # One query on the rollups and one for the earliest transactions, however many customers
+        with django_assert_num_queries(2):
+            response = self.client.post(reverse("customer-summary-batch"),
+                                        data={"ids": customer_ids + [missing_id]}, format="json")
+
+        assert response.status_code == 200
+        results = response.json()["results"]
+        assert results[missing_id] == {"error": "No transactions found for this customer."}
+        for customer_id in customer_ids:
+            assert results[customer_id] == self.client.get(f"/reports/customer-summary/{customer_id}/").json()
+
+    def test_customer_summary_batch_date_range(self):
+        customer_ids = sorted(set(tr['customer_id'] for tr in self.backup_data))
+        dates = {"start_date": "2000-01-01", "end_date": (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')}
+
+        response = self.client.post(reverse("customer-summary-batch"), data={"ids": customer_ids, **dates},
+                                    format="json")
+
+        assert response.status_code == 200
+        results = response.json()["results"]
+        for customer_id in customer_ids:
+            assert results[customer_id] == self.client.get(f"/reports/customer-summary/{customer_id}/",
+                                                           data=dates).json()
+
+    def test_product_summary_batch(self):
+        product_ids = sorted(set(tr['product_id'] for tr in self.backup_data))
+        transaction = Transaction.objects.get(pk=self.backup_data[0]['transaction_id'])
+        transaction.currency = 'GBP'
+        transaction.save()
+
+        response = self.client.post(reverse("product-summary-batch"), data={"ids": product_ids}, format="json")
+
+        assert response.status_code == 200
+        results = response.json()["results"]
+        assert "GBP" in results[str(transaction.product_id)]["error"]
+        for product_id in product_ids:
+            if product_id != str(transaction.product_id):
+                assert results[product_id] == self.client.get(f"/reports/product-summary/{product_id}/").json()
+
+    @pytest.mark.parametrize("data", [{}, {"ids": []}, {"ids": ["not-a-uuid"]},
+                                      {"ids": [str(uuid4())], "start_date": "2025-01-01"}])
+    def test_summary_batch_invalid(self, data):
+        response = self.client.post(reverse("customer-summary-batch"), data=data, format="json")
+
+        assert response.status_code == 400
+
+    def test_summary_batch_too_many_ids(self):
+        response = self.client.post(reverse("product-summary-batch"),
+                                    data={"ids": [str(uuid4()) for _ in range(1001)]}, format="json")
+
+        assert response.status_code == 400
+
+
+@pytest.mark.django_db
+class TestTimeseriesViews:
+
+    @pytest.fixture(autouse=True)
+    def setup_method(self):
+        self.client = APIClient()
+        user = User.objects.create_user(username="testuser", password="testpass123")
+
+        self.client.force_authenticate(user=user)
+        self.customer_id = uuid4()
+        self.product_id = uuid4()
+        # Two transactions on January 1st, one on January 3rd and one on February 10th 2025
+        for day, hour, amount, currency in [(date(2025, 1, 1), 8, "10.00", "PLN"), (date(2025, 1, 1), 20, "1.00", "EUR"),
+                                            (date(2025, 1, 3), 12, "5.50", "USD"), (date(2025, 2, 10), 0, "2.00", "PLN")]:
+            Transaction.objects.create(
+                transaction_id=uuid4(), timestamp=day_start(day) + timedelta(hours=hour), amount=Decimal(amount),
+                currency=currency, customer_id=self.customer_id, product_id=self.product_id, quantity=2)
+
+    def test_customer_timeseries_daily(self, django_assert_num_queries):
+        url = reverse("customer-timeseries", args=[self.customer_id])
+
+        with django_assert_num_queries(1):
+            response = self.client.get(url, {"start_date": "2024-12-31", "end_date": "2025-01-04"})
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["customer_id"] == str(self.customer_id)
+        assert data["interval"] == "day"
+        assert data["results"] == [
+            {"period": "2024-12-31", "total_amount_PLN": 0.0, "total_quantity": 0, "transaction_count": 0},
+            {"period": "2025-01-01", "total_amount_PLN": 14.3, "total_quantity": 4, "transaction_count": 2},
+            {"period": "2025-01-02", "total_amount_PLN": 0.0, "total_quantity": 0, "transaction_count": 0},
+            {"period": "2025-01-03", "total_amount_PLN": 22.0, "total_quantity": 2, "transaction_count": 1},
+            {"period": "2025-01-04", "total_amount_PLN": 0.0, "total_quantity": 0, "transaction_count": 0},
+        ]
+
+    def test_product_timeseries_monthly(self):
+        response = self.client.get(reverse("product-timeseries", args=[self.product_id]), {"interval": "month"})
+
+        assert response.status_code == 200
+        assert response.json()["results"] == [
+            {"period": "2025-01-01", "total_amount_PLN": 36.3, "total_quantity": 6, "transaction_count": 3},
+            {"period": "2025-02-01", "total_amount_PLN": 2.0, "total_quantity": 2, "transaction_count": 1},
+        ]
+
+    def test_customer_timeseries_weekly(self):
+        response = self.client.get(reverse("customer-timeseries", args=[self.customer_id]), {"interval": "week"})
+
+        periods = [bucket["period"] for bucket in response.json()["results"]]
+        assert periods == ["2024-12-30", "2025-01-06", "2025-01-13", "2025-01-20", "2025-01-27", "2025-02-03",
+                           "2025-02-10"]
+        assert sum(bucket["transaction_count"] for bucket in response.json()["results"]) == 4
+
+    def test_timeseries_not_found(self):
+        response = self.client.get(reverse("customer-timeseries", args=[self.customer_id]),
+                                   {"start_date": "2025-03-01", "end_date": "2025-03-31"})
+
+        assert response.status_code == 404
+        assert response.json() == {"error": "No transactions found for this customer."}
+
+    def test_timeseries_unknown_currency(self):
+        Transaction.objects.create(
+            transaction_id=uuid4(), timestamp=day_start(date(2025, 1, 2)), amount=Decimal("1.00"), currency="GBP",
+            customer_id=self.customer_id, product_id=self.product_id, quantity=1)
+
+        response = self.client.get(reverse("customer-timeseries", args=[self.customer_id]))
+
+        assert response.status_code == 422
+        assert "GBP" in response.json()["error"]
+
+    def test_timeseries_too_many_buckets_without_dates(self, settings):
+        # January 1st to February 10th fills 41 daily buckets
+        settings.REPORTS_TIMESERIES_MAX_BUCKETS = 40
+
+        response = self.client.get(reverse("customer-timeseries", args=[self.customer_id]))
+
+        assert response.status_code == 400
+        assert response.json() == {"error": "The range holds 41 buckets, at most 40 are allowed."}
+        assert self.client.get(reverse("customer-timeseries", args=[self.customer_id]),
+                               {"interval": "week"}).status_code == 200
+
+    @pytest.mark.parametrize("params", [{"interval": "year"}, {"start_date": "2025-01-01"},
+                                        {"start_date": "2020-01-01", "end_date": "2025-01-01"},
+                                        {"start_date": "0001-01-01", "end_date": "9999-12-31"}])
+    def test_timeseries_invalid(self, params):
+        response = self.client.get(reverse("customer-timeseries", args=[self.customer_id]), params)
+
+        assert response.status_code == 400
+
+
+@pytest.mark.django_db
+class TestTopViews:
+
+    @pytest.fixture(autouse=True)
+    def setup_method(self):
+        self.client = APIClient()
+        user = User.objects.create_user(username="testuser", password="testpass123")
+
+        self.client.force_authenticate(user=user)
+        self.customers = [uuid4() for _ in range(3)]
+        self.products = [uuid4() for _ in range(2)]
+        # (customer, product, day, amount, currency, quantity)
+        for customer, product, day, amount, currency, quantity in [
+                (0, 0, 1, "100.00", "PLN", 1), (0, 1, 2, "10.00", "EUR", 5),
+                (1, 0, 1, "50.00", "USD", 2), (1, 0, 20, "1.00", "PLN", 9),
+                (2, 1, 2, "120.00", "PLN", 1)]:
+            Transaction.objects.create(
+                transaction_id=uuid4(), timestamp=day_start(date(2025, 1, day)) + timedelta(hours=12),
+                amount=Decimal(amount), currency=currency, customer_id=self.customers[customer],
+                product_id=self.products[product], quantity=quantity)
+
+    def top(self, name, **params):
+        response = self.client.get(reverse(name), params)
+        assert response.status_code == 200
+        return response.json()["results"]
+
+    def test_top_customers_by_amount(self, django_assert_num_queries):
+        with django_assert_num_queries(1):
+            results = self.top("top-customers")
+
+        assert results == [
+            {"customer_id": str(self.customers[1]), "total_amount_PLN": 201.0, "total_quantity": 11,
+             "transaction_count": 2},
+            {"customer_id": str(self.customers[0]), "total_amount_PLN": 143.0, "total_quantity": 6,
+             "transaction_count": 2},
+            {"customer_id": str(self.customers[2]), "total_amount_PLN": 120.0, "total_quantity": 1,
+             "transaction_count": 1},
+        ]
+
+    def test_top_customers_of_product(self):
+        results = self.top("top-customers", product_id=self.products[0], order_by="quantity", limit=1)
+
+        assert results == [{"customer_id": str(self.customers[1]), "total_amount_PLN": 201.0, "total_quantity": 11,
+                            "transaction_count": 2}]
+
+    def test_top_products_in_range(self):
+        results = self.top("top-products", start_date="2025-01-01", end_date="2025-01-02", order_by="count")
+
+        # Ties are ranked by id
+        assert [(result["product_id"], result["transaction_count"]) for result in results] == [
+            (str(product_id), 2) for product_id in sorted(self.products)]
+        assert sum(result["total_quantity"] for result in results) == 9
+
+    def test_top_products_of_customer_cached(self, django_assert_num_queries, django_capture_on_commit_callbacks):
+        params = {"customer_id": self.customers[0], "order_by": "quantity"}
+        assert [result["product_id"] for result in self.top("top-products", **params)] == [
+            str(self.products[1]), str(self.products[0])]
+
+        with django_assert_num_queries(0):
+            self.top("top-products", **params)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            Transaction.objects.create(
+                transaction_id=uuid4(), timestamp=day_start(date(2025, 1, 3)), amount=Decimal("1.00"),
+                currency="PLN", customer_id=self.customers[0], product_id=self.products[0], quantity=10)
+
+        assert [result["product_id"] for result in self.top("top-products", **params)] == [
+            str(self.products[0]), str(self.products[1])]
+
+    def test_top_unknown_currency(self):
+        Transaction.objects.create(
+            transaction_id=uuid4(), timestamp=day_start(date(2025, 1, 3)), amount=Decimal("1.00"), currency="GBP",
+            customer_id=self.customers[2], product_id=self.products[0], quantity=1)
+
+        response = self.client.get(reverse("top-customers"))
+
+        assert response.status_code == 422
+        assert "GBP" in response.json()["error"]
+        # Customers without transactions in it can still be ranked
+        assert self.client.get(reverse("top-customers"), {"limit": 2}).status_code == 200
+
+    @pytest.mark.parametrize("params", [{"order_by": "name"}, {"limit": 0}, {"limit": 101},
+                                        {"product_id": "not-a-uuid"}, {"start_date": "2025-01-01"}])
+    def test_top_invalid(self, params):
+        response = self.client.get(reverse("top-customers"), params)
+
+        assert response.status_code == 400
@@ -0,0 +1,112 @@
+import pytest
+from decimal import Decimal
+
+from api.models import Transaction
+from api.lib.rollups import rebuild_rollups
+from reports.lib.cache import cached_report, bump_versions
+from lib.TransactionFactory import TransactionFactory
+
+LOOP_COUNT = 25
+
+
+@pytest.mark.django_db
+class TestCachedReport:
+
+    @pytest.fixture(autouse=True)
+    def setup_method(self):
+        self.factory = TransactionFactory()
+        self.computed = []
+
+    def compute(self, value):
+        def compute():
+            self.computed.append(value)
+            return value
+        return compute
+
+    def test_hit_until_version_bumped(self):
+        customer_id = self.factory.CUST_ID[0]
+
+        assert cached_report('customer', customer_id, (), self.compute(1)) == 1
+        assert cached_report('customer', customer_id, (), self.compute(2)) == 1
+
+        bump_versions(customer_ids=[customer_id])
+
+        assert cached_report('customer', customer_id, (), self.compute(3)) == 3
+        assert self.computed == [1, 3]
+
+    def test_keyed_by_kind_entity_and_params(self):
+        entity_id = self.factory.CUST_ID[0]
+
+        cached_report('customer', entity_id, (), self.compute(1))
+        cached_report('product', entity_id, (), self.compute(2))
+        cached_report('customer', entity_id, ('2025-01-01', '2025-02-01'), self.compute(3))
+
+        assert self.computed == [1, 2, 3]
+
+    def test_other_versions_untouched(self):
+        customer_id, other_id = self.factory.CUST_ID[:2]
+        cached_report('customer', customer_id, (), self.compute(1))
+        cached_report('customer', other_id, (), self.compute(2))
+
+        bump_versions(customer_ids=[other_id], product_ids=[customer_id])
+
+        assert cached_report('customer', customer_id, (), self.compute(3)) == 1
+        assert cached_report('customer', other_id, (), self.compute(4)) == 4
+
+    def test_global_version(self):
+        customer_id = self.factory.CUST_ID[0]
+        cached_report('customer', customer_id, (), self.compute(1))
+
+        bump_versions(everything=True)
+
+        assert cached_report('customer', customer_id, (), self.compute(2)) == 2
+
+    def test_none_report_cached(self):
+        customer_id = self.factory.CUST_ID[0]
+
+        assert cached_report('customer', customer_id, (), self.compute(None)) is None
+        assert cached_report('customer', customer_id, (), self.compute(1)) is None
+
+
+@pytest.mark.django_db
+class TestCacheInvalidation:
+
+    @pytest.fixture(autouse=True)
+    def setup_method(self, django_capture_on_commit_callbacks):
+        factory = TransactionFactory()
+        with django_capture_on_commit_callbacks(execute=True):
+            self.transactions = [Transaction.objects.create(**factory.generate_transaction_data(allow_duplicates=True))
+                                 for _ in range(LOOP_COUNT)]
+        self.computed = []
+
+    def compute(self, value):
+        def compute():
+            self.computed.append(value)
+            return value
+        return compute
+
+    def test_saves_invalidate_their_customer_and_product(self, django_capture_on_commit_callbacks):
+        transaction = self.transactions[0]
+        others = [t for t in self.transactions if t.customer_id != transaction.customer_id]
+        cached_report('customer', transaction.customer_id, (), self.compute(1))
+        cached_report('product', transaction.product_id, (), self.compute(2))
+        for other in others:
+            cached_report('customer', other.customer_id, (), self.compute(3))
+
+        with django_capture_on_commit_callbacks(execute=True):
+            transaction.amount = Decimal('1.00')
+            transaction.save()
+
+        assert cached_report('customer', transaction.customer_id, (), self.compute(4)) == 4
+        assert cached_report('product', transaction.product_id, (), self.compute(5)) == 5
+        for other in others:
+            assert cached_report('customer', other.customer_id, (), self.compute(6)) == 3
+
+    def test_rebuild_invalidates_everything(self, django_capture_on_commit_callbacks):
+        transaction = self.transactions[0]
+        cached_report('customer', transaction.customer_id, (), self.compute(1))
+
+        with django_capture_on_commit_callbacks(execute=True):
+            rebuild_rollups()
+
+        assert cached_report('customer', transaction.customer_id, (), self.compute(2)) == 2
@@ -0,0 +1,136 @@
+import pytest
+from datetime import date, timedelta
+from decimal import Decimal
+from uuid import uuid4
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.models import Transaction
+from reports.models import ExchangeRate
+from reports.lib.rates import exchange_rates_changed
+from reports.lib.cache import cached_report
+from reports.lib.summaries import summarize
+from reports.lib.utils import calculate_total_amount_PLN, day_start, UnknownCurrencyError
+
+# Day the rates seeded by the migration are valid from
+SEEDED_VALID_FROM = date(1970, 1, 1)
+
+
+@pytest.mark.django_db
+class TestExchangeRates:
+
+    def test_seeded_rates(self, exchange_rates):
+        assert exchange_rates == {'PLN': Decimal('1.0'), 'EUR': Decimal('4.3'), 'USD': Decimal('4.0')}
+        assert set(ExchangeRate.objects.values_list('valid_from', flat=True)) == {SEEDED_VALID_FROM}
+
+    def test_many_rates(self, exchange_rates, django_capture_on_commit_callbacks):
+        customer_id = uuid4()
+        transactions = Transaction.objects.filter(customer_id=customer_id)
+        with CaptureQueriesContext(connection) as before:
+            calculate_total_amount_PLN(transactions)
+        # Daily rates of several years, each a different one
+        with django_capture_on_commit_callbacks(execute=True):
+            ExchangeRate.objects.bulk_create([
+                ExchangeRate(currency=currency, valid_from=date(2020, 1, 1) + timedelta(days=day),
+                             rate=Decimal(4) + Decimal(day) / 1000)
+                for currency in exchange_rates for day in range(1500)])
+            exchange_rates_changed()
+        for day in (0, 700, 1499, 1600):
+            Transaction.objects.create(
+                transaction_id=uuid4(), timestamp=day_start(date(2020, 1, 1) + timedelta(days=day)), amount=Decimal(1),
+                currency='EUR', customer_id=customer_id, product_id=uuid4(), quantity=1)
+
+        with CaptureQueriesContext(connection) as after:
+            total = calculate_total_amount_PLN(transactions)
+
+        # Rates are looked up by the database, the query does not grow with them
+        assert [query['sql'] for query in after] == [query['sql'] for query in before]
+        assert total == Decimal('4.000') + Decimal('4.700') + 2 * Decimal('5.499')
+        assert summarize('customer_id', customer_id, 'product_id')['total_amount_PLN'] == total
+
+    def test_change_invalidates_cached_reports(self):
+        customer_id = uuid4()
+        assert cached_report('customer', customer_id, (), lambda: 1) == 1
+
+        exchange_rates_changed()
+
+        assert cached_report('customer', customer_id, (), lambda: 2) == 2
+
+
+@pytest.mark.django_db
+class TestRatesAtTransactionTime:
+
+    @pytest.fixture(autouse=True)
+    def setup_method(self, django_capture_on_commit_callbacks):
+        self.customer_id = uuid4()
+        with django_capture_on_commit_callbacks(execute=True):
+            ExchangeRate.objects.create(currency='EUR', valid_from=date(2025, 1, 10), rate=Decimal('4.5'))
+        # 10 EUR on each day from January 8th to 11th, two days at each rate
+        for day in range(8, 12):
+            Transaction.objects.create(
+                transaction_id=uuid4(), timestamp=day_start(date(2025, 1, day)) + timedelta(hours=12),
+                amount=Decimal('10.00'), currency='EUR', customer_id=self.customer_id, product_id=uuid4(), quantity=1)
+
+    def test_transactions(self):
+        total = calculate_total_amount_PLN(Transaction.objects.filter(customer_id=self.customer_id))
+
+        assert total == Decimal('2') * 10 * Decimal('4.3') + Decimal('2') * 10 * Decimal('4.5')
+
+    @pytest.mark.parametrize("start, end", [(None, None), (day_start(date(2025, 1, 8)), day_start(date(2025, 1, 12))),
+                                            (day_start(date(2025, 1, 8)) + timedelta(hours=13),
+                                             day_start(date(2025, 1, 11)) + timedelta(hours=12))])
+    def test_rollups_and_edges(self, start, end):
+        summary = summarize('customer_id', self.customer_id, 'product_id', start, end)
+        expected = calculate_total_amount_PLN(Transaction.objects.filter(
+            customer_id=self.customer_id, **({'timestamp__gte': start, 'timestamp__lte': end} if start else {})))
+
+        assert summary['total_amount_PLN'] == expected
+
+    def test_no_rate_yet(self):
+        Transaction.objects.create(
+            transaction_id=uuid4(), timestamp=day_start(date(1969, 12, 31)), amount=Decimal('10.00'), currency='PLN',
+            customer_id=self.customer_id, product_id=uuid4(), quantity=1)
+
+        with pytest.raises(UnknownCurrencyError, match="PLN"):
+            summarize('customer_id', self.customer_id, 'product_id')
+
+
+@pytest.mark.django_db
+class TestLoadExchangeRates:
+
+    def write_rates(self, tmp_path, text):
+        path = tmp_path / "rates.csv"
+        path.write_text(text)
+        return str(path)
+
+    def test_load(self, tmp_path, exchange_rates, django_capture_on_commit_callbacks):
+        path = self.write_rates(tmp_path, "currency,valid_from,rate\nEUR,2025-01-01,4.25\nchf,2025-01-01,4.6\n"
+                                          f"USD,{SEEDED_VALID_FROM},3.9\n")
+
+        with django_capture_on_commit_callbacks(execute=True):
+            call_command('load_exchange_rates', path)
+
+        rates = set(ExchangeRate.objects.values_list('currency', 'valid_from', 'rate'))
+        assert ('CHF', date(2025, 1, 1), Decimal('4.6')) in rates
+        assert ('EUR', date(2025, 1, 1), Decimal('4.25')) in rates
+        assert ('USD', SEEDED_VALID_FROM, Decimal('3.9')) in rates
+        assert len(rates) == len(exchange_rates) + 2
+
+    def test_replace(self, tmp_path, django_capture_on_commit_callbacks):
+        path = self.write_rates(tmp_path, "currency,valid_from,rate\nEUR,2025-01-01,4.25\n")
+
+        with django_capture_on_commit_callbacks(execute=True):
+            call_command('load_exchange_rates', path, replace=True)
+
+        assert list(ExchangeRate.objects.values_list('currency', 'valid_from', 'rate')) == [
+            ('EUR', date(2025, 1, 1), Decimal('4.25'))]
+
+    @pytest.mark.parametrize("row", ["EUR,2025-13-01,4.25", "EURO,2025-01-01,4.25", "EUR,2025-01-01,-1",
+                                     "EUR,2025-01-01,abc"])
+    def test_invalid(self, tmp_path, exchange_rates, row):
+        path = self.write_rates(tmp_path, f"currency,valid_from,rate\n{row}\n")
+
+        with pytest.raises(CommandError, match="Line 2"):
+            call_command('load_exchange_rates', path)
+        assert ExchangeRate.objects.count() == len(exchange_rates)
@@ -0,0 +1,150 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from uuid import uuid4
+
+from api.models import Transaction
+from reports.lib.summaries import split_range, summarize, summarize_many, day_start
+
+LOOP_COUNT = 25
+
+
+class TestSplitRange:
+
+    def test_open_range_reads_only_rollups(self):
+        days, edges = split_range()
+
+        assert edges is None
+        assert days is not None
+
+    def test_midnight_bounds(self):
+        days, edges = split_range(day_start(date(2025, 1, 1)), day_start(date(2025, 1, 31)))
+
+        assert dict(days.children) == {'day__gte': date(2025, 1, 1), 'day__lt': date(2025, 1, 31)}
+        # Only the first instant of the end date is an edge
+        assert edges.children == [('timestamp__gte', day_start(date(2025, 1, 31))),
+                                  ('timestamp__lte', day_start(date(2025, 1, 31)))]
+
+    def test_partial_days(self):
+        start = datetime(2025, 1, 1, 12, tzinfo=timezone.utc)
+        end = datetime(2025, 1, 31, 12, tzinfo=timezone.utc)
+
+        days, edges = split_range(start, end)
+
+        assert dict(days.children) == {'day__gte': date(2025, 1, 2), 'day__lt': date(2025, 1, 31)}
+        assert len(edges.children) == 2
+
+    def test_range_within_a_day(self):
+        start = datetime(2025, 1, 1, 1, tzinfo=timezone.utc)
+        end = datetime(2025, 1, 1, 23, tzinfo=timezone.utc)
+
+        days, edges = split_range(start, end)
+
+        assert days is None
+        assert dict(edges.children) == {'timestamp__gte': start, 'timestamp__lte': end}
+
+
+@pytest.mark.django_db
+class TestSummarize:
+
+    @pytest.fixture(autouse=True)
+    def setup_method(self, exchange_rates):
+        self.exchange_rates = exchange_rates
+        currencies = sorted(exchange_rates)
+        self.customer_id = uuid4()
+        self.products = [uuid4() for _ in range(5)]
+        first = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        self.transactions = [
+            Transaction.objects.create(
+                transaction_id=uuid4(),
+                # Every six hours, so that ranges cut days in the middle
+                timestamp=first + timedelta(hours=6 * index),
+                amount=Decimal(index + 1) + Decimal('0.05'),
+                currency=currencies[index % len(currencies)],
+                customer_id=self.customer_id,
+                product_id=self.products[index % len(self.products)],
+                quantity=index % 4,
+            )
+            for index in range(LOOP_COUNT)
+        ]
+
+    def expected(self, start, end):
+        selected = [t for t in self.transactions if start <= t.timestamp <= end]
+        return {
+            'total_amount_PLN': sum(t.amount * self.exchange_rates[t.currency] for t in selected),
+            'total_quantity': sum(t.quantity for t in selected),
+            'distinct_count': len({t.product_id for t in selected}),
+            'earliest_transaction_date': min(t.timestamp for t in selected),
+        }
+
+    @pytest.mark.parametrize("start_hours, end_hours", [(0, 144), (9, 100), (30, 40), (3, 21), (24, 48)])
+    def test_matches_transactions(self, start_hours, end_hours):
+        start = datetime(2025, 1, 1, tzinfo=timezone.utc) + timedelta(hours=start_hours)
+        end = datetime(2025, 1, 1, tzinfo=timezone.utc) + timedelta(hours=end_hours)
+
+        summary = summarize('customer_id', self.customer_id, 'product_id', start, end, earliest=True)
+
+        assert summary == self.expected(start, end)
+
+    @pytest.mark.parametrize("start_hours, end_hours", [(None, None), (9, 100), (3, 21)])
+    def test_many_match_single(self, start_hours, end_hours):
+        first = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        start = end = None
+        if start_hours is not None:
+            start, end = first + timedelta(hours=start_hours), first + timedelta(hours=end_hours)
+        other_customer = uuid4()
+        for transaction in self.transactions[::3]:
+            Transaction.objects.create(**{field.attname: getattr(transaction, field.attname)
+                                          for field in Transaction._meta.concrete_fields
+                                          if field.attname not in ('transaction_id', 'customer_id')},
+                                       transaction_id=uuid4(), customer_id=other_customer)
+        customer_ids = [self.customer_id, other_customer, uuid4()]
+
+        summaries = summarize_many('customer_id', customer_ids, 'product_id', start, end, earliest=True)
+
+        assert summaries == {customer_id: summarize('customer_id', customer_id, 'product_id', start, end, earliest=True)
+                             for customer_id in customer_ids[:2]}
+
+    @pytest.mark.parametrize("approx", [False, True])
+    def test_range_bounds_every_transaction_query(self, approx):
+        start = datetime(2025, 1, 1, 9, tzinfo=timezone.utc)
+        end = datetime(2025, 1, 5, 4, tzinfo=timezone.utc)
+
+        with CaptureQueriesContext(connection) as queries:
+            summarize('customer_id', self.customer_id, 'product_id', start, end, earliest=True, approx=approx)
+
+        # Transactions are only read within bounds on timestamp, so the cost follows the range, not the history
+        transaction_queries = [query['sql'] for query in queries if 'FROM "api_transaction" ' in query['sql']]
+        assert transaction_queries
+        for sql in transaction_queries:
+            assert '"api_transaction"."timestamp" >=' in sql
+            assert '"api_transaction"."timestamp" <' in sql
+
+    def test_whole_history(self):
+        summary = summarize('customer_id', self.customer_id, 'product_id', earliest=True)
+
+        assert summary == self.expected(self.transactions[0].timestamp, self.transactions[-1].timestamp)
+
+    def test_no_transactions(self):
+        assert summarize('customer_id', uuid4(), 'product_id') is None
+        assert summarize('customer_id', self.customer_id, 'product_id',
+                         datetime(2030, 1, 1, tzinfo=timezone.utc), datetime(2030, 2, 1, tzinfo=timezone.utc)) is None
+
+    @pytest.mark.parametrize("start_hours, end_hours", [(None, None), (0, 144), (9, 100), (3, 21)])
+    def test_approximate_distinct_count(self, start_hours, end_hours, django_assert_max_num_queries):
+        first = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        start = end = None
+        if start_hours is not None:
+            start, end = first + timedelta(hours=start_hours), first + timedelta(hours=end_hours)
+        exact = summarize('product_id', self.products[0], 'customer_id', start, end)
+
+        # The rollups and sketches of whole days, the aggregates and distinct values of the edges
+        with django_assert_max_num_queries(4):
+            approximate = summarize('product_id', self.products[0], 'customer_id', start, end, approx=True)
+
+        # Sketches of a few values count them exactly
+        assert approximate == exact
+        assert summarize('customer_id', self.customer_id, 'product_id', start, end, approx=True) == summarize(
+            'customer_id', self.customer_id, 'product_id', start, end)
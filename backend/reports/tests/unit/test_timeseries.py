@@ -0,0 +1,33 @@
+import pytest
+from datetime import date
+
+from reports.lib.timeseries import buckets, bucket_start, bucket_count
+
+
+class TestBuckets:
+
+    @pytest.mark.parametrize("interval, expected", [
+        ("day", date(2025, 1, 15)), ("week", date(2025, 1, 13)), ("month", date(2025, 1, 1))])
+    def test_bucket_start(self, interval, expected):
+        assert bucket_start(date(2025, 1, 15), interval) == expected
+
+    def test_months_across_years(self):
+        assert list(buckets(date(2024, 11, 30), date(2025, 2, 1), "month")) == [
+            date(2024, 11, 1), date(2024, 12, 1), date(2025, 1, 1), date(2025, 2, 1)]
+
+    def test_weeks_start_on_monday(self):
+        assert list(buckets(date(2025, 1, 5), date(2025, 1, 13), "week")) == [
+            date(2024, 12, 30), date(2025, 1, 6), date(2025, 1, 13)]
+
+    def test_single_day(self):
+        assert list(buckets(date(2025, 1, 1), date(2025, 1, 1), "day")) == [date(2025, 1, 1)]
+
+    @pytest.mark.parametrize("interval", ["day", "week", "month"])
+    @pytest.mark.parametrize("first, last", [
+        (date(2024, 11, 30), date(2025, 2, 1)), (date(2025, 1, 5), date(2025, 1, 13)),
+        (date(2025, 1, 1), date(2025, 1, 1)), (date(2023, 2, 28), date(2025, 3, 2)), (date(2025, 1, 2), date(2025, 1, 1))])
+    def test_bucket_count(self, interval, first, last):
+        assert bucket_count(first, last, interval) == len(list(buckets(first, last, interval)))
+
+    def test_bucket_count_of_wide_range(self):
+        assert bucket_count(date(1, 1, 1), date(9999, 12, 31), "day") == 3652059
@@ -4,8 +4,8 @@ from decimal import Decimal
 
 from lib.TransactionFactory import TransactionFactory
 from api.models import Transaction
-from reports.lib.constants import EXCHANGE_RATES
-from reports.lib.utils import calculate_total_amount_PLN, calculate_total_unique_field
+from reports.lib.constants import UNKNOWN_CURRENCY_SKIP
+from reports.lib.utils import calculate_total_amount_PLN, calculate_total_unique_field, UnknownCurrencyError
 
 LOOP_COUNT = 25
 
@@ -14,8 +14,9 @@ LOOP_COUNT = 25
 class TestViewsAuxiliaryMethods:
 
     @pytest.fixture(autouse=True)
-    def setup_method(self):
+    def setup_method(self, exchange_rates):
         factory = TransactionFactory()
+        self.exchange_rates = exchange_rates
         self.backup_data = []
 
         for _ in range(LOOP_COUNT):
@@ -39,12 +40,40 @@ class TestViewsAuxiliaryMethods:
             expected_total = Decimal(0)
             for transaction in transaction_per_customer:
 
-                rate = EXCHANGE_RATES.get(transaction['currency'])
-                expected_total += Decimal(transaction['amount']
-                                          ) * Decimal(rate)
+                rate = self.exchange_rates[transaction['currency']]
+                expected_total += Decimal(transaction['amount']) * rate
 
             assert round(total_amount_PLN, 2) == round(expected_total, 2)
 
+    def test__calculate_total_amount_PLN_exact(self):
+        transactions = Transaction.objects.all()
+        expected_total = sum(Decimal(t['amount']) * self.exchange_rates[t['currency']] for t in self.backup_data)
+
+        assert calculate_total_amount_PLN(transactions) == expected_total
+
+    def test__calculate_total_amount_PLN_single_query(self, django_assert_num_queries):
+        with django_assert_num_queries(1):
+            calculate_total_amount_PLN(Transaction.objects.all())
+
+    def test__calculate_total_amount_PLN_empty(self):
+        assert calculate_total_amount_PLN(Transaction.objects.none()) == Decimal(0)
+        assert calculate_total_amount_PLN(Transaction.objects.filter(customer_id=uuid4())) == Decimal(0)
+
+    def test__calculate_total_amount_PLN_unknown_currency_error(self):
+        Transaction.objects.filter(pk=self.backup_data[0]['transaction_id']).update(currency='GBP')
+
+        with pytest.raises(UnknownCurrencyError) as error:
+            calculate_total_amount_PLN(Transaction.objects.all())
+        assert error.value.currencies == ['GBP']
+
+    def test__calculate_total_amount_PLN_unknown_currency_skip(self):
+        Transaction.objects.filter(pk=self.backup_data[0]['transaction_id']).update(currency='GBP')
+        expected_total = sum(Decimal(t['amount']) * self.exchange_rates[t['currency']] for t in self.backup_data[1:])
+
+        total = calculate_total_amount_PLN(Transaction.objects.all(), unknown_currency=UNKNOWN_CURRENCY_SKIP)
+
+        assert total == expected_total
+
     def test__calculate_total_unique_products(self):
 
         for backup_transaction in self.backup_data:
@@ -3,6 +3,12 @@ from . import views
 
 
 urlpatterns = [
+    path('customer-summary/batch/', views.CustomerSummaryBatchView.as_view(), name='customer-summary-batch'),
+    path('product-summary/batch/', views.ProductSummaryBatchView.as_view(), name='product-summary-batch'),
     path('customer-summary/<uuid:customer_id>/', views.CustomerSummaryView.as_view(), name='customer-summary'),
     path('product-summary/<uuid:product_id>/', views.ProductSummaryView.as_view(), name='product-summary'),
+    path('top-customers/', views.TopCustomersView.as_view(), name='top-customers'),
+    path('top-products/', views.TopProductsView.as_view(), name='top-products'),
+    path('customer-timeseries/<uuid:entity_id>/', views.CustomerTimeseriesView.as_view(), name='customer-timeseries'),
+    path('product-timeseries/<uuid:entity_id>/', views.ProductTimeseriesView.as_view(), name='product-timeseries'),
 ]
\ No newline at end of file
@@ -1,16 +1,48 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from django.db.models import Sum
 from rest_framework.permissions import IsAuthenticated, AllowAny
 
 
-from api.models import Transaction
-from reports.lib.utils import calculate_total_amount_PLN, calculate_total_unique_field
-from reports.serializers import CustomerSummarySerializer
+from reports.lib.utils import round_PLN, UnknownCurrencyError
+from reports.lib.summaries import summarize, summarize_many, day_start
+from reports.lib.cache import cached_report, cached_reports
+from reports.lib.timeseries import timeseries, TooManyBucketsError
+from reports.lib.leaderboards import top
+from reports.serializers import (CustomerSummarySerializer, ProductSummarySerializer, SummaryBatchSerializer,
+                                 TimeseriesSerializer, TopSerializer)
 
 from lib.logging_config import logger
 
 
+CUSTOMER_NOT_FOUND = "No transactions found for this customer."
+PRODUCT_NOT_FOUND = "No transactions found for this product."
+
+
+def _date_range(start_date, end_date):
+    # Dates stand for their midnight in TIME_ZONE, the end date only includes its first instant
+    if start_date and end_date:
+        return day_start(start_date), day_start(end_date)
+    return None, None
+
+
+def _customer_summary(customer_id, summary):
+    return {
+        "customer_id": customer_id,
+        "total_amount_PLN": round_PLN(summary['total_amount_PLN']),
+        "total_unique_products": summary['distinct_count'],
+        "earliest_transaction_date": summary['earliest_transaction_date']
+    }
+
+
+def _product_summary(product_id, summary):
+    return {
+        "product_id": product_id,
+        "total_quantity": summary['total_quantity'],
+        "total_amount_PLN": round_PLN(summary['total_amount_PLN']),
+        "total_unique_customers": summary['distinct_count']
+    }
+
+
 class CustomerSummaryView(APIView):
     """View to retrieve summary of transactions for a specific customer."""
 
@@ -22,32 +54,21 @@ class CustomerSummaryView(APIView):
         try:
             start_date = input_data_serializer.validated_data.get('start_date', None)
             end_date = input_data_serializer.validated_data.get('end_date', None)
+            approx = input_data_serializer.validated_data['approx']
 
-            if start_date and end_date:
-                transactions = Transaction.objects.filter(customer_id=customer_id)
-                transactions = transactions.filter(timestamp__gte=start_date)
-                transactions = transactions.filter(timestamp__lte=end_date)
-
-            else:
-                transactions = Transaction.objects.filter(customer_id=customer_id)
-
+            summary = cached_report('customer', customer_id, (start_date, end_date, approx), lambda: summarize(
+                'customer_id', customer_id, 'product_id', *_date_range(start_date, end_date), earliest=True,
+                approx=approx))
 
-            if not transactions.exists():
+            if summary is None:
                 logger.warning(
                     f"No transactions found for customer_id: {customer_id}")
-                return Response({"error": "No transactions found for this customer."}, status=404)
+                return Response({"error": CUSTOMER_NOT_FOUND}, status=404)
 
-            total_amount_PLN = calculate_total_amount_PLN(transactions)
-            total_unique_products = calculate_total_unique_field(
-                transactions, 'product_id')
-            earliest_transaction = transactions.order_by('timestamp').first()
-
-            return Response({
-                "customer_id": customer_id,
-                "total_amount_PLN": total_amount_PLN,
-                "total_unique_products": total_unique_products,
-                "earliest_transaction_date": earliest_transaction.timestamp
-            })
+            return Response(_customer_summary(customer_id, summary))
+        except UnknownCurrencyError as e:
+            logger.error(f"Error in CustomerSummaryView: {e}")
+            return Response({"error": str(e)}, status=422)
         except Exception as e:
             logger.error(f"Error in CustomerSummaryView: {e}")
             raise e
@@ -58,24 +79,194 @@ class ProductSummaryView(APIView):
     
     permission_classes = [IsAuthenticated]
     def get(self, request, product_id):
+        input_data_serializer = ProductSummarySerializer(data=request.query_params)
+        input_data_serializer.is_valid(raise_exception=True)
+
         try:
-            transactions = Transaction.objects.filter(product_id=product_id)
-            if not transactions.exists():
-                return Response({"error": "No transactions found for this product."}, status=404)
+            approx = input_data_serializer.validated_data['approx']
+            summary = cached_report('product', product_id, (None, None, approx), lambda: summarize(
+                'product_id', product_id, 'customer_id', approx=approx))
+            if summary is None:
+                return Response({"error": PRODUCT_NOT_FOUND}, status=404)
+
+            return Response(_product_summary(product_id, summary))
+        except UnknownCurrencyError as e:
+            logger.error(f"Error in ProductSummaryView: {e}")
+            return Response({"error": str(e)}, status=422)
+        except Exception as e:
+            logger.error(f"Error in ProductSummaryView: {e}")
+            raise e
+
+
+class SummaryBatchView(APIView):
+    """Base view computing the summaries of many customers or products per request, with grouped queries.
+
+    Results are keyed by id, ids without transactions or with transactions in a currency without an exchange
+    rate get an error in place of their summary.
+    """
+
+    permission_classes = [IsAuthenticated]
+    kind = None
+    field = None
+    distinct_field = None
+    earliest = False
+    not_found = None
+
+    def summary(self, entity_id, summary):
+        raise NotImplementedError
+
+    def post(self, request):
+        input_data_serializer = SummaryBatchSerializer(data=request.data)
+        input_data_serializer.is_valid(raise_exception=True)
+
+        ids = list(dict.fromkeys(input_data_serializer.validated_data['ids']))
+        start_date = input_data_serializer.validated_data.get('start_date', None)
+        end_date = input_data_serializer.validated_data.get('end_date', None)
+        approx = input_data_serializer.validated_data['approx']
+        summaries = cached_reports(self.kind, ids, (start_date, end_date, approx), lambda missed_ids: summarize_many(
+            self.field, missed_ids, self.distinct_field, *_date_range(start_date, end_date), earliest=self.earliest,
+            approx=approx))
+
+        results = {}
+        for entity_id in ids:
+            summary = summaries.get(entity_id)
+            if summary is None:
+                results[str(entity_id)] = {"error": self.not_found}
+            elif isinstance(summary, UnknownCurrencyError):
+                results[str(entity_id)] = {"error": str(summary)}
+            else:
+                results[str(entity_id)] = self.summary(entity_id, summary)
+        return Response({"results": results})
+
+
+class CustomerSummaryBatchView(SummaryBatchView):
+    """View to retrieve summaries of transactions for many customers."""
+
+    kind = 'customer'
+    field = 'customer_id'
+    distinct_field = 'product_id'
+    earliest = True
+    not_found = CUSTOMER_NOT_FOUND
+
+    def summary(self, entity_id, summary):
+        return _customer_summary(entity_id, summary)
+
+
+class ProductSummaryBatchView(SummaryBatchView):
+    """View to retrieve summaries of transactions for many products."""
+
+    kind = 'product'
+    field = 'product_id'
+    distinct_field = 'customer_id'
+    not_found = PRODUCT_NOT_FOUND
+
+    def summary(self, entity_id, summary):
+        return _product_summary(entity_id, summary)
 
-            total_quantity = transactions.aggregate(Sum('quantity'))[
-                'quantity__sum']
-            total_amount_PLN = calculate_total_amount_PLN(transactions)
-            total_unique_customers = calculate_total_unique_field(
-                transactions, 'customer_id')
+
+class TimeseriesView(APIView):
+    """Base view totalling the transactions of a customer or product per day, week or month.
+
+    Both dates are included whole, buckets without transactions are returned with zero totals.
+    """
+
+    permission_classes = [IsAuthenticated]
+    kind = None
+    field = None
+    not_found = None
+
+    def get(self, request, entity_id):
+        input_data_serializer = TimeseriesSerializer(data=request.query_params)
+        input_data_serializer.is_valid(raise_exception=True)
+
+        try:
+            interval = input_data_serializer.validated_data['interval']
+            start_date = input_data_serializer.validated_data.get('start_date', None)
+            end_date = input_data_serializer.validated_data.get('end_date', None)
+
+            series = cached_report(self.kind, entity_id, (interval, start_date, end_date), lambda: timeseries(
+                self.field, entity_id, interval, start_date, end_date), report='timeseries')
+            if series is None:
+                return Response({"error": self.not_found}, status=404)
 
             return Response({
-                "product_id": product_id,
-                "total_quantity": total_quantity,
-                "total_amount_PLN": total_amount_PLN,
-                "total_unique_customers": total_unique_customers
+                self.field: entity_id,
+                "interval": interval,
+                "results": [{**bucket, "total_amount_PLN": round_PLN(bucket['total_amount_PLN'])} for bucket in series],
+            })
+        except TooManyBucketsError as e:
+            # The transactions of the id span more buckets than a request may fill without dates
+            return Response({"error": str(e)}, status=400)
+        except UnknownCurrencyError as e:
+            logger.error(f"Error in {type(self).__name__}: {e}")
+            return Response({"error": str(e)}, status=422)
+
+
+class CustomerTimeseriesView(TimeseriesView):
+    """View to retrieve the transaction totals of a customer over time."""
+
+    kind = 'customer'
+    field = 'customer_id'
+    not_found = CUSTOMER_NOT_FOUND
+
+
+class ProductTimeseriesView(TimeseriesView):
+    """View to retrieve the transaction totals of a product over time."""
+
+    kind = 'product'
+    field = 'product_id'
+    not_found = PRODUCT_NOT_FOUND
+
+
+class TopView(APIView):
+    """Base view ranking customers or products by their total amount in PLN, quantity or number of transactions.
 
+    Both dates are included whole. Rankings restricted to a single customer or product are cached with its
+    version, others are computed for each request.
+    """
+
+    permission_classes = [IsAuthenticated]
+    field = None
+
+    def get(self, request):
+        input_data_serializer = TopSerializer(data=request.query_params)
+        input_data_serializer.is_valid(raise_exception=True)
+        data = input_data_serializer.validated_data
+
+        try:
+            filters = {name: data[name] for name in ('customer_id', 'product_id') if name in data}
+            start_date = data.get('start_date', None)
+            end_date = data.get('end_date', None)
+
+            def compute():
+                return top(self.field, data['order_by'], data['limit'], filters, start_date, end_date)
+
+            if len(filters) == 1:
+                # Any import touching the customer or product replaces its version
+                (name, entity_id), = filters.items()
+                results = cached_report(name.removesuffix('_id'), entity_id,
+                                        (data['order_by'], data['limit'], start_date, end_date), compute,
+                                        report=f'top-{self.field}')
+            else:
+                results = compute()
+
+            return Response({
+                "order_by": data['order_by'],
+                "results": [{**values, "total_amount_PLN": round_PLN(values['total_amount_PLN'])}
+                            for values in results],
             })
-        except Exception as e:
-            logger.error(f"Error in ProductSummaryView: {e}")
-            raise e
+        except UnknownCurrencyError as e:
+            logger.error(f"Error in {type(self).__name__}: {e}")
+            return Response({"error": str(e)}, status=422)
+
+
+class TopCustomersView(TopView):
+    """View to rank customers, optionally of one product."""
+
+    field = 'customer_id'
+
+
+class TopProductsView(TopView):
+    """View to rank products, optionally of one customer."""
+
+    field = 'product_id'